@@ -3,20 +3,33 @@ Multi-Device Wakeword Monitor for Axis Speakers
 Supports multiple devices, each with their own MQTT topics based on device ID
 """
 
-import sys
 import time
 import os
+import json
+import signal
+import argparse
 import threading
-import queue
-import struct
-import subprocess
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from dotenv import load_dotenv
 import yaml
-import pvporcupine
-import torch
-import paho.mqtt.client as mqtt
-from collections import deque
+from pcm_buffer import PcmRingBuffer
+from vad import load_vad, BatchedVADScheduler
+from async_engine import AsyncEngine
+from sharding import ShardSupervisor
+from rtsp_ingest import NativeRtspIngest
+from stream_supervisor import StreamSupervisor, FfmpegSource, NativeSource, PcmSource
+from metrics import DeviceMetrics, MetricsRegistry, MetricsServer
+from event_publisher import EventPublisher
+from wakeword import load_wakeword, EnergyGate
+from utterance_stream import create_streamer
+from arbitration import create_arbiter
+from capture import create_capture
+from service_log import log
+
+
+# Audio over which arbitration measures the wakeword's energy (1 s)
+ENERGY_SAMPLES = 16000
 
 
 class DeviceMonitor:
@@ -29,359 +42,804 @@ class DeviceMonitor:
         # Device identification
         self.device_name = device_config['name']
         self.device_id = device_config['id']
-        self.address = device_config['address'].replace('http://', '').replace('https://', '')
+        self.address = device_config.get('address', '').replace('http://', '').replace('https://', '')
+        # Named pipe with 16kHz s16le audio that replaces the RTSP stream
+        self.pcm_path = device_config.get('pcm')
         self.audio_source = device_config.get('audio_source', 0)
+        self.group = device_config.get('group')
         
         # Components
         self.mqtt_client = None
-        self.porcupine = None
-        self.vad_model = None
-        self.ffmpeg_process = None
-        self.audio_thread = None
+        self.wakeword_engine = None
+        self.wakeword_detector = None
+        self.wakeword_gate = None
+        self.vad = None
+        self.vad_scheduler = None
+        self.vad_stream = None
+        self.stream_supervisor = None
+        self.utterance_streamer = None
+        self.arbiter = None
+        self.capture = None
+        self.metrics = None
         self.running = False
-        self.audio_buffer = deque(maxlen=1000)
-        self.buffer_lock = threading.Lock()
+        self.audio_buffer = None
+        self.processing_thread = None
+        # Detector swapped in by the processing thread before its next frame
+        self.pending_detector = None
+        
+        # Audio buffering from shared config
+        audio_config = shared_config.get('audio', {})
+        self.buffer_seconds = audio_config.get('buffer_seconds', 10)
+        self.ingest = audio_config.get('ingest', 'ffmpeg')
+        self.max_lag_samples = int(audio_config.get('max_lag_ms', 0) * 16)
+        self.shared_name = None
+        if audio_config.get('shared_memory', False):
+            self.shared_name = audio_config.get('shared_memory_name', 'wakeword-{device_id}').replace(
+                '{device_id}', self.device_id)
+        
+        # Stream supervision from shared config
+        service_config = shared_config.get('service', {})
+        self.stall_timeout = service_config.get('stall_timeout', 5)
+        self.reconnect_initial_delay = service_config.get('reconnect_initial_delay', 0.5)
+        self.reconnect_delay = service_config.get('reconnect_delay', 5)
+        self.health_check_interval = service_config.get('health_check_interval', 60)
+        self.startup_timeout = service_config.get('startup_timeout', 10)
         
-        # State tracking
+        # State tracking; endpoint timing runs on the audio-sample clock
+        self.samples_consumed = 0
         self.wakeword_detected = False
         self.recording_start_time = None
         self.silence_start_time = None
+        # The most recent 512 samples for VAD, refilled in place every frame
+        self.vad_window = np.zeros(512, dtype=np.int16)
+        self.vad_filled = 0
+        self.last_speech_prob = 0.0
+        self.vad_windows = 0
+        # (arrival, samples consumed) of a wakeword the group has not decided on
+        self.pending_wakeword = None
+        self.arbitration_won = 0
+        self.suppressed_wakewords = 0
+        
+        # Processing lag (gauge) and catch-up counters
+        self.lag_samples = 0
+        self.max_lag_seen = 0
+        self.lagging = False
+        self.catchup_skips = 0
+        self.skipped_samples = 0
+        self.decimated_vad_windows = 0
         
         # VAD timing from shared config
-        vad_config = shared_config.get('vad', {})
-        self.vad_threshold = vad_config.get('threshold', 0.5)
-        self.min_recording_time = vad_config.get('min_recording_time_ms', 1500) / 1000.0
-        self.min_silence_duration = vad_config.get('min_silence_duration_ms', 800) / 1000.0
-        self.max_recording_time = vad_config.get('max_recording_time_ms', 7000) / 1000.0
+        self.apply_vad_config(shared_config.get('vad', {}))
         
-        # MQTT topics (use device_id)
+        # MQTT topics (use device_id) and event options
         mqtt_config = shared_config['mqtt']
+        self.qos = mqtt_config.get('qos', 1)
+        self.retain = mqtt_config.get('retain', False)
+        self.payload_format = mqtt_config.get('payload_format', 'text')
         self.topics = {
             'wakeword': mqtt_config['topics']['wakeword'].replace('{device_id}', self.device_id),
             'vad_stop': mqtt_config['topics']['vad_stop'].replace('{device_id}', self.device_id),
+            'audio': mqtt_config['topics'].get('audio', 'voice/audio/{device_id}').replace('{device_id}', self.device_id),
         }
     
-    def initialize(self, mqtt_client, vad_model):
+    def apply_vad_config(self, vad_config):
+        """Set the VAD threshold and endpoint timing; safe while processing"""
+        self.vad_threshold = vad_config.get('threshold', 0.5)
+        self.min_recording_time = vad_config.get('min_recording_time_ms', 1500) / 1000.0
+        self.min_silence_duration = vad_config.get('min_silence_duration_ms', 800) / 1000.0
+        self.max_recording_time = vad_config.get('max_recording_time_ms', 7000) / 1000.0
+    
+    def replace_detector(self):
+        """Create a detector with the engine's current settings for the processing thread to swap in"""
+        self.pending_detector = self.wakeword_engine.create_detector()
+    
+    def swap_detector(self):
+        """Switch to the pending detector; called from the processing thread between frames"""
+        detector, self.pending_detector = self.pending_detector, None
+        previous, self.wakeword_detector = self.wakeword_detector, detector
+        previous.delete()
+    
+    def initialize(self, mqtt_client, vad, vad_scheduler=None, start_stream=True, wakeword_engine=None):
         """Initialize device with shared resources"""
         self.mqtt_client = mqtt_client
-        self.vad_model = vad_model
+        self.wakeword_engine = wakeword_engine
+        self.vad = vad
+        self.vad_scheduler = vad_scheduler
+        self.vad_stream = vad.new_stream()
+        
+        print(f"[{self.device_id}] Initializing {self.device_name}")
+        
+        # Initialize the wakeword detector for this device
+        if not self.initialize_wakeword():
+            return False
+        
+        # Stream utterance audio downstream, if configured
+        try:
+            self.utterance_streamer = create_streamer(
+                self.device_id,
+                self.shared_config.get('utterance', {}),
+                mqtt_client,
+                self.topics['audio']
+            )
+        except Exception as e:
+            print(f"[{self.device_id}] ❌ Utterance streaming failed: {e}")
+            return False
         
-        print(f"\n{'='*60}")
-        print(f"Initializing: {self.device_name} (ID: {self.device_id})")
-        print(f"{'='*60}")
+        # Preallocate the PCM ring buffer in detector-sized frames, keeping
+        # the utterance pre-roll after it has been read; in shared memory,
+        # other processes can read the same audio
+        history = self.utterance_streamer.pre_roll_samples if self.utterance_streamer else 0
+        if self.arbiter is not None:
+            # The winner's pre-roll is taken when the round closes, and the
+            # wakeword energy is measured over the last second
+            history = max(history + int(self.arbiter.window * 16000) + 2 * self.wakeword_detector.frame_length,
+                          ENERGY_SAMPLES)
+        try:
+            self.audio_buffer = PcmRingBuffer(
+                self.wakeword_detector.frame_length,
+                int(self.buffer_seconds * 16000),
+                history_samples=history,
+                shared_name=self.shared_name
+            )
+        except OSError as e:
+            print(f"[{self.device_id}] ❌ Shared audio buffer {self.shared_name} failed: {e}")
+            return False
         
-        # Initialize Porcupine for this device
-        if not self.initialize_porcupine():
+        # Keep the last minutes of audio and clips of detections on disk, if configured
+        try:
+            self.capture = create_capture(self.device_id, self.shared_config.get('capture') or {},
+                                          self.device_config)
+        except OSError as e:
+            print(f"[{self.device_id}] ❌ Rolling capture failed: {e}")
             return False
         
-        # Start RTSP stream
-        if not self.start_rtsp_stream():
+        # Start RTSP stream (the asyncio engine starts its own)
+        if start_stream and not self.start_rtsp_stream():
             return False
         
-        print(f"✓ {self.device_name} ready!")
-        print(f"  MQTT topics:")
-        print(f"    Wakeword: {self.topics['wakeword']}")
-        print(f"    VAD Stop: {self.topics['vad_stop']}")
+        print(f"[{self.device_id}] ✓ {self.device_name} ready - MQTT: {self.topics['wakeword']}, "
+              f"{self.topics['vad_stop']}")
+        if self.utterance_streamer:
+            print(f"[{self.device_id}]   Audio: {self.utterance_streamer.describe()}")
+        if self.shared_name:
+            print(f"[{self.device_id}]   Shared audio: {self.shared_name}")
+        if self.capture:
+            print(f"[{self.device_id}]   Capture: {self.capture.describe()}")
+        if self.arbiter is not None:
+            print(f"[{self.device_id}]   Arbitration group: {self.group}")
         
         return True
     
-    def initialize_porcupine(self):
-        """Initialize Porcupine wakeword detection"""
+    def initialize_wakeword(self):
+        """Create this device's wakeword detector from the shared engine"""
         try:
-            wakeword_config = self.shared_config.get('wakeword', {})
-            model = wakeword_config.get('model', 'porcupine')
-            
-            keyword_map = {
-                'hey_mycroft': 'porcupine',
-                'hey_jarvis': 'jarvis',
-                'alexa': 'alexa',
-                'hey_google': 'hey google',
-                'porcupine': 'porcupine',
-                'jarvis': 'jarvis',
-                'computer': 'computer',
-            }
+            if self.wakeword_engine is None:
+                self.wakeword_engine = load_wakeword(
+                    self.shared_config.get('wakeword', {}),
+                    self.porcupine_access_key
+                )
+            self.wakeword_detector = self.wakeword_engine.create_detector()
+            print(f"[{self.device_id}] ✓ {self.wakeword_engine.describe()}")
             
-            keyword = keyword_map.get(model, 'porcupine')
-            sensitivity = wakeword_config.get('threshold', 0.5)
-            
-            self.porcupine = pvporcupine.create(
-                access_key=self.porcupine_access_key,
-                keywords=[keyword],
-                sensitivities=[sensitivity]
-            )
-            print(f"  ✓ Porcupine: '{keyword}' (sensitivity: {sensitivity})")
+            wakeword_config = self.shared_config.get('wakeword', {})
+            if wakeword_config.get('gate', False):
+                self.wakeword_gate = EnergyGate(
+                    self.wakeword_detector.frame_length,
+                    margin_db=wakeword_config.get('gate_margin_db', 10),
+                    lookback_ms=wakeword_config.get('gate_lookback_ms', 480),
+                    hold_ms=wakeword_config.get('gate_hold_ms', 1000)
+                )
+                print(f"[{self.device_id}] ✓ Energy gate: {self.wakeword_gate.margin_db} dB above the noise floor")
             return True
         except Exception as e:
-            print(f"  ❌ Porcupine failed: {e}")
+            print(f"[{self.device_id}] ❌ Wakeword detector failed: {e}")
             return False
     
-    def start_rtsp_stream(self):
-        """Start RTSP stream using FFmpeg"""
-        try:
+    def ffmpeg_command(self):
+        """FFmpeg command that decodes the RTSP audio to 16kHz mono s16le on stdout"""
+        if self.pcm_path:
+            # The asyncio runtime reads a PCM pipe through FFmpeg as well
+            source = ['-f', 's16le', '-ar', '16000', '-ac', '1', '-i', self.pcm_path]
+        else:
             username = os.getenv('AXIS_USERNAME', 'root')
             password = os.getenv('AXIS_PASSWORD', '')
-            
             rtsp_url = f"rtsp://{username}:{password}@{self.address}/axis-media/media.amp?audio=1"
-            
-            cmd = [
-                'ffmpeg',
-                '-rtsp_transport', 'tcp',
-                '-i', rtsp_url,
-                '-ar', '16000',
-                '-ac', '1',
-                '-f', 's16le',
-                'pipe:1'
-            ]
-            
-            print(f"  🎤 Starting RTSP stream from {self.address}")
-            
-            self.ffmpeg_process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.DEVNULL,
-                bufsize=4096
-            )
-            
-            time.sleep(1.5)
-            
-            print(f"  ✓ RTSP stream connected (16kHz mono PCM)")
-            
+            source = ['-rtsp_transport', 'tcp', '-i', rtsp_url]
+        
+        return [
+            'ffmpeg',
+            *source,
+            '-ar', '16000',
+            '-ac', '1',
+            '-f', 's16le',
+            'pipe:1'
+        ]
+    
+    def start_rtsp_stream(self):
+        """Start the supervised RTSP stream using FFmpeg or the native ingest
+        
+        Waits up to service.startup_timeout for the first PCM bytes. A device
+        that is unreachable or silent by then keeps being retried in the
+        background, so this only returns False if supervision can't start.
+        """
+        self.stream_supervisor = StreamSupervisor(
+            self.device_id,
+            self.new_stream_source,
+            self.audio_buffer,
+            stall_timeout=self.stall_timeout,
+            initial_delay=self.reconnect_initial_delay,
+            max_delay=self.reconnect_delay,
+            health_interval=self.health_check_interval
+        )
+        
+        native = self.ingest == 'native' and not self.pcm_path
+        if self.pcm_path:
+            print(f"[{self.device_id}] 🎤 Starting PCM stream from {self.pcm_path}")
+        else:
+            print(f"[{self.device_id}] 🎤 Starting {'native ' if native else ''}RTSP stream from {self.address}")
+        started = time.monotonic()
+        try:
+            self.stream_supervisor.open()
+        except Exception as e:
+            print(f"[{self.device_id}] ⚠️ RTSP stream failed: {e} - retrying in the background")
+        
+        try:
             self.running = True
-            self.audio_thread = threading.Thread(target=self._read_rtsp_loop, daemon=True)
-            self.audio_thread.start()
-            
-            return True
-            
+            self.stream_supervisor.start()
         except Exception as e:
-            print(f"  ❌ RTSP stream failed: {e}")
+            print(f"[{self.device_id}] ❌ RTSP stream supervision failed: {e}")
+            self.running = False
             return False
-    
-    def _read_rtsp_loop(self):
-        """Continuously read audio from FFmpeg into buffer"""
-        chunk_size = 3200
         
-        while self.running:
-            try:
-                chunk = self.ffmpeg_process.stdout.read(chunk_size)
-                if not chunk:
-                    break
-                
-                with self.buffer_lock:
-                    self.audio_buffer.append(chunk)
-                    
-            except Exception as e:
-                print(f"[{self.device_id}] ⚠️ Stream read error: {e}")
-                break
+        if self.stream_supervisor.source is None:
+            return True
         
-        print(f"[{self.device_id}] ⚠️ RTSP stream ended")
+        if self.stream_supervisor.wait_ready(self.startup_timeout):
+            source = self.stream_supervisor.source
+            codec = (f"{source.ingest.codec} 8kHz → 16kHz mono PCM"
+                     if native and source is not None else "16kHz mono PCM")
+            print(f"[{self.device_id}] ✓ RTSP stream connected ({codec}), "
+                  f"first audio after {time.monotonic() - started:.2f}s")
+        else:
+            print(f"[{self.device_id}] ⚠️ No audio after {self.startup_timeout:.0f}s - "
+                  f"still trying in the background")
+        return True
     
-    def read_frame(self, frame_size):
-        """Read audio frame from buffer"""
-        with self.buffer_lock:
-            if not self.audio_buffer:
-                return None
-            
-            collected = b''
-            chunks_to_remove = []
-            
-            for i, chunk in enumerate(self.audio_buffer):
-                if len(collected) >= frame_size:
-                    break
-                collected += chunk
-                chunks_to_remove.append(i)
-            
-            for i in reversed(chunks_to_remove):
-                self.audio_buffer.popleft()
-            
-            if len(collected) >= frame_size:
-                if len(collected) > frame_size:
-                    remainder = collected[frame_size:]
-                    self.audio_buffer.appendleft(remainder)
-                return collected[:frame_size]
-            else:
-                if collected:
-                    self.audio_buffer.appendleft(collected)
-                return None
+    def stream_ready(self):
+        """Whether the stream has delivered audio since startup"""
+        return self.stream_supervisor is not None and self.stream_supervisor.ready.is_set()
+    
+    def new_stream_source(self):
+        """Create a fresh audio source for each (re)connect"""
+        if self.pcm_path:
+            return PcmSource(self.pcm_path, self.audio_buffer)
+        if self.ingest == 'native':
+            return NativeSource(NativeRtspIngest(
+                self.address,
+                os.getenv('AXIS_USERNAME', 'root'),
+                os.getenv('AXIS_PASSWORD', ''),
+                self.audio_buffer,
+                timeout=self.startup_timeout
+            ))
+        return FfmpegSource(self.ffmpeg_command(), self.audio_buffer)
+    
+    def read_frame(self, timeout=0.5):
+        """Wait for the next audio frame from buffer as an int16 view"""
+        self.check_lag()
+        return self.audio_buffer.read_frame(timeout)
+    
+    def check_lag(self):
+        """Bound how far processing may fall behind the live stream
+        
+        Past half the maximum lag, VAD is only scored on every other window;
+        past the maximum, the backlog is skipped so detections stay timely.
+        A maximum of 0 only tracks the lag.
+        """
+        lag = self.audio_buffer.available_samples()
+        if self.max_lag_samples and lag > self.max_lag_samples:
+            skipped = self.audio_buffer.skip(lag)
+            # Skipped audio still advances the audio clock
+            self.samples_consumed += skipped
+            self.catchup_skips += 1
+            self.skipped_samples += skipped
+            log.warning(f"⏩ Processing {lag / 16000:.1f}s behind - skipped {skipped / 16000:.1f}s to catch up",
+                        device=self.device_id, lag_s=round(lag / 16000, 3), skipped_s=round(skipped / 16000, 3))
+            lag -= skipped
+        self.lag_samples = lag
+        self.max_lag_seen = max(self.max_lag_seen, lag)
+        self.lagging = bool(self.max_lag_samples) and lag > self.max_lag_samples // 2
+    
+    def audio_time(self):
+        """Seconds of this device's stream consumed so far (the endpointing clock)"""
+        return self.samples_consumed / 16000
+    
+    def lag_stats(self):
+        """Processing lag gauge and catch-up counters"""
+        return {
+            'lag_ms': self.lag_samples / 16,
+            'max_lag_ms': self.max_lag_seen / 16,
+            'catchup_skips': self.catchup_skips,
+            'skipped_ms': self.skipped_samples / 16,
+            'decimated_vad_windows': self.decimated_vad_windows,
+        }
+    
+    def fill_vad_window(self, audio_array):
+        """Shift a frame into the 512-sample VAD window without allocating"""
+        count = len(audio_array)
+        if count == 512:
+            self.vad_window[:] = audio_array
+        elif count > 512:
+            self.vad_window[:] = audio_array[-512:]
+        else:
+            self.vad_window[:-count] = self.vad_window[count:]
+            self.vad_window[-count:] = audio_array
+        self.vad_filled = min(512, self.vad_filled + count)
     
     def get_speech_probability(self, audio_samples):
         """Get speech probability using Silero VAD"""
         if len(audio_samples) < 512:
             return 0.0
         
-        audio_float = audio_samples.astype(np.float32) / 32768.0
-        audio_tensor = torch.from_numpy(audio_float[-512:])
+        metrics = self.metrics
+        if metrics is not None:
+            start = time.perf_counter()
         
-        with torch.no_grad():
-            speech_prob = self.vad_model(audio_tensor, 16000).item()
+        if self.vad_scheduler:
+            probability = self.vad_scheduler.infer(self.vad_stream, audio_samples)
+            if probability is None:
+                # A late batch must not end the utterance as if it were silence
+                probability = self.last_speech_prob
+        else:
+            probability = self.vad.probability(self.vad_stream, audio_samples)
         
-        return speech_prob
+        if metrics is not None:
+            metrics.vad_seconds.record(time.perf_counter() - start)
+        return probability
+    
+    def event_payload(self, text, event, **fields):
+        """The plain-text payload, or a JSON object when mqtt.payload_format is json"""
+        if self.payload_format != 'json':
+            return text
+        return json.dumps({
+            'event': event,
+            'device_id': self.device_id,
+            'audio_time_s': round(self.audio_time(), 3),
+            'timestamp': round(time.time(), 3),
+            **fields,
+        })
     
-    def publish_wakeword_detected(self):
+    def publish_wakeword_detected(self, arrival=None):
         """Publish MQTT message when wakeword is detected"""
-        payload = "DETECTED"
-        qos = self.shared_config['mqtt'].get('qos', 1)
+        confidence = getattr(self.wakeword_detector, 'last_score', None)
+        payload = self.event_payload(
+            "DETECTED", 'wakeword',
+            keyword=getattr(self.wakeword_engine, 'keyword', None),
+            confidence=round(confidence, 3) if confidence is not None else None,
+            **({'group': self.group} if self.arbiter is not None else {})
+        )
         
-        self.mqtt_client.publish(self.topics['wakeword'], payload, qos=qos)
-        print(f"\n[{self.device_id}] 📢 WAKEWORD DETECTED! → {self.topics['wakeword']}")
+        on_ack = None
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.wakewords += 1
+            if arrival is not None:
+                on_ack = lambda acked: metrics.wakeword_ack_seconds.observe(acked - arrival)
+        self.mqtt_client.publish(self.topics['wakeword'], payload, qos=self.qos, retain=self.retain, on_ack=on_ack)
+        log.info(f"📢 WAKEWORD DETECTED! → {self.topics['wakeword']}", device=self.device_id,
+                 event='wakeword', topic=self.topics['wakeword'])
     
     def publish_silence_detected(self, reason="silence"):
         """Publish MQTT message when VAD detects silence"""
-        payload = "SILENCE"
-        qos = self.shared_config['mqtt'].get('qos', 1)
+        if self.pending_wakeword is not None:
+            # The recording ended before the group's round closed
+            self.arbitrate(force=True)
+            if not self.wakeword_detected:
+                return
         
-        if self.recording_start_time:
-            duration = time.time() - self.recording_start_time
+        if self.capture is not None:
+            self.capture.mark(reason, audio_time=self.audio_time())
+        
+        if self.recording_start_time is not None:
+            duration = self.audio_time() - self.recording_start_time
             duration_str = f" ({duration:.1f}s)"
         else:
+            duration = None
             duration_str = ""
+        payload = self.event_payload(
+            "SILENCE", 'silence',
+            reason=reason,
+            duration_s=round(duration, 3) if duration is not None else None
+        )
+        
+        if self.utterance_streamer:
+            self.utterance_streamer.finish(reason)
         
-        self.mqtt_client.publish(self.topics['vad_stop'], payload, qos=qos)
+        self.mqtt_client.publish(self.topics['vad_stop'], payload, qos=self.qos, retain=self.retain)
         
-        if reason == "timeout":
-            print(f"[{self.device_id}] 🔇 MAX TIME{duration_str}! → {self.topics['vad_stop']}")
+        label = "MAX TIME" if reason == "timeout" else "SILENCE"
+        log.info(f"🔇 {label}{duration_str}! → {self.topics['vad_stop']}", device=self.device_id,
+                 event='silence', reason=reason, topic=self.topics['vad_stop'])
+    
+    def wakeword_energy(self):
+        """Level of the last second of audio, which holds the wakeword, in dB"""
+        audio = self.audio_buffer.history(ENERGY_SAMPLES).astype(np.float32)
+        return 10 * float(np.log10(np.dot(audio, audio) / max(1, len(audio)) + 1.0))
+    
+    def submit_wakeword(self, arrival):
+        """Enter a detection into the group's round; False if another device already won it"""
+        arbiter = self.arbiter
+        score = getattr(self.wakeword_detector, 'last_score', None)
+        energy = self.wakeword_energy()
+        log.debug(f"Wakeword entered into the {self.group} round ({energy:.1f} dB)", device=self.device_id,
+                  group=self.group, score=score, energy_db=round(energy, 1))
+        result = arbiter.submit(
+            self.group,
+            self.device_id,
+            self.audio_time() if arbiter.audio_clock else arrival,
+            score=score,
+            energy=energy
+        )
+        if result is False:
+            self.suppressed_wakewords += 1
+            if self.capture is not None:
+                self.capture.mark('suppressed', audio_time=self.audio_time())
+            log.info(f"🔕 Wakeword suppressed - {arbiter.winner(self.group)} heard it best",
+                     device=self.device_id, event='suppressed', group=self.group)
+            return False
+        self.pending_wakeword = (arrival, self.samples_consumed)
+        return True
+    
+    def arbitrate(self, force=False):
+        """Publish the pending wakeword once this device won its round, or drop the recording if it lost"""
+        arbiter = self.arbiter
+        if force:
+            now = float('inf')
         else:
-            print(f"[{self.device_id}] 🔇 SILENCE{duration_str}! → {self.topics['vad_stop']}")
+            now = self.audio_time() if arbiter.audio_clock else time.monotonic()
+        won = arbiter.poll(self.group, self.device_id, now)
+        if won is None:
+            return
+        
+        arrival, detected_samples = self.pending_wakeword
+        self.pending_wakeword = None
+        if not won:
+            self.suppressed_wakewords += 1
+            if self.capture is not None:
+                self.capture.mark('suppressed', audio_time=self.audio_time())
+            self.wakeword_detected = False
+            self.recording_start_time = None
+            self.silence_start_time = None
+            self.vad_filled = 0
+            log.info(f"🔕 Wakeword suppressed - {arbiter.winner(self.group)} heard it best",
+                     device=self.device_id, event='suppressed', group=self.group)
+            return
+        
+        self.arbitration_won += 1
+        self.publish_wakeword_detected(arrival)
+        streamer = self.utterance_streamer
+        if streamer is not None and not streamer.active:
+            # The pre-roll ends with the wakeword frame; the audio recorded
+            # while the round was open follows it
+            recorded = self.samples_consumed - detected_samples
+            audio = self.audio_buffer.history(streamer.pre_roll_samples + recorded)
+            split = max(0, len(audio) - recorded)
+            streamer.begin(audio[:split], detected_samples / 16000)
+            streamer.feed(audio[split:])
     
     def process_audio(self):
         """Process audio for wakeword and VAD detection"""
-        frame_length = self.porcupine.frame_length
-        frame_size_bytes = frame_length * 2
-        
-        vad_buffer = np.array([], dtype=np.int16)
-        
-        print(f"[{self.device_id}] 🎧 Audio processing started - listening for wakeword...")
+        log.info("🎧 Audio processing started - listening for wakeword...", device=self.device_id)
         
         while self.running:
             try:
-                audio_data = self.read_frame(frame_size_bytes)
+                audio_array = self.read_frame()
                 
-                if not audio_data or len(audio_data) != frame_size_bytes:
-                    time.sleep(0.01)
+                if audio_array is None:
+                    if self.audio_buffer.closed:
+                        break
                     continue
                 
-                pcm = struct.unpack_from(f"{frame_length}h", audio_data)
+                if self.pending_detector is not None:
+                    self.swap_detector()
                 
-                # Wakeword detection
-                keyword_index = self.porcupine.process(pcm)
-                if keyword_index >= 0:
-                    self.publish_wakeword_detected()
-                    self.wakeword_detected = True
-                    self.recording_start_time = time.time()
-                    self.silence_start_time = None
-                    print(f"[{self.device_id}] 🎙️  Recording (min:{self.min_recording_time}s, max:{self.max_recording_time}s)")
+                self.process_frame(audio_array)
+                                    
+            except Exception as e:
+                log.error(f"⚠️ Processing error: {e}", device=self.device_id, key='processing', error=repr(e))
+                time.sleep(0.1)
+        
+        log.info("Audio processing stopped", device=self.device_id)
+    
+    def process_frame(self, audio_array):
+        """Run wakeword and VAD detection on one frame"""
+        self.samples_consumed += len(audio_array)
+        current_time = self.samples_consumed / 16000
+        capture = self.capture
+        if capture is not None:
+            capture.write(audio_array)
+        
+        # Wakeword detection, skipped while the energy gate is closed
+        metrics = self.metrics
+        gate = self.wakeword_gate
+        keyword_index = -1
+        for frame in (audio_array,) if gate is None else gate.frames_to_process(audio_array):
+            if metrics is None:
+                index = self.wakeword_detector.process(frame)
+            else:
+                start = time.perf_counter()
+                index = self.wakeword_detector.process(frame)
+                metrics.wakeword_seconds.record(time.perf_counter() - start)
+            if index >= 0:
+                keyword_index = index
+        
+        streamer = self.utterance_streamer
+        if keyword_index >= 0:
+            if capture is not None:
+                capture.mark('wakeword', getattr(self.wakeword_detector, 'last_score', None), current_time)
+            # The frame's last sample arrived one backlog's worth of audio ago
+            arrival = time.monotonic() - self.audio_buffer.available_samples() / 16000
+            if self.arbiter is None:
+                self.publish_wakeword_detected(arrival)
+            elif self.wakeword_detected or not self.submit_wakeword(arrival):
+                # Grouped devices publish only after winning the round; one
+                # that is already recording keeps its session
+                keyword_index = -1
+        
+        if keyword_index >= 0:
+            self.wakeword_detected = True
+            self.recording_start_time = current_time
+            self.silence_start_time = None
+            self.vad_stream.reset()
+            log.info(f"🎙️  Recording (min:{self.min_recording_time}s, max:{self.max_recording_time}s)",
+                     device=self.device_id, event='recording')
+            
+            # The pre-roll ends with this frame; a repeat detection keeps streaming
+            if streamer is not None and not streamer.active and self.arbiter is None:
+                streamer.begin(self.audio_buffer.history(streamer.pre_roll_samples), current_time)
+                streamer = None
+        
+        # VAD detection
+        if self.wakeword_detected:
+            if streamer is not None and streamer.active:
+                streamer.feed(audio_array)
+            
+            recording_duration = current_time - self.recording_start_time
+            
+            # Check maximum time
+            if recording_duration >= self.max_recording_time:
+                self.publish_silence_detected(reason="timeout")
+                self.wakeword_detected = False
+                self.recording_start_time = None
+                self.silence_start_time = None
+                self.vad_filled = 0
+                return
+            
+            self.fill_vad_window(audio_array)
+            
+            if self.vad_filled == 512:
+                # Decimate VAD while catching up, reusing the last probability
+                if self.lagging and self.vad_windows % 2:
+                    speech_prob = self.last_speech_prob
+                    self.decimated_vad_windows += 1
+                else:
+                    speech_prob = self.get_speech_probability(self.vad_window)
+                    self.last_speech_prob = speech_prob
+                self.vad_windows += 1
                 
-                # VAD detection
-                if self.wakeword_detected:
-                    current_time = time.time()
-                    recording_duration = current_time - self.recording_start_time
-                    
-                    # Check maximum time
-                    if recording_duration >= self.max_recording_time:
-                        self.publish_silence_detected(reason="timeout")
-                        self.wakeword_detected = False
-                        self.recording_start_time = None
+                if recording_duration >= self.min_recording_time:
+                    if speech_prob > self.vad_threshold:
                         self.silence_start_time = None
-                        vad_buffer = np.array([], dtype=np.int16)
-                        continue
-                    
-                    audio_array = np.frombuffer(audio_data, dtype=np.int16)
-                    vad_buffer = np.concatenate([vad_buffer, audio_array])
-                    
-                    if len(vad_buffer) >= 512:
-                        speech_prob = self.get_speech_probability(vad_buffer)
+                    else:
+                        if self.silence_start_time is None:
+                            self.silence_start_time = current_time
                         
-                        if recording_duration >= self.min_recording_time:
-                            if speech_prob > self.vad_threshold:
-                                self.silence_start_time = None
-                            else:
-                                if self.silence_start_time is None:
-                                    self.silence_start_time = current_time
-                                
-                                silence_duration = current_time - self.silence_start_time
-                                
-                                if silence_duration >= self.min_silence_duration:
-                                    self.publish_silence_detected(reason="silence")
-                                    self.wakeword_detected = False
-                                    self.recording_start_time = None
-                                    self.silence_start_time = None
-                                    vad_buffer = np.array([], dtype=np.int16)
+                        silence_duration = current_time - self.silence_start_time
                         
-                        vad_buffer = vad_buffer[-512:]
-                                    
-            except Exception as e:
-                print(f"[{self.device_id}] ⚠️ Processing error: {e}")
-                time.sleep(0.1)
+                        if silence_duration >= self.min_silence_duration:
+                            self.publish_silence_detected(reason="silence")
+                            self.wakeword_detected = False
+                            self.recording_start_time = None
+                            self.silence_start_time = None
+                            self.vad_filled = 0
+        
+        if self.pending_wakeword is not None:
+            self.arbitrate()
     
     def shutdown(self):
         """Clean shutdown"""
         print(f"[{self.device_id}] Shutting down...")
         self.running = False
         
-        if self.audio_thread:
-            self.audio_thread.join(timeout=2)
+        if self.audio_buffer:
+            self.audio_buffer.close()
         
-        if self.ffmpeg_process:
-            self.ffmpeg_process.terminate()
-            try:
-                self.ffmpeg_process.wait(timeout=2)
-            except:
-                self.ffmpeg_process.kill()
+        if self.stream_supervisor:
+            self.stream_supervisor.stop()
+        
+        # The detector must not be deleted while a frame is being processed
+        if self.processing_thread and self.processing_thread is not threading.current_thread():
+            self.processing_thread.join(timeout=2)
+        
+        if self.wakeword_detector:
+            self.wakeword_detector.delete()
+        if self.pending_detector:
+            self.pending_detector.delete()
+            self.pending_detector = None
+        
+        if self.utterance_streamer:
+            self.utterance_streamer.close()
+            stats = self.utterance_streamer.stats()
+            print(f"[{self.device_id}] Utterance audio: {stats['utterances']} utterance(s), "
+                  f"{stats['bytes_sent'] / 1024:.0f} KiB streamed, {stats['dropped']} chunk(s) dropped")
+        
+        if self.audio_buffer:
+            stats = self.audio_buffer.stats()
+            print(f"[{self.device_id}] Audio buffer: {stats['frames_read']} frames, "
+                  f"{stats['overruns']} overrun(s), {stats['dropped_bytes'] // 2} samples dropped")
+        
+        if self.audio_buffer:
+            stats = self.lag_stats()
+            print(f"[{self.device_id}] Processing lag: max {stats['max_lag_ms']:.0f}ms, "
+                  f"{stats['catchup_skips']} catch-up skip(s) ({stats['skipped_ms'] / 1000:.1f}s), "
+                  f"{stats['decimated_vad_windows']} VAD window(s) decimated")
         
-        if self.porcupine:
-            self.porcupine.delete()
+        if self.wakeword_gate:
+            stats = self.wakeword_gate.stats()
+            print(f"[{self.device_id}] Energy gate: {stats['gated_ratio'] * 100:.1f}% of {stats['frames']} "
+                  f"frames skipped, {stats['replayed']} look-back frame(s) replayed")
+        
+        if self.stream_supervisor:
+            stats = self.stream_supervisor.stats()
+            recovery = (f", recovery mean {stats['recovery_s_mean']:.2f}s max {stats['recovery_s_max']:.2f}s"
+                        if stats['recovery_s_mean'] is not None else "")
+            print(f"[{self.device_id}] RTSP stream: {stats['reconnects']} reconnect(s), "
+                  f"{stats['eofs']} EOF(s), {stats['stalls']} stall(s){recovery}")
+        
+        if self.arbiter is not None:
+            if self.pending_wakeword is not None:
+                self.arbiter.discard(self.group, self.device_id)
+            print(f"[{self.device_id}] Arbitration ({self.group}): {self.arbitration_won} wakeword(s) won, "
+                  f"{self.suppressed_wakewords} suppressed")
+        
+        if self.capture:
+            self.capture.close()
+            stats = self.capture.stats()
+            print(f"[{self.device_id}] Capture: {stats['markers']} marker(s), "
+                  f"{stats['clips_written']} clip(s) written")
+        
+        if self.audio_buffer:
+            self.audio_buffer.release()
         
         print(f"[{self.device_id}] ✓ Shutdown complete")
 
 
+# Settings applied to running devices on reload, by config section
+LIVE_SETTINGS = {
+    'vad': ('threshold', 'min_recording_time_ms', 'min_silence_duration_ms', 'max_recording_time_ms'),
+    'wakeword': ('threshold',),
+    'service': ('log_level',),
+}
+
+
+def initialize_monitors(device_configs, config, access_key, initialize, max_workers=64):
+    """Create a DeviceMonitor per device config and run initialize(monitor) on each concurrently
+    
+    Returns the monitors whose initialize() returned True, in config order.
+    Startup is bounded by the slowest device rather than the sum of all.
+    """
+    def start(device_config):
+        try:
+            monitor = DeviceMonitor(device_config, config, access_key)
+            if initialize(monitor):
+                return monitor
+        except Exception as e:
+            print(f"[{device_config.get('id', '?')}] ❌ Initialization error: {e}")
+        print(f"❌ Failed to initialize {device_config.get('name', device_config.get('id', '?'))}")
+        return None
+    
+    if not device_configs:
+        return []
+    workers = min(max_workers, len(device_configs))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='device-init') as executor:
+        monitors = list(executor.map(start, device_configs))
+    return [monitor for monitor in monitors if monitor is not None]
+
+
 class MultiDeviceManager:
     """Manages multiple device monitors"""
     def __init__(self):
         self.config = None
         self.mqtt_client = None
-        self.vad_model = None
+        self.vad = None
+        self.vad_scheduler = None
+        self.wakeword_engine = None
+        self.arbiter = None
         self.devices = []
         self.device_threads = []
+        self.runtime = 'threaded'
+        self.shard_supervisor = None
+        self.metrics_registry = None
+        self.metrics_server = None
+        self.startup_seconds = 0.0
+        self.config_path = 'config.yaml'
+        self.config_mtime = None
+        self.reload_requested = threading.Event()
     
     def load_config(self):
         """Load configuration"""
         load_dotenv()
         
         try:
-            with open('config.yaml', 'r') as f:
+            self.config_mtime = os.stat(self.config_path).st_mtime
+            with open(self.config_path, 'r') as f:
                 self.config = yaml.safe_load(f)
-            print("✓ Loaded config.yaml")
+            print(f"✓ Loaded {self.config_path}")
             
             device_count = len(self.config['axis']['devices'])
             print(f"  Found {device_count} device(s) configured")
             
+            try:
+                log.configure(self.config.get('service', {}))
+            except ValueError as e:
+                print(f"❌ {e}")
+                return False
+            
+            self.runtime = self.config.get('service', {}).get('runtime', 'threaded')
+            if self.runtime not in ('threaded', 'asyncio', 'sharded'):
+                print(f"❌ Unknown service.runtime: {self.runtime}")
+                return False
+            
             return True
         except FileNotFoundError:
-            print("❌ config.yaml not found")
+            print(f"❌ {self.config_path} not found")
             return False
     
     def initialize_mqtt(self):
-        """Initialize shared MQTT client"""
+        """Start the shared non-blocking MQTT event publisher"""
         mqtt_config = self.config['mqtt']
         broker = mqtt_config['broker']
         port = mqtt_config['port']
-        client_id = mqtt_config.get('client_id_prefix', 'axis_audio_service')
         
+        self.mqtt_client = EventPublisher(
+            broker,
+            port,
+            client_id=mqtt_config.get('client_id_prefix', 'axis_audio_service'),
+            username=os.getenv('MQTT_USERNAME'),
+            password=os.getenv('MQTT_PASSWORD'),
+            max_queue=mqtt_config.get('max_queued_events', 1000),
+            reconnect_max_delay=mqtt_config.get('reconnect_max_delay', 30)
+        )
         try:
-            self.mqtt_client = mqtt.Client(
-                callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
-                client_id=client_id
-            )
-        except AttributeError:
-            self.mqtt_client = mqtt.Client(client_id)
+            connected = self.mqtt_client.start(timeout=mqtt_config.get('connect_timeout', 5))
+        except Exception as e:
+            print(f"❌ MQTT connection failed: {e}")
+            return False
         
-        try:
-            self.mqtt_client.connect(broker, port, 60)
-            self.mqtt_client.loop_start()
+        if connected:
             print(f"✓ MQTT connected to {broker}:{port}")
+        else:
+            print(f"⚠️ MQTT broker {broker}:{port} not reachable yet - events are queued until it is")
+        return True
+    
+    def start_metrics_server(self):
+        """Serve Prometheus metrics if service.metrics_port is set"""
+        service_config = self.config.get('service', {})
+        port = service_config.get('metrics_port')
+        if not port:
             return True
-        except Exception as e:
-            print(f"❌ MQTT connection failed: {e}")
+        
+        host = service_config.get('metrics_host', '127.0.0.1')
+        self.metrics_registry = MetricsRegistry()
+        self.metrics_server = MetricsServer(self.metrics_registry, host, port)
+        try:
+            self.metrics_server.start()
+        except OSError as e:
+            print(f"❌ Metrics server failed on {host}:{port}: {e}")
             return False
+        
+        self.metrics_registry.publisher = self.mqtt_client
+        print(f"✓ Metrics at http://{host}:{self.metrics_server.port}/metrics")
+        return True
     
     def initialize_vad(self):
         """Initialize shared Silero VAD"""
@@ -389,13 +847,19 @@ class MultiDeviceManager:
             vad_config = self.config.get('vad', {})
             
             print("Loading Silero VAD (shared)...")
-            self.vad_model, _ = torch.hub.load(
-                repo_or_dir='snakers4/silero-vad',
-                model='silero_vad',
-                force_reload=False,
-                verbose=False
-            )
-            print(f"✓ Silero VAD initialized")
+            self.vad = load_vad(vad_config)
+            print(f"✓ Silero VAD initialized ({self.vad.backend} backend, per-device state)")
+            
+            if vad_config.get('batch', False):
+                self.vad_scheduler = BatchedVADScheduler(
+                    self.vad,
+                    tick_ms=vad_config.get('batch_tick_ms', 10),
+                    max_batch=vad_config.get('batch_max_size', 32)
+                )
+                self.vad_scheduler.start()
+                print(f"  Batched across devices (tick: {self.vad_scheduler.tick * 1000:.0f}ms, "
+                      f"max batch: {self.vad_scheduler.max_batch})")
+            
             print(f"  Threshold: {vad_config.get('threshold', 0.5)}")
             print(f"  Min recording: {vad_config.get('min_recording_time_ms', 1500)}ms")
             print(f"  Silence duration: {vad_config.get('min_silence_duration_ms', 800)}ms")
@@ -405,24 +869,186 @@ class MultiDeviceManager:
             print(f"❌ VAD initialization failed: {e}")
             return False
     
-    def initialize_devices(self):
-        """Initialize all device monitors"""
+    def initialize_wakeword(self):
+        """Load the shared wakeword engine"""
+        wakeword_config = self.config.get('wakeword', {})
         access_key = os.getenv('PORCUPINE_ACCESS_KEY')
         
-        if not access_key:
+        if wakeword_config.get('engine', 'porcupine') == 'porcupine' and not access_key:
             print("❌ PORCUPINE_ACCESS_KEY not found in .env")
             return False
         
-        for device_config in self.config['axis']['devices']:
-            monitor = DeviceMonitor(device_config, self.config, access_key)
-            
-            if monitor.initialize(self.mqtt_client, self.vad_model):
-                self.devices.append(monitor)
-            else:
-                print(f"❌ Failed to initialize {device_config['name']}")
-        
+        try:
+            self.wakeword_engine = load_wakeword(wakeword_config, access_key)
+            self.wakeword_engine.start()
+            print(f"✓ Wakeword engine: {self.wakeword_engine.describe()}")
+            return True
+        except Exception as e:
+            print(f"❌ Wakeword engine initialization failed: {e}")
+            return False
+    
+    def initialize_arbitration(self):
+        """Arbitrate wakewords between the devices of each group, if any device has one"""
+        try:
+            self.arbiter = create_arbiter(self.config)
+        except ValueError as e:
+            print(f"❌ Wakeword arbitration: {e}")
+            return False
+        if self.arbiter:
+            groups = {}
+            for device_config in self.config['axis']['devices']:
+                if device_config.get('group'):
+                    groups[device_config['group']] = groups.get(device_config['group'], 0) + 1
+            print(f"✓ Wakeword arbitration: {self.arbiter.describe()}")
+            print("  Groups: " + ", ".join(f"{group} ({count} devices)" for group, count in groups.items()))
+        return True
+    
+    def initialize_devices(self):
+        """Initialize all device monitors concurrently"""
+        started = time.monotonic()
+        self.devices = self.start_devices(self.config['axis']['devices'])
+        self.startup_seconds = time.monotonic() - started
         return len(self.devices) > 0
     
+    def start_devices(self, device_configs):
+        """Initialize monitors for device_configs and register them
+        
+        In the threaded runtime each device starts processing as soon as its
+        own stream is up, without waiting for the others.
+        """
+        def start_device(monitor):
+            if self.metrics_registry:
+                monitor.metrics = DeviceMetrics(monitor.device_id)
+            if monitor.group:
+                monitor.arbiter = self.arbiter
+            if not monitor.initialize(self.mqtt_client, self.vad, self.vad_scheduler,
+                                      start_stream=self.runtime == 'threaded',
+                                      wakeword_engine=self.wakeword_engine):
+                return False
+            if self.runtime == 'threaded':
+                monitor.processing_thread = threading.Thread(target=monitor.process_audio, daemon=True)
+                monitor.processing_thread.start()
+                self.device_threads.append(monitor.processing_thread)
+            return True
+        
+        monitors = initialize_monitors(device_configs, self.config, os.getenv('PORCUPINE_ACCESS_KEY'), start_device)
+        if self.metrics_registry:
+            for monitor in monitors:
+                self.metrics_registry.add_device(monitor)
+        return monitors
+    
+    def stop_device(self, device):
+        """Shut down one monitor and forget it"""
+        device.shutdown()
+        self.devices.remove(device)
+        if device.processing_thread in self.device_threads:
+            self.device_threads.remove(device.processing_thread)
+        if self.metrics_registry:
+            self.metrics_registry.remove_device(device)
+    
+    def watch_config(self):
+        """Reload config.yaml after it changed on disk or on SIGHUP; called from the main loop"""
+        try:
+            mtime = os.stat(self.config_path).st_mtime
+        except OSError:
+            mtime = self.config_mtime
+        if mtime == self.config_mtime and not self.reload_requested.is_set():
+            return
+        self.reload_requested.clear()
+        self.config_mtime = mtime
+        self.reload_config()
+    
+    def reload_config(self):
+        """Apply a changed config.yaml to the running service
+        
+        Added devices are started, removed ones stopped and changed ones
+        restarted; the others keep running. VAD and wakeword thresholds
+        are applied live. MQTT, the models and the other shared settings
+        stay as they are until the next restart.
+        """
+        print(f"\n🔄 Reloading {self.config_path}...")
+        try:
+            with open(self.config_path, 'r') as f:
+                new_config = yaml.safe_load(f)
+            device_configs = new_config['axis']['devices']
+            new_devices = {device_config['id']: device_config for device_config in device_configs}
+            if len(new_devices) != len(device_configs):
+                raise ValueError("duplicate device id")
+        except Exception as e:
+            print(f"❌ Reload failed, keeping the running configuration: {e}")
+            return
+        
+        # The running configuration with the new devices and live settings
+        config = dict(self.config)
+        config['axis'] = dict(self.config['axis'], devices=device_configs)
+        deferred = []
+        for section in sorted(set(self.config) | set(new_config)):
+            old_section = self.config.get(section) or {}
+            new_section = new_config.get(section) or {}
+            live = LIVE_SETTINGS.get(section, ('devices',) if section == 'axis' else ())
+            if not isinstance(old_section, dict) or not isinstance(new_section, dict):
+                if old_section != new_section:
+                    deferred.append(section)
+                continue
+            if ({k: v for k, v in old_section.items() if k not in live} !=
+                    {k: v for k, v in new_section.items() if k not in live}):
+                deferred.append(section)
+            if section in LIVE_SETTINGS:
+                merged = {k: v for k, v in old_section.items() if k not in live}
+                merged.update({k: v for k, v in new_section.items() if k in live})
+                config[section] = merged
+        
+        old_vad, vad_config = self.config.get('vad') or {}, config.get('vad') or {}
+        if any(old_vad.get(key) != vad_config.get(key) for key in LIVE_SETTINGS['vad']):
+            for device in self.devices:
+                device.apply_vad_config(vad_config)
+            print(f"  ✓ VAD: threshold {vad_config.get('threshold', 0.5)}, "
+                  f"min recording {vad_config.get('min_recording_time_ms', 1500)}ms, "
+                  f"silence {vad_config.get('min_silence_duration_ms', 800)}ms, "
+                  f"max recording {vad_config.get('max_recording_time_ms', 7000)}ms")
+        
+        threshold = (config.get('wakeword') or {}).get('threshold', 0.5)
+        if threshold != (self.config.get('wakeword') or {}).get('threshold', 0.5):
+            if self.wakeword_engine.set_threshold(threshold):
+                for device in self.devices:
+                    device.replace_detector()
+            print(f"  ✓ Wakeword: {self.wakeword_engine.describe()}")
+        
+        log_level = (config.get('service') or {}).get('log_level', 'INFO')
+        if log_level != log.level:
+            try:
+                log.set_level(log_level)
+                print(f"  ✓ Log level: {log.level}")
+            except ValueError as e:
+                print(f"  ❌ {e}")
+        
+        running = {device.device_id: device for device in self.devices}
+        old_devices = {device_config['id']: device_config for device_config in self.config['axis']['devices']}
+        removed = [device_id for device_id in running if device_id not in new_devices]
+        changed = [device_id for device_id in running
+                   if device_id in new_devices and new_devices[device_id] != old_devices.get(device_id)]
+        # Includes devices that failed to initialize before
+        start = [device_id for device_id in new_devices if device_id not in running or device_id in changed]
+        
+        self.config = config
+        if self.arbiter is None:
+            # Devices may have been given a group; arbitration settings
+            # themselves only change with a restart
+            try:
+                self.arbiter = create_arbiter(config)
+            except ValueError as e:
+                print(f"  ❌ Wakeword arbitration: {e}")
+        for device_id in removed + changed:
+            self.stop_device(running[device_id])
+        started = self.start_devices([new_devices[device_id] for device_id in start])
+        self.devices.extend(started)
+        
+        added = len([device for device in started if device.device_id not in changed])
+        print(f"✓ Reloaded: {added} device(s) added, {len(removed)} removed, "
+              f"{len(changed)} restarted, {len(self.devices)} active")
+        if deferred:
+            print(f"⚠️ Changes to {', '.join(deferred)} take effect after a restart")
+    
     def run(self):
         """Run all device monitors"""
         print("\n" + "="*60)
@@ -432,52 +1058,155 @@ class MultiDeviceManager:
         if not self.load_config():
             return
         
+        # Reload on SIGHUP as well as when config.yaml changes; installed for
+        # every runtime so that systemctl reload never kills the service
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, self.on_sighup)
+        
         if not self.initialize_mqtt():
             return
         
+        if self.runtime == 'sharded':
+            self.run_sharded()
+            return
+        
+        if not self.start_metrics_server():
+            return
+        
         if not self.initialize_vad():
             return
         
+        if not self.initialize_wakeword():
+            return
+        
+        if not self.initialize_arbitration():
+            return
+        
         if not self.initialize_devices():
             print("❌ No devices initialized")
             return
         
+        connecting = [device for device in self.devices
+                      if self.runtime == 'threaded' and not device.stream_ready()]
         print("\n" + "="*60)
-        print(f"✓ All systems ready - {len(self.devices)} device(s) active")
+        print(f"✓ All systems ready - {len(self.devices)} device(s) active in {self.startup_seconds:.1f}s")
+        if connecting:
+            print(f"  {len(connecting)} still connecting in the background")
         print("="*60)
         print("Active devices:")
         for device in self.devices:
-            print(f"  • {device.device_name} ({device.device_id}) @ {device.address}")
+            status = " (connecting)" if device in connecting else ""
+            print(f"  • {device.device_name} ({device.device_id}) @ {device.pcm_path or device.address}{status}")
         print("\nPress Ctrl+C to stop")
         print("="*60 + "\n")
         
-        # Start processing threads for each device
-        for device in self.devices:
-            thread = threading.Thread(target=device.process_audio, daemon=True)
-            thread.start()
-            self.device_threads.append(thread)
+        if self.runtime == 'asyncio':
+            self.run_asyncio()
+            return
         
         try:
             while True:
-                time.sleep(1)
+                self.reload_requested.wait(1)
+                self.watch_config()
+                for device in self.devices:
+                    device.stream_supervisor.check_health()
         except KeyboardInterrupt:
             print("\n\nShutting down...")
             self.shutdown()
     
+    def on_sighup(self, signum, frame):
+        """Request a reload; only the threaded runtime can reload in place"""
+        if self.runtime == 'threaded':
+            self.reload_requested.set()
+        else:
+            log.warning(f"⚠️ SIGHUP ignored - the {self.runtime} runtime does not reload "
+                        f"{self.config_path}, restart the service to apply changes")
+    
+    def run_asyncio(self):
+        """Run all devices on a single asyncio event loop"""
+        log.warning("⚠️ The asyncio runtime is experimental - dropped or stalled streams are not "
+                    "reconnected, no health lines are printed and SIGHUP does not reload. "
+                    "Use the threaded or sharded runtime in production")
+        if self.config.get('audio', {}).get('ingest', 'ffmpeg') != 'ffmpeg':
+            print("⚠️ audio.ingest is ignored by the asyncio runtime - using FFmpeg")
+        workers = self.config.get('service', {}).get('inference_workers')
+        engine = AsyncEngine(self.devices, workers=workers)
+        print(f"Runtime: asyncio ({engine.workers} inference worker(s))")
+        engine.run()
+        print("\n\nShutting down...")
+        self.shutdown()
+    
+    def run_sharded(self):
+        """Run devices spread over supervised worker processes"""
+        access_key = os.getenv('PORCUPINE_ACCESS_KEY')
+        engine = self.config.get('wakeword', {}).get('engine', 'porcupine')
+        
+        if engine == 'porcupine' and not access_key:
+            print("❌ PORCUPINE_ACCESS_KEY not found in .env")
+            return
+        
+        # Validated here; each worker arbitrates the groups it runs
+        if not self.initialize_arbitration():
+            return
+        
+        shards = self.config.get('service', {}).get('shards')
+        self.shard_supervisor = ShardSupervisor(self.config, access_key, self.mqtt_client, shards)
+        
+        if not self.start_metrics_server():
+            return
+        if self.metrics_registry:
+            self.metrics_registry.shard_supervisor = self.shard_supervisor
+        
+        print("\n" + "="*60)
+        print(f"Runtime: sharded ({self.shard_supervisor.shards} worker process(es))")
+        print("Press Ctrl+C to stop")
+        print("="*60 + "\n")
+        
+        self.shard_supervisor.start()
+        try:
+            self.shard_supervisor.supervise()
+        except KeyboardInterrupt:
+            print("\n\nShutting down...")
+            self.shard_supervisor.print_metrics()
+            self.shard_supervisor.stop()
+            self.shutdown()
+    
     def shutdown(self):
         """Clean shutdown all devices"""
+        # Runtime records first, then the shutdown summaries
+        log.flush()
         for device in self.devices:
             device.shutdown()
         
+        if self.wakeword_engine:
+            self.wakeword_engine.stop()
+        
+        if self.vad_scheduler:
+            stats = self.vad_scheduler.stats()
+            self.vad_scheduler.stop()
+            print(f"VAD batches: {stats['batches']} (mean size {stats['mean_batch_size']:.1f}, "
+                  f"max {stats['max_batch_size']}), latency p50 {stats['latency_ms_p50']:.1f}ms "
+                  f"p99 {stats['latency_ms_p99']:.1f}ms")
+        
+        if self.metrics_server:
+            self.metrics_server.stop()
+        
         if self.mqtt_client:
-            self.mqtt_client.loop_stop()
-            self.mqtt_client.disconnect()
+            self.mqtt_client.stop()
+            stats = self.mqtt_client.stats()
+            print(f"MQTT: {stats['published']} event(s) published, {stats['reconnects']} reconnect(s), "
+                  f"{stats['dropped']} dropped")
         
         print("\n✓ All devices stopped")
 
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--config', default='config.yaml', help='configuration file (default: config.yaml)')
+    args = parser.parse_args()
+    
     manager = MultiDeviceManager()
+    manager.config_path = args.config
     manager.run()
 
 
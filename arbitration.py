@@ -0,0 +1,130 @@
+"""
+Cross-device wakeword arbitration
+Speakers close to each other often hear the same wakeword. Devices that
+share a group (the 'group' key of a device in config.yaml) submit their
+detections to one WakewordArbiter instead of publishing them. The first
+detection opens a round; when window_ms have passed since it, the device
+that heard the wakeword loudest (or with the highest detector score) wins
+and publishes the wakeword and, later, the end of the recording. The
+others drop their recording without publishing anything.
+
+Detections are timestamped with the arrival of the frame's audio, so a
+device that lags behind still joins the round of the same utterance; one
+that reports after the round was decided is suppressed when its audio
+arrived within the window.
+"""
+
+import threading
+
+
+class _Round:
+    """The detections of one group that may belong to one utterance"""
+    __slots__ = ('first', 'candidates', 'winner')
+
+    def __init__(self, first):
+        self.first = first
+        self.candidates = {}
+        self.winner = None
+
+
+class WakewordArbiter:
+    """Picks one device per utterance among the devices of a group"""
+    SELECT = ('energy', 'score')
+
+    def __init__(self, window_ms=500, select='energy', audio_clock=False):
+        if select not in self.SELECT:
+            raise ValueError(f"Unknown arbitration.select: {select}")
+        self.window = window_ms / 1000
+        self.select = select
+        # Recordings replayed together share their audio clock; live devices
+        # share time.monotonic()
+        self.audio_clock = audio_clock
+        self._lock = threading.Lock()
+        self._rounds = {}
+        self._results = {}
+
+        # Statistics
+        self.decided = 0
+        self.suppressed = 0
+
+    def submit(self, group, device_id, arrival, score=None, energy=None):
+        """Enter a detection whose audio arrived at arrival
+
+        Returns False when the device lost a round that was already
+        decided, otherwise None; the outcome is then collected with poll().
+        """
+        with self._lock:
+            current = self._rounds.get(group)
+            if current is not None and current.winner is not None:
+                if abs(arrival - current.first) < self.window and device_id != current.winner:
+                    self.suppressed += 1
+                    return False
+                current = None
+            if current is None:
+                current = self._rounds[group] = _Round(arrival)
+            current.first = min(current.first, arrival)
+            # A repeat detection keeps the device's first entry
+            current.candidates.setdefault(device_id, (score, energy, arrival))
+            return None
+
+    def poll(self, group, device_id, now):
+        """True if the device won its round, False if it lost, None while undecided
+
+        Decides the round once now is window_ms past its first detection;
+        pass float('inf') to decide it at once.
+        """
+        with self._lock:
+            current = self._rounds.get(group)
+            if current is not None and current.winner is None and now >= current.first + self.window:
+                self._decide(current)
+            return self._results.pop(device_id, None)
+
+    def _decide(self, current):
+        """Record the outcome for every candidate; called with _lock held"""
+        def rank(device_id):
+            score, energy, arrival = current.candidates[device_id]
+            value = score if self.select == 'score' and score is not None else energy
+            # Ties go to the earliest detection
+            return (value if value is not None else float('-inf'), -arrival)
+
+        current.winner = max(current.candidates, key=rank)
+        for device_id in current.candidates:
+            self._results[device_id] = device_id == current.winner
+        self.decided += 1
+        self.suppressed += len(current.candidates) - 1
+
+    def winner(self, group):
+        """Device id that won the group's latest round, if it was decided"""
+        current = self._rounds.get(group)
+        return current.winner if current is not None else None
+
+    def discard(self, group, device_id):
+        """Forget a device that shuts down while its detection is pending"""
+        with self._lock:
+            self._results.pop(device_id, None)
+            current = self._rounds.get(group)
+            if current is not None and current.winner is None:
+                current.candidates.pop(device_id, None)
+                if not current.candidates:
+                    del self._rounds[group]
+
+    def describe(self):
+        return f"{self.window * 1000:.0f}ms window, highest {self.select} wins"
+
+    def stats(self):
+        return {
+            'rounds': self.decided,
+            'suppressed': self.suppressed,
+        }
+
+
+def create_arbiter(config, audio_clock=False):
+    """Build the arbiter for the arbitration: config section, or None when no device has a group"""
+    if not any(device_config.get('group') for device_config in config['axis']['devices']):
+        return None
+    arbitration_config = config.get('arbitration') or {}
+    return WakewordArbiter(
+        window_ms=arbitration_config.get('window_ms', 500),
+        select=arbitration_config.get('select', 'energy'),
+        audio_clock=audio_clock
+    )
@@ -0,0 +1,138 @@
+"""
+Single asyncio event-loop runtime for all devices
+Replaces the two threads per device of the threaded runtime: FFmpeg stdout
+is read through asyncio subprocess pipes straight into each ring buffer,
+frames are dispatched from one loop, and Porcupine/VAD inference runs on a
+small bounded thread pool.
+"""
+
+import os
+import sys
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from service_log import log
+
+
+class AsyncEngine:
+    """Runs ingest and detection for every device on one event loop"""
+    def __init__(self, devices, workers=None):
+        self.devices = devices
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = None
+        self.transports = {}
+        self._frames_ready = {}
+
+    def run(self):
+        """Run until every stream has ended or Ctrl+C"""
+        # Before 3.12 asyncio waits for each child on its own thread;
+        # pidfd watching keeps the runtime at one thread per worker
+        if sys.version_info < (3, 12) and hasattr(os, 'pidfd_open'):
+            asyncio.set_child_watcher(asyncio.PidfdChildWatcher())
+        try:
+            asyncio.run(self._main())
+        except KeyboardInterrupt:
+            pass
+
+    async def _main(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix='inference'
+        )
+        tasks = []
+        for device in self.devices:
+            device.running = True
+            self._frames_ready[device.device_id] = asyncio.Event()
+            tasks.append(asyncio.create_task(self._ingest(device)))
+            tasks.append(asyncio.create_task(self._detect(device)))
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.executor.shutdown(wait=True)
+
+    async def _ingest(self, device):
+        """Stream FFmpeg stdout into the device ring buffer until it exits"""
+        loop = asyncio.get_running_loop()
+        frames_ready = self._frames_ready[device.device_id]
+        try:
+            transport, protocol = await loop.subprocess_exec(
+                lambda: _PcmPipeProtocol(device.audio_buffer, frames_ready),
+                *device.ffmpeg_command(),
+                stdin=None,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+        except Exception as e:
+            log.error(f"❌ RTSP stream failed: {e}", device=device.device_id)
+            device.audio_buffer.close()
+            frames_ready.set()
+            return
+
+        self.transports[device.device_id] = transport
+        log.info("🎤 RTSP stream started (asyncio)", device=device.device_id)
+        try:
+            await protocol.exited
+        finally:
+            if transport.get_returncode() is None:
+                transport.kill()
+            transport.close()
+            device.audio_buffer.close()
+            frames_ready.set()
+            log.warning("⚠️ RTSP stream ended", device=device.device_id)
+
+    async def _detect(self, device):
+        """Hand each device's buffered frames to the inference pool in order"""
+        loop = asyncio.get_running_loop()
+        frames_ready = self._frames_ready[device.device_id]
+        buffer = device.audio_buffer
+
+        log.info("🎧 Audio processing started - listening for wakeword...", device=device.device_id)
+
+        while device.running:
+            frames_ready.clear()
+            # Re-check after clearing so a write in between is not missed
+            if buffer.available_samples() < buffer.frame_samples:
+                if buffer.closed:
+                    break
+                await frames_ready.wait()
+                continue
+
+            await loop.run_in_executor(self.executor, self._drain, device)
+
+        log.info("Audio processing stopped", device=device.device_id)
+
+    @staticmethod
+    def _drain(device):
+        """Process every complete frame currently buffered for one device
+
+        Runs on an inference worker; each frame view is finished with
+        before the next read_frame() call invalidates it.
+        """
+        while device.running:
+            frame = device.read_frame(timeout=0)
+            if frame is None:
+                return
+            try:
+                device.process_frame(frame)
+            except Exception as e:
+                log.error(f"⚠️ Processing error: {e}", device=device.device_id, key='processing', error=repr(e))
+
+
+class _PcmPipeProtocol(asyncio.SubprocessProtocol):
+    """Copies FFmpeg stdout straight into a ring buffer from the event loop"""
+    def __init__(self, audio_buffer, frames_ready):
+        self.audio_buffer = audio_buffer
+        self.frames_ready = frames_ready
+        self.exited = asyncio.get_running_loop().create_future()
+
+    def pipe_data_received(self, fd, data):
+        self.audio_buffer.write(data)
+        self.frames_ready.set()
+
+    def connection_lost(self, exc):
+        # Called once the process has exited and stdout is fully drained
+        if not self.exited.done():
+            self.exited.set_result(None)
@@ -0,0 +1,146 @@
+"""
+Cross-device batch scheduler for neural inference
+Device threads submit one input each and wait; a scheduler thread collects
+what arrives within a tick (or until max_batch inputs are waiting) and
+scores it with a single call of a batch-inference callable. The VAD and
+openWakeWord schedulers are built on it.
+"""
+
+import time
+import threading
+import numpy as np
+
+from service_log import log
+
+
+class _Request:
+    """A pending input waiting for its batch"""
+    __slots__ = ('key', 'item', 'submitted', 'done', 'result')
+
+    def __init__(self, key, item):
+        self.key = key
+        self.item = item
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+
+
+class BatchScheduler:
+    """Collects inputs from all devices and scores them in batches
+
+    infer_batch(keys, items) scores one batch and returns a result per
+    input; keys identify the per-device state (a VAD stream or a wakeword
+    detector) that the call advances.
+    """
+    def __init__(self, infer_batch, tick_ms=10, max_batch=32, name='inference'):
+        self.infer_batch = infer_batch
+        self.tick = tick_ms / 1000.0
+        self.max_batch = max_batch
+        self.name = name
+
+        self._pending = []
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        # Statistics
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.windows = 0
+        self.max_batch_seen = 0
+        self._latencies = []
+
+    def start(self):
+        """Start the scheduler thread"""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f'batched-{self.name}', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the scheduler thread and release any waiting devices"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def submit(self, key, item, timeout=1.0):
+        """Queue one device's input and wait for its result
+
+        Returns None if the input was not scored: the scheduler stopped,
+        the batch failed or timeout passed. A timed-out input that is still
+        queued is withdrawn, so the device's next input is the only request
+        for its state.
+        """
+        request = _Request(key, item)
+        with self._cond:
+            if not self._running:
+                return None
+            self._pending.append(request)
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._cond.notify()
+        if request.done.wait(timeout):
+            return request.result
+        with self._cond:
+            if request in self._pending:
+                self._pending.remove(request)
+        return None
+
+    def _run(self):
+        """Wait for a tick or a full batch, then score everything pending"""
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                if not self._running:
+                    pending, self._pending = self._pending, []
+                    for request in pending:
+                        request.done.set()
+                    return
+
+                deadline = self._pending[0].submitted + self.tick
+                while self._running and len(self._pending) < self.max_batch:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+            if not batch:
+                # Every queued input timed out while waiting for the tick
+                continue
+
+            try:
+                results = self.infer_batch([r.key for r in batch], [r.item for r in batch])
+                for request, result in zip(batch, results):
+                    request.result = float(result)
+                self._record(batch)
+            except Exception as e:
+                log.error(f"⚠️ Batched {self.name} error: {e}", key=f'batched-{self.name}', error=repr(e))
+            finally:
+                for request in batch:
+                    request.done.set()
+
+    def _record(self, batch):
+        now = time.perf_counter()
+        with self._stats_lock:
+            self.batches += 1
+            self.windows += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self._latencies.extend(now - r.submitted for r in batch)
+            if len(self._latencies) > 10000:
+                del self._latencies[:-5000]
+
+    def stats(self):
+        """Batch-size and latency statistics"""
+        with self._stats_lock:
+            latencies = np.array(self._latencies) * 1000
+            return {
+                'batches': self.batches,
+                'windows': self.windows,
+                'mean_batch_size': self.windows / self.batches if self.batches else 0.0,
+                'max_batch_size': self.max_batch_seen,
+                'latency_ms_p50': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+                'latency_ms_p99': float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+            }
@@ -0,0 +1,1838 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the Axis Speaker Wakeword Monitor audio pipeline
+Run without arguments to list the available benchmarks.
+"""
+
+import io
+import os
+import sys
+import time
+import socket
+import struct
+import argparse
+import threading
+from collections import deque
+
+import numpy as np
+
+from pcm_buffer import PcmRingBuffer
+from vad import load_vad
+from mqtt_testing import LoopbackMqttBroker
+
+
+FRAME_SAMPLES = 512
+CHUNK_BYTES = 3200
+
+
+def print_header(text):
+    """Print a formatted header"""
+    print("\n" + "=" * 70)
+    print(f"  {text}")
+    print("=" * 70)
+
+
+def synthetic_pcm(seconds, seed=0):
+    """Generate random 16 kHz int16 PCM as bytes"""
+    rng = np.random.default_rng(seed)
+    return rng.integers(-3000, 3000, int(seconds * 16000), dtype=np.int16).tobytes()
+
+
+class LegacyDequeBuffer:
+    """The deque-of-chunks buffer previously used by DeviceMonitor"""
+    def __init__(self):
+        self.audio_buffer = deque(maxlen=1000)
+        self.buffer_lock = threading.Lock()
+
+    def fill_from(self, stream, chunk_size):
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return 0
+        with self.buffer_lock:
+            self.audio_buffer.append(chunk)
+        return len(chunk)
+
+    def read_frame(self, frame_size):
+        with self.buffer_lock:
+            if not self.audio_buffer:
+                return None
+
+            collected = b''
+            chunks_to_remove = []
+
+            for i, chunk in enumerate(self.audio_buffer):
+                if len(collected) >= frame_size:
+                    break
+                collected += chunk
+                chunks_to_remove.append(i)
+
+            for i in reversed(chunks_to_remove):
+                self.audio_buffer.popleft()
+
+            if len(collected) >= frame_size:
+                if len(collected) > frame_size:
+                    remainder = collected[frame_size:]
+                    self.audio_buffer.appendleft(remainder)
+                return collected[:frame_size]
+            else:
+                if collected:
+                    self.audio_buffer.appendleft(collected)
+                return None
+
+
+def _run_buffer(pcm, fill, read):
+    """Interleave chunk writes and frame reads the way the two device threads do"""
+    stream = io.BytesIO(pcm)
+    frames = 0
+    read_time = 0.0
+    start = time.perf_counter()
+    while fill(stream):
+        t0 = time.perf_counter()
+        while read() is not None:
+            frames += 1
+        read_time += time.perf_counter() - t0
+    elapsed = time.perf_counter() - start
+    return frames, elapsed, read_time
+
+
+def bench_ring_buffer(args):
+    """Compare PcmRingBuffer against the legacy deque read_frame"""
+    print_header("Ring buffer vs. legacy deque read_frame")
+    pcm = synthetic_pcm(args.seconds)
+    audio_seconds = len(pcm) / 32000
+
+    legacy = LegacyDequeBuffer()
+    legacy_frames, legacy_time, legacy_read = _run_buffer(
+        pcm,
+        lambda s: legacy.fill_from(s, CHUNK_BYTES),
+        lambda: legacy.read_frame(FRAME_SAMPLES * 2)
+    )
+
+    ring = PcmRingBuffer(FRAME_SAMPLES, 16000 * 10)
+    ring_frames, ring_time, ring_read = _run_buffer(
+        pcm,
+        lambda s: ring.fill_from(s, CHUNK_BYTES),
+        lambda: ring.read_frame(timeout=0)
+    )
+
+    for name, frames, elapsed, read_time in (
+            ("deque", legacy_frames, legacy_time, legacy_read),
+            ("ring", ring_frames, ring_time, ring_read)):
+        print(f"  {name:6s} {frames:8d} frames  total {elapsed * 1000:8.1f} ms  "
+              f"read_frame {read_time / frames * 1e6:6.2f} µs/frame  "
+              f"{audio_seconds / elapsed:8.0f}x real time")
+
+    print(f"\n  read_frame speedup: {legacy_read / ring_read:.1f}x")
+    print(f"  Ring overruns: {ring.overruns}")
+
+
+class PacedStream:
+    """Binary stream that delivers chunks at real-time pace and records arrival times"""
+    def __init__(self, pcm, chunk_bytes):
+        self.stream = io.BytesIO(pcm)
+        self.chunk_bytes = chunk_bytes
+        self.interval = chunk_bytes / 32000
+        self.arrivals = []
+        self._next = time.perf_counter()
+
+    def readinto(self, buffer):
+        delay = self._next - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        self._next += self.interval
+        count = self.stream.readinto(buffer[:self.chunk_bytes])
+        self.arrivals.append(time.perf_counter())
+        return count
+
+
+def _consume(ring, poll, seconds=None, deliveries=None):
+    """Run a processing loop until the buffer closes or the time is up
+
+    Returns the consumer thread's CPU time and appends frame delivery times.
+    """
+    cpu_start = time.thread_time()
+    deadline = time.perf_counter() + seconds if seconds else None
+    while deadline is None or time.perf_counter() < deadline:
+        if poll:
+            frame = ring.read_frame(timeout=0)
+            if frame is None:
+                if ring.closed:
+                    break
+                time.sleep(0.01)
+                continue
+        else:
+            frame = ring.read_frame(timeout=0.5)
+            if frame is None:
+                if ring.closed:
+                    break
+                continue
+        if deliveries is not None:
+            deliveries.append(time.perf_counter())
+    return time.thread_time() - cpu_start
+
+
+def bench_frame_delivery(args):
+    """Idle CPU and arrival-to-inference latency: 10 ms sleep-poll vs. blocking read"""
+    print_header("Frame delivery: sleep-poll vs. blocking read")
+    idle_seconds = 3.0
+    stream_seconds = min(args.seconds, 10)
+    # Chunks of exactly one frame, so every arrival completes a frame
+    chunk_bytes = FRAME_SAMPLES * 2
+
+    for name, poll in (("poll", True), ("block", False)):
+        ring = PcmRingBuffer(FRAME_SAMPLES, 16000 * 10)
+        idle_cpu = _consume(ring, poll, seconds=idle_seconds)
+
+        ring = PcmRingBuffer(FRAME_SAMPLES, 16000 * 10)
+        stream = PacedStream(synthetic_pcm(stream_seconds), chunk_bytes)
+
+        def reader():
+            while ring.fill_from(stream, chunk_bytes):
+                pass
+            ring.close()
+
+        deliveries = []
+        writer = threading.Thread(target=reader, daemon=True)
+        writer.start()
+        _consume(ring, poll, deliveries=deliveries)
+        writer.join()
+
+        count = min(len(deliveries), len(stream.arrivals))
+        latency = (np.array(deliveries[:count]) - np.array(stream.arrivals[:count])) * 1000
+        print(f"  {name:6s} idle CPU {idle_cpu / idle_seconds * 100:6.3f}% per device   "
+              f"latency p50 {np.percentile(latency, 50):6.2f} ms  "
+              f"p99 {np.percentile(latency, 99):6.2f} ms  max {latency.max():6.2f} ms")
+
+
+def vad_config_from_args(args):
+    """Build a vad: config section from the command line"""
+    vad_config = {'backend': args.vad_backend}
+    if args.vad_model:
+        vad_config['model_path'] = args.vad_model
+    return vad_config
+
+
+def bench_vad_streams(args):
+    """Per-device VAD streams: interleaved threads must match isolated runs"""
+    print_header("VAD per-device streams: isolated vs. interleaved")
+    vad = load_vad(vad_config_from_args(args))
+    devices = args.devices
+    windows = int(min(args.seconds, 30) * 16000) // 512
+    audio = [np.frombuffer(synthetic_pcm(windows * 512 / 16000, seed=i), dtype=np.int16)
+             for i in range(devices)]
+
+    def run_device(i, results):
+        stream = vad.new_stream()
+        results[i] = [vad.probability(stream, audio[i][k * 512:(k + 1) * 512])
+                      for k in range(windows)]
+
+    isolated = {}
+    start = time.perf_counter()
+    for i in range(devices):
+        run_device(i, isolated)
+    isolated_time = time.perf_counter() - start
+
+    interleaved = {}
+    threads = [threading.Thread(target=run_device, args=(i, interleaved)) for i in range(devices)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    interleaved_time = time.perf_counter() - start
+
+    identical = all(isolated[i] == interleaved[i] for i in range(devices))
+    total = devices * windows
+    print(f"  isolated     {total:6d} windows  {isolated_time / total * 1e6:8.1f} µs/window")
+    print(f"  interleaved  {total:6d} windows  {interleaved_time / total * 1e6:8.1f} µs/window "
+          f"({devices} threads)")
+    print(f"\n  Interleaved output identical to isolated: {'✓ yes' if identical else '❌ NO'}")
+    if not identical:
+        sys.exit(1)
+
+
+VAD_STARTUP_PROBE = """
+import resource, sys, time, json
+start = time.perf_counter()
+from vad import load_vad
+vad = load_vad(json.loads(sys.argv[1]))
+loaded = time.perf_counter()
+import numpy as np
+vad.probability(vad.new_stream(), np.zeros(512, dtype=np.int16))
+first = time.perf_counter()
+print(json.dumps({
+    'load_s': loaded - start,
+    'first_inference_ms': (first - loaded) * 1000,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'torch_imported': 'torch' in sys.modules,
+}))
+"""
+
+
+def bench_vad_backends(args):
+    """Startup time and RSS of each VAD backend, each in a fresh interpreter"""
+    import json
+    import subprocess
+
+    print_header("VAD backends: startup time and memory")
+    candidates = [('torch', {'backend': 'torch'})]
+    if args.torchscript_model:
+        candidates.append(('torchscript', {'backend': 'torchscript', 'model_path': args.torchscript_model}))
+    if args.onnx_model:
+        candidates.append(('onnx', {'backend': 'onnx', 'model_path': args.onnx_model}))
+
+    for name, vad_config in candidates:
+        result = subprocess.run(
+            [sys.executable, '-c', VAD_STARTUP_PROBE, json.dumps(vad_config)],
+            capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'failed'
+            print(f"  {name:12s} ❌ {error}")
+            continue
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"  {name:12s} startup {stats['load_s'] * 1000:8.0f} ms  "
+              f"first inference {stats['first_inference_ms']:6.1f} ms  "
+              f"max RSS {stats['max_rss_mb']:7.1f} MB  "
+              f"torch imported: {'yes' if stats['torch_imported'] else 'no'}")
+
+
+PACED_SOURCE = """
+import sys, time
+chunks = int(float(sys.argv[1]) * 10)
+chunk = bytes(3200)
+out = sys.stdout.buffer
+deadline = time.monotonic()
+for _ in range(chunks):
+    out.write(chunk)
+    out.flush()
+    deadline += 0.1
+    time.sleep(max(0.0, deadline - time.monotonic()))
+"""
+
+
+class SyntheticDevice:
+    """Device stand-in fed by a real-time PCM subprocess with a cheap detector"""
+    def __init__(self, index, seconds):
+        self.device_id = f"bench{index:03d}"
+        self.seconds = seconds
+        self.running = False
+        self.audio_buffer = PcmRingBuffer(FRAME_SAMPLES, 16000 * 10)
+        self.frames = 0
+
+    def ffmpeg_command(self):
+        return [sys.executable, '-c', PACED_SOURCE, str(self.seconds)]
+
+    def read_frame(self, timeout=0.5):
+        return self.audio_buffer.read_frame(timeout)
+
+    def process_frame(self, frame):
+        self.frames += 1
+        return float(np.sqrt(np.mean(frame.astype(np.float32) ** 2)))
+
+
+def _run_threaded(devices):
+    """Two threads per device, as DeviceMonitor runs them"""
+    import subprocess
+
+    def read_loop(device, process):
+        while device.audio_buffer.fill_from(process.stdout, CHUNK_BYTES):
+            pass
+        device.audio_buffer.close()
+
+    def process_loop(device):
+        while device.running:
+            frame = device.audio_buffer.read_frame(timeout=0.5)
+            if frame is None:
+                if device.audio_buffer.closed:
+                    break
+                continue
+            device.process_frame(frame)
+
+    threads = []
+    processes = []
+    for device in devices:
+        device.running = True
+        process = subprocess.Popen(device.ffmpeg_command(), stdout=subprocess.PIPE, bufsize=4096)
+        processes.append(process)
+        threads.append(threading.Thread(target=read_loop, args=(device, process), daemon=True))
+        threads.append(threading.Thread(target=process_loop, args=(device,), daemon=True))
+    for thread in threads:
+        thread.start()
+    peak_threads = threading.active_count()
+    for thread in threads:
+        thread.join()
+    for process in processes:
+        process.wait()
+    return peak_threads
+
+
+def _run_asyncio(devices, workers):
+    """One event loop plus a bounded inference pool"""
+    from async_engine import AsyncEngine
+
+    engine = AsyncEngine(devices, workers=workers)
+    peak = []
+    sampler = threading.Timer(1.0, lambda: peak.append(threading.active_count()))
+    sampler.start()
+    engine.run()
+    return peak[0] if peak else threading.active_count()
+
+
+def bench_runtime(args):
+    """CPU and context switches per device: threaded vs. asyncio runtime"""
+    import resource
+
+    print_header(f"Runtime: threaded vs. asyncio ({args.devices} devices)")
+    seconds = min(args.seconds, 10)
+    results = []
+    for name in ('threaded', 'asyncio'):
+        devices = [SyntheticDevice(i, seconds) for i in range(args.devices)]
+        before = resource.getrusage(resource.RUSAGE_SELF)
+        start = time.perf_counter()
+        if name == 'threaded':
+            peak_threads = _run_threaded(devices)
+        else:
+            peak_threads = _run_asyncio(devices, args.workers)
+        wall = time.perf_counter() - start
+        after = resource.getrusage(resource.RUSAGE_SELF)
+
+        cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+        voluntary = after.ru_nvcsw - before.ru_nvcsw
+        involuntary = after.ru_nivcsw - before.ru_nivcsw
+        frames = sum(device.frames for device in devices)
+        results.append((name, cpu, voluntary, involuntary, wall, peak_threads, frames))
+
+    print()
+    for name, cpu, voluntary, involuntary, wall, peak_threads, frames in results:
+        per_device = args.devices * wall
+        print(f"  {name:9s} CPU {cpu / per_device * 100:6.3f}% per device  "
+              f"ctx switches/s per device: {voluntary / per_device:6.1f} voluntary, "
+              f"{involuntary / per_device:5.1f} involuntary  "
+              f"threads {peak_threads:4d}  frames {frames}")
+
+
+class LoopbackRtspServer:
+    """Minimal RTSP stand-in that streams a G.711 sine over interleaved RTP
+
+    Answers OPTIONS/DESCRIBE/SETUP/PLAY/GET_PARAMETER/TEARDOWN the way an
+    Axis device does and paces 20 ms packets in real time. With stall=True
+    the connection stays open but silent once the audio has been sent.
+    """
+    def __init__(self, seconds, codec='PCMU', frequency=440.0, stall=False):
+        from rtsp_ingest import G711_TABLES
+
+        self.seconds = seconds
+        self.stall = stall
+        self.codec = codec
+        self.payload_type = 0 if codec == 'PCMU' else 8
+        table = G711_TABLES[codec]
+        order = np.argsort(table)
+        t = np.arange(int(seconds * 8000)) / 8000.0
+        signal = (np.sin(2 * np.pi * frequency * t) * 8000).astype(np.int32)
+        index = np.clip(np.searchsorted(table[order], signal), 0, 255)
+        self.codes = order[index].astype(np.uint8)
+        self.decoded = table[self.codes]
+
+    def serve(self, port_queue):
+        """Accept connections forever, one streaming thread per client"""
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(256)
+        port_queue.put(listener.getsockname()[1])
+        while True:
+            client, _ = listener.accept()
+            threading.Thread(target=self._handle, args=(client,), daemon=True).start()
+
+    def _handle(self, client):
+        reader = client.makefile('rb')
+        streaming = None
+        try:
+            while True:
+                request_line = reader.readline().decode()
+                if not request_line:
+                    return
+                method, url = request_line.split()[:2]
+                headers = {}
+                while True:
+                    line = reader.readline().decode().strip()
+                    if not line:
+                        break
+                    key, _, value = line.partition(':')
+                    headers[key.strip().lower()] = value.strip()
+
+                reply = {'CSeq': headers.get('cseq', '0')}
+                body = b''
+                if method == 'DESCRIBE':
+                    body = (f"v=0\r\no=- 0 0 IN IP4 127.0.0.1\r\ns=Media Presentation\r\nt=0 0\r\n"
+                            f"m=video 0 RTP/AVP 96\r\na=rtpmap:96 H264/90000\r\na=control:trackID=1\r\n"
+                            f"m=audio 0 RTP/AVP {self.payload_type}\r\n"
+                            f"a=rtpmap:{self.payload_type} {self.codec}/8000\r\n"
+                            f"a=control:trackID=2\r\n").encode()
+                    reply['Content-Base'] = url.split('?')[0] + '/'
+                    reply['Content-Type'] = 'application/sdp'
+                elif method == 'SETUP':
+                    reply['Transport'] = headers.get('transport', '')
+                    reply['Session'] = '12345678;timeout=60'
+                elif method == 'OPTIONS':
+                    reply['Public'] = 'OPTIONS, DESCRIBE, SETUP, PLAY, GET_PARAMETER, TEARDOWN'
+                reply['Content-Length'] = str(len(body))
+                response = 'RTSP/1.0 200 OK\r\n' + ''.join(f"{k}: {v}\r\n" for k, v in reply.items())
+                client.sendall(response.encode() + b'\r\n' + body)
+
+                if method == 'PLAY' and streaming is None:
+                    streaming = threading.Thread(target=self._stream, args=(client,), daemon=True)
+                    streaming.start()
+                elif method == 'TEARDOWN':
+                    return
+        except (OSError, ValueError):
+            pass
+        finally:
+            if streaming is None:
+                client.close()
+
+    def _stream(self, client):
+        samples = 160
+        next_send = time.monotonic()
+        try:
+            for index, offset in enumerate(range(0, len(self.codes), samples)):
+                payload = self.codes[offset:offset + samples].tobytes()
+                rtp = bytes([0x80, self.payload_type]) + struct.pack('>HII', index & 0xFFFF, offset, 0x1234)
+                packet = rtp + payload
+                client.sendall(b'$\x00' + struct.pack('>H', len(packet)) + packet)
+                next_send += samples / 8000
+                time.sleep(max(0.0, next_send - time.monotonic()))
+            if self.stall:
+                time.sleep(3600)
+        except OSError:
+            pass
+        finally:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            client.close()
+
+
+def _rss_mb(pid='self'):
+    """Resident set size of a process from /proc"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _proc_cpu_seconds(pid):
+    """User plus system CPU time of a process from /proc"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, IndexError):
+        return 0.0
+
+
+def _drain_frames(ring, keep=None):
+    """Consume frames until the ring closes, optionally keeping copies"""
+    while True:
+        frame = ring.read_frame(timeout=0.5)
+        if frame is None:
+            if ring.closed:
+                return
+        elif keep is not None:
+            keep.append(frame.copy())
+
+
+def bench_ingest(args):
+    """Native RTSP/RTP ingest vs. FFmpeg against a loopback RTSP stand-in"""
+    import shutil
+    import resource
+    import subprocess
+    import multiprocessing
+    from rtsp_ingest import NativeRtspIngest
+
+    seconds = min(args.seconds, 10)
+    print_header(f"Ingest: native RTSP/RTP vs. FFmpeg ({args.devices} devices, {seconds:.0f}s)")
+
+    server = LoopbackRtspServer(seconds)
+    port_queue = multiprocessing.Queue()
+    server_process = multiprocessing.Process(target=server.serve, args=(port_queue,), daemon=True)
+    server_process.start()
+    port = port_queue.get(timeout=10)
+    address = f"127.0.0.1:{port}"
+
+    try:
+        # Native: one reader thread per device inside this process
+        rings = [PcmRingBuffer(FRAME_SAMPLES, 16000 * 10) for _ in range(args.devices)]
+        rss_before = _rss_mb()
+        before = resource.getrusage(resource.RUSAGE_SELF)
+        ingests = []
+        threads = []
+        for ring in rings:
+            ingest = NativeRtspIngest(address, 'root', '', ring)
+            ingest.connect()
+            ingests.append(ingest)
+
+            def run(ingest=ingest, ring=ring):
+                ingest.run()
+                ring.close()
+            threads.append(threading.Thread(target=run, daemon=True))
+            threads.append(threading.Thread(target=_drain_frames, args=(ring,), daemon=True))
+
+        # Keep a copy of the first device's audio to verify decoding
+        first_frames = []
+        threads[1] = threading.Thread(target=_drain_frames, args=(rings[0], first_frames), daemon=True)
+        for thread in threads:
+            thread.start()
+        peak_rss = rss_before
+        while any(thread.is_alive() for thread in threads):
+            peak_rss = max(peak_rss, _rss_mb())
+            time.sleep(0.2)
+        after = resource.getrusage(resource.RUSAGE_SELF)
+        native_cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+        native_rss = peak_rss - rss_before
+
+        received = np.concatenate(first_frames) if first_frames else np.array([], dtype=np.int16)
+        expected = np.empty(len(server.decoded) * 2, dtype=np.int32)
+        expected[1::2] = server.decoded
+        expected[0::2] = (np.concatenate([[0], server.decoded[:-1]]) + server.decoded) >> 1
+        matches = len(received) > 0 and np.array_equal(received, expected[:len(received)])
+        lost = sum(ingest.lost_packets for ingest in ingests)
+
+        print(f"  native  CPU {native_cpu / seconds / args.devices * 100:6.2f}% per device  "
+              f"memory +{native_rss / args.devices:6.2f} MB per device  "
+              f"lost packets {lost}")
+        print(f"          decoded audio matches reference: {'✓ yes' if matches else '❌ NO'} "
+              f"({len(received)} samples)")
+
+        if not shutil.which('ffmpeg'):
+            print("  ffmpeg  skipped (ffmpeg not found in PATH)")
+            return
+
+        url = f"rtsp://127.0.0.1:{port}/axis-media/media.amp?audio=1"
+        cmd = ['ffmpeg', '-rtsp_transport', 'tcp', '-i', url,
+               '-ar', '16000', '-ac', '1', '-f', 's16le', 'pipe:1']
+        processes = []
+        threads = []
+        for _ in range(args.devices):
+            ring = PcmRingBuffer(FRAME_SAMPLES, 16000 * 10)
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=4096)
+            processes.append(process)
+
+            def read(process=process, ring=ring):
+                while ring.fill_from(process.stdout, CHUNK_BYTES):
+                    pass
+                ring.close()
+            threads.append(threading.Thread(target=read, daemon=True))
+            threads.append(threading.Thread(target=_drain_frames, args=(ring,), daemon=True))
+        before = resource.getrusage(resource.RUSAGE_SELF)
+        for thread in threads:
+            thread.start()
+        child_cpu = {}
+        child_rss = {}
+        while any(process.poll() is None for process in processes):
+            for process in processes:
+                if process.poll() is None:
+                    child_cpu[process.pid] = _proc_cpu_seconds(process.pid)
+                    child_rss[process.pid] = max(child_rss.get(process.pid, 0.0), _rss_mb(process.pid))
+            time.sleep(0.2)
+        for thread in threads:
+            thread.join(timeout=2)
+        after = resource.getrusage(resource.RUSAGE_SELF)
+        ffmpeg_cpu = sum(child_cpu.values()) + (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+        print(f"  ffmpeg  CPU {ffmpeg_cpu / seconds / args.devices * 100:6.2f}% per device  "
+              f"memory +{sum(child_rss.values()) / args.devices:6.2f} MB per device")
+    finally:
+        server_process.terminate()
+
+
+FLAKY_SOURCE = """
+import sys, time
+mode, seconds = sys.argv[1], float(sys.argv[2])
+out = sys.stdout.buffer
+if mode == 'refuse':
+    sys.exit(1)
+deadline = time.monotonic()
+for _ in range(int(seconds * 10)):
+    out.write(bytes(3200))
+    out.flush()
+    deadline += 0.1
+    time.sleep(max(0.0, deadline - time.monotonic()))
+if mode == 'stall':
+    time.sleep(3600)
+"""
+
+
+def _supervise(name, supervisor, ring, events, timeout):
+    """Run a supervisor until it has seen the expected failures; report recovery"""
+    frames = []
+    consumer = threading.Thread(target=_drain_frames, args=(ring, frames), daemon=True)
+    supervisor.open()
+    supervisor.start()
+    consumer.start()
+
+    start = time.monotonic()
+    while time.monotonic() - start < timeout and len(supervisor.recovery_times) < events:
+        time.sleep(0.1)
+    # Let the last recovered stream deliver a little audio
+    time.sleep(0.5)
+    consumer_alive = consumer.is_alive()
+    supervisor.stop()
+    ring.close()
+    consumer.join(timeout=2)
+
+    stats = supervisor.stats()
+    recoveries = supervisor.recovery_times
+    print(f"  {name:7s} EOFs {stats['eofs']}  stalls {stats['stalls']}  "
+          f"reconnects {stats['reconnects']}  errors {stats['errors']}")
+    if recoveries:
+        print(f"          recovery time: mean {stats['recovery_s_mean']:.2f}s  "
+              f"max {stats['recovery_s_max']:.2f}s  "
+              f"({', '.join(f'{r:.2f}' for r in recoveries)})")
+    print(f"          consumer stayed attached: {'✓ yes' if consumer_alive else '❌ NO'} "
+          f"({len(frames)} frames over {time.monotonic() - start:.1f}s)")
+
+
+def bench_supervisor(args):
+    """Stream supervisor against sources that drop, stall and refuse"""
+    import multiprocessing
+    from stream_supervisor import StreamSupervisor, FfmpegSource, NativeSource
+    from rtsp_ingest import NativeRtspIngest
+
+    print_header("Stream supervisor: EOF/stall detection and recovery")
+    stall_timeout = 1.0
+    print(f"  stall timeout {stall_timeout:.1f}s, backoff 0.2s → 2.0s (jittered)")
+
+    # FFmpeg stand-in: a subprocess that plays, then drops, stalls or refuses
+    schedule = ['drop', 'stall', 'refuse', 'refuse', 'drop', 'stall', 'play']
+    attempts = []
+    ring = PcmRingBuffer(FRAME_SAMPLES, 16000 * 10)
+
+    def flaky_source():
+        mode = schedule[min(len(attempts), len(schedule) - 1)]
+        attempts.append(mode)
+        cmd = [sys.executable, '-c', FLAKY_SOURCE, mode, '1.0' if mode != 'play' else '60']
+        return FfmpegSource(cmd, ring)
+
+    supervisor = StreamSupervisor('fake', flaky_source, ring, stall_timeout=stall_timeout,
+                                  initial_delay=0.2, max_delay=2.0)
+    _supervise('ffmpeg', supervisor, ring, events=4, timeout=30)
+    print(f"          source sequence: {' → '.join(attempts)}")
+
+    # Native ingest against the loopback RTSP server, ending and then stalling
+    for stall in (False, True):
+        server = LoopbackRtspServer(1.0, stall=stall)
+        port_queue = multiprocessing.Queue()
+        server_process = multiprocessing.Process(target=server.serve, args=(port_queue,), daemon=True)
+        server_process.start()
+        address = f"127.0.0.1:{port_queue.get(timeout=10)}"
+        try:
+            ring = PcmRingBuffer(FRAME_SAMPLES, 16000 * 10)
+            supervisor = StreamSupervisor(
+                'native',
+                lambda ring=ring: NativeSource(NativeRtspIngest(address, 'root', '', ring)),
+                ring, stall_timeout=stall_timeout, initial_delay=0.2, max_delay=2.0
+            )
+            _supervise('native', supervisor, ring, events=3, timeout=30)
+        finally:
+            server_process.terminate()
+
+
+class _MarkerDetector:
+    """Porcupine stand-in: fires on numbered marker samples and burns CPU while overloaded"""
+    frame_length = FRAME_SAMPLES
+    marker = 12000
+
+    def __init__(self, overload, cost):
+        self.overload = overload
+        self.cost = cost
+        self.position = 0
+        self.detections = []
+
+    def process(self, frame):
+        start = time.perf_counter()
+        seconds = self.position / 16000
+        cost = self.cost[1] if self.overload[0] <= seconds < self.overload[1] else self.cost[0]
+        while time.perf_counter() - start < cost:
+            pass
+        self.position += len(frame)
+        peak = int(frame.max())
+        if peak < self.marker:
+            return -1
+        self.detections.append((time.perf_counter(), peak - self.marker))
+        return 0
+
+    def delete(self):
+        pass
+
+
+class _ConstantVAD:
+    """VAD stand-in that reports speech at a fixed cost per window"""
+    def __init__(self, cost):
+        self.cost = cost
+        self.calls = 0
+
+    def new_stream(self):
+        from vad import VADStream
+        return VADStream()
+
+    def probability(self, stream, audio_samples):
+        start = time.perf_counter()
+        while time.perf_counter() - start < self.cost:
+            pass
+        self.calls += 1
+        return 0.9
+
+
+class _RecordingMqtt:
+    """MQTT stand-in that timestamps each publish"""
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload=None, qos=0, retain=False, on_ack=None, lossy=False):
+        self.published.append((time.perf_counter(), topic, payload))
+
+
+def _bench_device(detector, vad, max_lag_ms=0, buffer_seconds=120, device_id='bench'):
+    """A DeviceMonitor wired to stand-ins instead of the wakeword engine, Silero and MQTT"""
+    from app import DeviceMonitor
+
+    config = {
+        'mqtt': {'topics': {'wakeword': 'wake/{device_id}', 'vad_stop': 'stop/{device_id}'}},
+        'audio': {'max_lag_ms': max_lag_ms},
+    }
+    device = DeviceMonitor({'name': device_id, 'id': device_id, 'address': '127.0.0.1'}, config, '')
+    device.wakeword_detector = detector
+    device.vad = vad
+    device.vad_stream = vad.new_stream()
+    device.mqtt_client = _RecordingMqtt()
+    device.audio_buffer = PcmRingBuffer(FRAME_SAMPLES, 16000 * buffer_seconds)
+    device.running = True
+    return device
+
+
+def bench_catch_up(args):
+    """Detection latency under overload with and without the max-lag catch-up"""
+    seconds = min(args.seconds, 20)
+    overload = (2.0, seconds * 0.6)
+    print_header(f"Catch-up: {seconds:.0f}s stream, processing at 1.5x real time "
+                 f"from {overload[0]:.0f}s to {overload[1]:.0f}s")
+
+    # Silence with a wakeword marker every 3 seconds
+    pcm = np.zeros(int(seconds * 16000), dtype=np.int16)
+    marker_offsets = list(range(16000, len(pcm) - FRAME_SAMPLES, 3 * 16000))
+    pcm[marker_offsets] = _MarkerDetector.marker + np.arange(len(marker_offsets))
+
+    for max_lag_ms in (0, 1000):
+        frame_seconds = FRAME_SAMPLES / 16000
+        device = _bench_device(
+            _MarkerDetector(overload, (0.005, frame_seconds * 1.5)),
+            _ConstantVAD(0.004),
+            max_lag_ms=max_lag_ms
+        )
+
+        stream = PacedStream(pcm.tobytes(), CHUNK_BYTES)
+
+        def reader(ring=device.audio_buffer):
+            while ring.fill_from(stream, CHUNK_BYTES):
+                pass
+            ring.close()
+
+        writer = threading.Thread(target=reader, daemon=True)
+        processor = threading.Thread(target=device.process_audio, daemon=True)
+        writer.start()
+        processor.start()
+        writer.join()
+        # Without catch-up the backlog is drained after the stream ends
+        processor.join(timeout=seconds)
+        device.running = False
+        processor.join(timeout=2)
+
+        wakes = len([1 for _, topic, _ in device.mqtt_client.published if topic == 'wake/bench'])
+        latencies = []
+        for when, index in device.wakeword_detector.detections:
+            arrived = stream.arrivals[marker_offsets[index] * 2 // CHUNK_BYTES]
+            latencies.append((when - arrived) * 1000)
+        latencies = np.array(latencies) if latencies else np.array([0.0])
+        stats = device.lag_stats()
+        label = f"max_lag {max_lag_ms}ms" if max_lag_ms else "no catch-up"
+        print(f"  {label:15s} detections {wakes}/{len(marker_offsets)}  "
+              f"publish latency p50 {np.percentile(latencies, 50):7.0f} ms  max {latencies.max():7.0f} ms  "
+              f"max lag {stats['max_lag_ms']:6.0f} ms")
+        print(f"  {'':15s} skipped {stats['skipped_ms'] / 1000:.1f}s in {stats['catchup_skips']} skip(s), "
+              f"{stats['decimated_vad_windows']} of {stats['decimated_vad_windows'] + device.vad.calls} "
+              f"VAD windows decimated")
+
+
+class _StubWakewordEngine:
+    """Wakeword engine stand-in handing out marker detectors"""
+    keyword = 'marker'
+
+    def create_detector(self):
+        return _MarkerDetector((0, 0), (0, 0))
+
+    def describe(self):
+        return "marker detector"
+
+
+def bench_startup(args):
+    """Startup time for N devices: sequential with a fixed 1.5s sleep vs. concurrent readiness"""
+    import contextlib
+    import app
+    from app import DeviceMonitor, initialize_monitors
+
+    devices = args.devices
+    connect_delay = 0.4
+    refusals = 3
+    print_header(f"Startup: {devices} devices, RTSP answers after {connect_delay:.1f}s, "
+                 f"one device refuses {refusals} connection(s) first, 1s startup timeout")
+    config = {
+        'mqtt': {'topics': {'wakeword': 'wake/{device_id}', 'vad_stop': 'stop/{device_id}'}},
+        'service': {'startup_timeout': 1, 'reconnect_initial_delay': 0.2, 'reconnect_delay': 1},
+    }
+    device_configs = [{'name': f'd{i}', 'id': f'd{i}', 'address': '127.0.0.1'} for i in range(devices)]
+
+    class BenchDevice(DeviceMonitor):
+        """FFmpeg replaced by a subprocess that answers after connect_delay"""
+        attempts = 0
+
+        def ffmpeg_command(self):
+            self.attempts += 1
+            refuse = self.device_id == 'd0' and self.attempts <= refusals
+            script = f"import time; time.sleep({connect_delay}); {FLAKY_SOURCE}"
+            return [sys.executable, '-c', script, 'refuse' if refuse else 'play', '60']
+
+    ready_at = {}
+
+    def sequential():
+        """The previous loop: open each stream in turn and sleep 1.5s"""
+        opened = []
+        for device_config in device_configs:
+            device = BenchDevice(device_config, config, '')
+            device.initialize_wakeword()
+            device.audio_buffer = PcmRingBuffer(FRAME_SAMPLES, 16000 * 10)
+            device.stream_supervisor = None
+            source = device.new_stream_source()
+            try:
+                source.open()
+                time.sleep(1.5)
+                ready_at[device.device_id] = time.monotonic()
+            except Exception:
+                pass
+            opened.append((device, source))
+        return opened
+
+    def concurrent():
+        def start_device(device):
+            if not device.initialize(_RecordingMqtt(), _ConstantVAD(0), wakeword_engine=_StubWakewordEngine()):
+                return False
+            if device.stream_ready():
+                ready_at[device.device_id] = time.monotonic()
+            return True
+        return initialize_monitors(device_configs, config, '', start_device)
+
+    for name in ('sequential', 'concurrent'):
+        ready_at.clear()
+        start = time.monotonic()
+        with contextlib.redirect_stdout(io.StringIO()):
+            if name == 'sequential':
+                started = sequential()
+            else:
+                # initialize_monitors builds app.DeviceMonitor instances
+                app.DeviceMonitor = BenchDevice
+                try:
+                    started = concurrent()
+                finally:
+                    app.DeviceMonitor = DeviceMonitor
+        elapsed = time.monotonic() - start
+
+        # Healthy devices, then the refusing one, which may still be retrying
+        if name == 'concurrent':
+            refused = next(d for d in started if d.device_id == 'd0')
+            if refused.stream_supervisor.wait_ready(15):
+                ready_at.setdefault('d0', time.monotonic())
+        healthy = sorted(t - start for device_id, t in ready_at.items() if device_id != 'd0')
+        line = (f"  {name:10s} startup {elapsed:6.2f}s  {len(healthy)}/{devices - 1} healthy devices "
+                f"listening after {healthy[0]:5.2f}s (first) {healthy[-1]:5.2f}s (last)")
+        if name == 'sequential':
+            line += "  refused device reported ready, never listening"
+        elif 'd0' in ready_at:
+            line += f"  refused device listening after {ready_at['d0'] - start:.2f}s"
+        else:
+            line += "  refused device not recovered"
+        print(line)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            if name == 'sequential':
+                for device, source in started:
+                    source.close()
+            else:
+                for device in started:
+                    device.shutdown()
+
+
+class _PorcupineStandIn:
+    """pvporcupine.Porcupine without the native library
+
+    process() converts frames the way the binding does, building a ctypes
+    array element by element; _process_func takes the place of the native
+    call and reports no keyword.
+    """
+    frame_length = FRAME_SAMPLES
+
+    class PicovoiceStatuses:
+        SUCCESS = 0
+
+    def __init__(self):
+        import ctypes
+        self.ctypes = ctypes
+        self._handle = object()
+
+    def _process_func(self, handle, pcm, result):
+        result._obj.value = -1
+        return self.PicovoiceStatuses.SUCCESS
+
+    def process(self, pcm):
+        ctypes = self.ctypes
+        result = ctypes.c_int()
+        self._process_func(self._handle, (ctypes.c_short * len(pcm))(*pcm), ctypes.byref(result))
+        return result.value
+
+    def delete(self):
+        pass
+
+
+class LegacyHotLoop:
+    """The per-frame work of the previous hot loop: binding process(), a
+    growing VAD buffer and fresh window, context and tensor arrays per call"""
+    def __init__(self, porcupine, vad):
+        from vad import to_window
+        self.to_window = to_window
+        self.porcupine = porcupine
+        self.vad = vad
+        self.state = np.zeros((2, 1, 128), dtype=np.float32)
+        self.context = np.zeros((1, 64), dtype=np.float32)
+        self.vad_buffer = np.array([], dtype=np.int16)
+
+    def process_frame(self, frame):
+        self.porcupine.process(frame)
+        self.vad_buffer = np.concatenate([self.vad_buffer, frame])
+        if len(self.vad_buffer) >= 512:
+            window = self.to_window(self.vad_buffer)[np.newaxis]
+            probs, self.state, self.context = self.vad.forward(window, self.state, self.context)
+            float(probs[0])
+            self.vad_buffer = self.vad_buffer[-512:]
+
+
+def bench_hot_loop(args):
+    """Allocations and time per frame: previous hot loop vs. preallocated buffers"""
+    import gc
+    import tracemalloc
+    from wakeword import PorcupineDetector
+
+    access_key = os.getenv('PORCUPINE_ACCESS_KEY')
+    if access_key:
+        import pvporcupine
+        detector_name = "Porcupine"
+    else:
+        detector_name = "Porcupine binding stand-in (no native call)"
+    vad = load_vad(vad_config_from_args(args))
+    seconds = min(args.seconds, 30)
+    print_header(f"Hot loop: {detector_name}, {vad.backend} VAD on every frame, {seconds:.0f}s of audio")
+    pcm = synthetic_pcm(seconds)
+
+    def porcupine():
+        if access_key:
+            return pvporcupine.create(access_key=access_key, keywords=['porcupine'])
+        return _PorcupineStandIn()
+
+    def legacy():
+        ring = PcmRingBuffer(FRAME_SAMPLES, 16000 * 10)
+        loop = LegacyHotLoop(porcupine(), vad)
+
+        def read():
+            # The previous read_frame sliced a new view for every frame
+            frame = ring.read_frame(timeout=0)
+            return None if frame is None else frame[:]
+        return ring, read, loop.process_frame, loop.porcupine
+
+    def current():
+        detector = PorcupineDetector(porcupine())
+        device = _bench_device(detector, vad, buffer_seconds=10)
+        # Keep the device recording with VAD scored on every frame and no endpoint
+        device.wakeword_detected = True
+        device.recording_start_time = 0.0
+        device.min_recording_time = device.max_recording_time = float('inf')
+        return device.audio_buffer, lambda: device.read_frame(timeout=0), device.process_frame, detector
+
+    def run(build, traced):
+        ring, read, process, detector = build()
+        stream = io.BytesIO(pcm)
+        frames = 0
+        transient = []
+        elapsed = 0.0
+        gc.collect()
+        if traced:
+            tracemalloc.start()
+        while ring.fill_from(stream, CHUNK_BYTES):
+            while True:
+                if traced:
+                    tracemalloc.reset_peak()
+                    base = tracemalloc.get_traced_memory()[0]
+                    t0 = 0.0
+                else:
+                    t0 = time.perf_counter()
+                frame = read()
+                if frame is None:
+                    break
+                process(frame)
+                if traced:
+                    current_bytes, peak = tracemalloc.get_traced_memory()
+                    transient.append(peak - base)
+                else:
+                    elapsed += time.perf_counter() - t0
+                frames += 1
+        if traced:
+            tracemalloc.stop()
+        detector.delete()
+        return frames, elapsed, np.array(transient[len(transient) // 10:])
+
+    results = {}
+    for name, build in (('previous', legacy), ('current', current)):
+        frames, _, transient = run(build, traced=True)
+        elapsed = min(run(build, traced=False)[1] for _ in range(3))
+        results[name] = elapsed / frames
+        print(f"  {name:9s} {elapsed / frames * 1e6:7.1f} µs/frame  "
+              f"allocated per frame: mean {transient.mean():7.0f} B  max {transient.max():6.0f} B  "
+              f"frames allocating: {np.count_nonzero(transient) / len(transient) * 100:5.1f}%")
+    print(f"\n  hot loop speedup: {results['previous'] / results['current']:.2f}x")
+
+
+def bench_metrics(args):
+    """Hot-loop CPU cost of the metrics instrumentation and scrape cost"""
+    import contextlib
+    from metrics import DeviceMetrics, MetricsRegistry
+
+    seconds = min(args.seconds, 120)
+    detector_cost = 100e-6
+    access_key = os.getenv('PORCUPINE_ACCESS_KEY')
+    if access_key:
+        import pvporcupine
+        detector_name = "Porcupine"
+    else:
+        detector_name = f"detector stand-in costing {detector_cost * 1e6:.0f} µs/frame"
+    print_header(f"Metrics overhead: {seconds:.0f}s of audio per run, {detector_name}")
+
+    # Wakeword markers every 3 seconds keep the VAD path busy too
+    pcm = np.zeros(int(seconds * 16000), dtype=np.int16)
+    marker_offsets = list(range(16000, len(pcm) - FRAME_SAMPLES, 3 * 16000))
+    pcm[marker_offsets] = _MarkerDetector.marker
+
+    def run(instrumented):
+        if access_key:
+            detector = pvporcupine.create(access_key=access_key, keywords=['porcupine'])
+        else:
+            detector = _MarkerDetector((0, 0), (detector_cost, detector_cost))
+        device = _bench_device(detector, _ConstantVAD(50e-6), buffer_seconds=int(seconds) + 1)
+        if instrumented:
+            device.metrics = DeviceMetrics(device.device_id)
+            MetricsRegistry().add_device(device)
+        device.audio_buffer.write(pcm)
+        device.audio_buffer.close()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.process_time()
+            while True:
+                frame = device.read_frame(timeout=0)
+                if frame is None:
+                    break
+                device.process_frame(frame)
+            cpu = time.process_time() - start
+        frames = device.audio_buffer.frames_read
+        detector.delete()
+        return cpu / frames, device
+
+    # Alternate runs and keep the best of each to suppress scheduling noise
+    plain, instrumented = [], []
+    for _ in range(5):
+        plain.append(run(False)[0])
+        cost, device = run(True)
+        instrumented.append(cost)
+    plain, instrumented = min(plain), min(instrumented)
+    frames = device.audio_buffer.frames_read
+    wakeword_seconds, vad_seconds = device.metrics.wakeword_seconds, device.metrics.vad_seconds
+    samples = wakeword_seconds.count + len(wakeword_seconds.pending) + vad_seconds.count + len(vad_seconds.pending)
+
+    # The difference of the two loops is within their run-to-run noise, so
+    # the verdict times the recording calls themselves, as often as the
+    # instrumented run made them
+    def recording_cost():
+        histogram = DeviceMetrics('bench').wakeword_seconds
+        start = time.process_time()
+        for _ in range(samples):
+            began = time.perf_counter()
+            histogram.record(time.perf_counter() - began)
+        return (time.process_time() - start) / frames
+
+    recording = min(recording_cost() for _ in range(5))
+    frame_seconds = FRAME_SAMPLES / 16000
+    print(f"  hot loop without metrics {plain * 1e6:8.2f} µs/frame")
+    print(f"  hot loop with metrics    {instrumented * 1e6:8.2f} µs/frame "
+          f"(difference {(instrumented - plain) * 1e6:.2f} µs)")
+    print(f"  histogram samples: wakeword {wakeword_seconds.count + len(wakeword_seconds.pending)}, "
+          f"VAD {vad_seconds.count + len(vad_seconds.pending)}")
+    print(f"  instrumentation cost     {recording * 1e6:8.2f} µs/frame = "
+          f"{recording / plain * 100:.2f}% of the hot loop, "
+          f"{recording / frame_seconds * 100:.4f}% of one core per device")
+    # The limit is on the hot loop's own CPU time, the stricter of the two
+    # figures above
+    within_limit = recording / plain < 0.01
+
+    registry = MetricsRegistry()
+    for i in range(args.devices):
+        device = _bench_device(_MarkerDetector((0, 0), (0, 0)), _ConstantVAD(0),
+                               buffer_seconds=10, device_id=f"bench{i:03d}")
+        device.metrics = DeviceMetrics(device.device_id)
+        registry.add_device(device)
+    start = time.perf_counter()
+    for _ in range(20):
+        text = registry.render()
+    scrape = (time.perf_counter() - start) / 20
+    print(f"  scrape of {args.devices} devices: {scrape * 1000:.2f} ms, "
+          f"{len(text.splitlines())} lines, {len(text) / 1024:.1f} KiB")
+    print(f"\n  Instrumentation under 1% of the hot loop: {'✓ yes' if within_limit else '❌ NO'}")
+    if not within_limit:
+        sys.exit(1)
+
+
+def bench_utterance_stream(args):
+    """Latency of utterance audio reaching a Unix-socket consumer while the user speaks"""
+    import tempfile
+    from utterance_stream import create_streamer, read_message
+
+    seconds = min(args.seconds, 40)
+    print_header(f"Utterance streaming over a Unix socket: {seconds:.0f}s paced stream")
+
+    # A wakeword marker every 10 seconds; the VAD stand-in always hears
+    # speech, so every utterance runs to the 7 s maximum
+    pcm = np.frombuffer(synthetic_pcm(seconds), dtype=np.int16).copy()
+    marker_offsets = list(range(16000, len(pcm) - 8 * 16000, 10 * 16000))
+    pcm[marker_offsets] = _MarkerDetector.marker + np.arange(len(marker_offsets))
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.sock')
+    device = _bench_device(_MarkerDetector((0, 0), (0, 0)), _ConstantVAD(0), buffer_seconds=10)
+    device.utterance_streamer = create_streamer(
+        'bench', {'transport': 'unix', 'socket_path': path, 'pre_roll_ms': 500, 'chunk_ms': 100}, None, None)
+    pre_roll = device.utterance_streamer.pre_roll_samples
+    device.audio_buffer = PcmRingBuffer(FRAME_SAMPLES, 16000 * 10, history_samples=pre_roll)
+
+    consumer = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    consumer.connect(path)
+    received = []
+
+    def consume():
+        while True:
+            message = read_message(consumer)
+            if message is None:
+                return
+            received.append((time.perf_counter(), *message))
+
+    threading.Thread(target=consume, daemon=True).start()
+    stream = PacedStream(pcm.tobytes(), CHUNK_BYTES)
+
+    def reader(ring=device.audio_buffer):
+        while ring.fill_from(stream, CHUNK_BYTES):
+            pass
+        ring.close()
+
+    writer = threading.Thread(target=reader, daemon=True)
+    processor = threading.Thread(target=device.process_audio, daemon=True)
+    writer.start()
+    processor.start()
+    writer.join()
+    processor.join(timeout=5)
+    time.sleep(0.2)
+    device.utterance_streamer.close()
+
+    def arrival(sample):
+        return stream.arrivals[min(sample * 2 // CHUNK_BYTES, len(stream.arrivals) - 1)]
+
+    first_audio, chunk_latency, before_endpoint = [], [], []
+    exact = True
+    endpoints = [when for when, topic, _ in device.mqtt_client.published if topic == 'stop/bench']
+    utterance = None
+    for when, kind, body in received:
+        if kind == 'start':
+            end = round(body['audio_time_s'] * 16000)
+            utterance = {'base': end - body['pre_roll_ms'] * 16, 'wake': end, 'audio': bytearray()}
+        elif kind == 'audio' and utterance:
+            if not utterance['audio']:
+                first_audio.append((when - arrival(utterance['wake'] - 1)) * 1000)
+            utterance['audio'] += body
+            last = utterance['base'] + len(utterance['audio']) // 2 - 1
+            if last >= utterance['wake']:
+                chunk_latency.append((when - arrival(last)) * 1000)
+        elif kind == 'end' and utterance:
+            audio = np.frombuffer(bytes(utterance['audio']), dtype=np.int16)
+            base = utterance['base']
+            exact &= np.array_equal(audio, pcm[base:base + len(audio)])
+            endpoint = next((t for t in endpoints if t >= when - 0.05), None)
+            if endpoint is not None:
+                before_endpoint.append(len(audio) / 16000)
+            utterance = None
+
+    utterances = sum(1 for _, kind, _ in received if kind == 'end')
+    print(f"  utterances streamed {utterances}/{len(marker_offsets)}, "
+          f"audio identical to the stream: {'✓ yes' if exact else '❌ NO'}")
+    if first_audio:
+        print(f"  first audio after wakeword frame  p50 {np.percentile(first_audio, 50):6.2f} ms  "
+              f"max {max(first_audio):6.2f} ms")
+    if chunk_latency:
+        print(f"  chunk latency (last sample → consumer)  p50 {np.percentile(chunk_latency, 50):6.2f} ms  "
+              f"p99 {np.percentile(chunk_latency, 99):6.2f} ms")
+    if before_endpoint:
+        print(f"  audio delivered by the endpoint  mean {np.mean(before_endpoint):.2f}s per utterance "
+              f"(previously none until ASR opened its own stream)")
+
+
+def bench_mqtt_publisher(args):
+    """Event delivery through a broker outage: inline paho publish vs. EventPublisher"""
+    import json
+    import paho.mqtt.client as mqtt
+    from event_publisher import EventPublisher
+
+    devices = args.devices
+    seconds, outage = 6.0, (2.0, 4.0)
+    interval = 0.05
+    print_header(f"MQTT events: {devices} devices, an event every {interval * 1000:.0f} ms each, "
+                 f"broker down from {outage[0]:.0f}s to {outage[1]:.0f}s")
+
+    def inline_client(port):
+        try:
+            client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2, client_id='bench-inline')
+        except AttributeError:
+            client = mqtt.Client('bench-inline')
+        client.reconnect_delay_set(0.25, 1)
+        client.connect('127.0.0.1', port, 60)
+        client.loop_start()
+        return client
+
+    for name, qos in (('inline', 0), ('inline', 1), ('publisher', 0), ('publisher', 1)):
+        broker = LoopbackMqttBroker()
+        broker.start()
+        if name == 'inline':
+            client = inline_client(broker.port)
+        else:
+            client = EventPublisher('127.0.0.1', broker.port, client_id='bench-publisher',
+                                    username='bench', password='secret',
+                                    reconnect_min_delay=0.25, reconnect_max_delay=1)
+            client.start()
+        time.sleep(0.3)
+
+        call_times = []
+        sent = []
+        start = time.monotonic()
+
+        def device(index):
+            sequence = 0
+            while time.monotonic() - start < seconds:
+                payload = json.dumps({'device_id': f'd{index}', 'seq': sequence})
+                t0 = time.perf_counter()
+                client.publish(f'bench/d{index}', payload, qos=qos, retain=True)
+                call_times.append(time.perf_counter() - t0)
+                sent.append((index, sequence))
+                sequence += 1
+                time.sleep(interval)
+
+        threads = [threading.Thread(target=device, args=(i,)) for i in range(devices)]
+        for thread in threads:
+            thread.start()
+        time.sleep(outage[0])
+        broker.stop()
+        time.sleep(outage[1] - outage[0])
+        broker.start()
+        for thread in threads:
+            thread.join()
+
+        # Let queued and in-flight events drain
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and len({m[2] for m in broker.messages}) < len(sent):
+            time.sleep(0.1)
+        if name == 'inline':
+            client.loop_stop()
+            client.disconnect()
+        else:
+            client.stop()
+        broker.stop()
+
+        received = {}
+        for _, topic, payload, _, retain in broker.messages:
+            event = json.loads(payload)
+            received.setdefault(event['device_id'], []).append(event['seq'])
+        unique = sum(len(set(seqs)) for seqs in received.values())
+        ordered = all(seqs == sorted(seqs) for seqs in received.values())
+        calls = np.array(call_times) * 1e6
+        line = (f"  {name:9s} QoS {qos}  delivered {unique:4d}/{len(sent)}  "
+                f"lost {len(sent) - unique:4d}  in order: {'yes' if ordered else 'no '}  "
+                f"publish() p50 {np.percentile(calls, 50):6.1f} µs  p99 {np.percentile(calls, 99):7.1f} µs")
+        if name == 'publisher':
+            latency = client.publish_seconds
+            line += (f"  retain {'✓' if all(m[4] for m in broker.messages) else '❌'}"
+                     f"  auth {'✓' if broker.credentials and broker.credentials[-1] == ('bench', 'secret') else '❌'}"
+                     f"  mean queued→ack {latency.sum / max(1, latency.count) * 1000:.0f} ms")
+        print(line)
+
+
+def _channel_reader(name, frame_samples, delay, results):
+    """Shared PCM channel reader process; reports a digest of what it read"""
+    import hashlib
+    from pcm_channel import PcmChannelReader
+
+    reader = PcmChannelReader(name, frame_samples=frame_samples)
+    results.put('attached')
+    digest = hashlib.sha1()
+    samples = 0
+    start = time.process_time()
+    while True:
+        frame = reader.read_frame(timeout=2)
+        if frame is None:
+            break
+        digest.update(frame)
+        samples += len(frame)
+        if delay:
+            time.sleep(delay)
+    results.put((frame_samples, delay, samples, digest.hexdigest(), reader.stats(),
+                 time.process_time() - start))
+    reader.close()
+
+
+def _queue_reader(chunks, results):
+    """Reader process fed copies of every chunk through a multiprocessing.Queue"""
+    import hashlib
+
+    results.put('attached')
+    digest = hashlib.sha1()
+    samples = 0
+    start = time.process_time()
+    while True:
+        chunk = chunks.get()
+        if chunk is None:
+            break
+        digest.update(chunk)
+        samples += len(chunk) // 2
+    results.put((0, 0, samples, digest.hexdigest(), None, time.process_time() - start))
+
+
+def bench_pcm_channel(args):
+    """One device stream read by several processes: shared memory vs. a copy per reader"""
+    import hashlib
+    import multiprocessing
+
+    seconds = min(args.seconds, 60)
+    speed = 10
+    print_header(f"PCM fan-out to other processes: {seconds:.0f}s of audio at {speed}x real time")
+    pcm = np.frombuffer(synthetic_pcm(seconds), dtype=np.int16)
+    context = multiprocessing.get_context('spawn')
+
+    def produce(ring, queues=()):
+        """Feed the ring in 100 ms chunks next to the device's own reader
+
+        Returns the producer process's CPU time per chunk.
+        """
+        consumer = threading.Thread(target=_drain_frames, args=(ring,), daemon=True)
+        consumer.start()
+        pause = CHUNK_BYTES / 2 / 16000 / speed
+        chunks = 0
+        start = time.process_time()
+        for offset in range(0, len(pcm), CHUNK_BYTES // 2):
+            chunk = pcm[offset:offset + CHUNK_BYTES // 2]
+            ring.write(chunk)
+            for queue in queues:
+                queue.put(chunk.tobytes())
+            chunks += 1
+            time.sleep(pause)
+        ring.close()
+        consumer.join()
+        for queue in queues:
+            queue.put(None)
+        return (time.process_time() - start) / chunks
+
+    def collect(results, processes):
+        """Wait until every reader is attached"""
+        for _ in processes:
+            results.get(timeout=30)
+
+    def finish(results, processes):
+        reports = [results.get(timeout=30) for _ in processes]
+        for process in processes:
+            process.join(timeout=5)
+        return reports
+
+    ring = PcmRingBuffer(FRAME_SAMPLES, 10 * 16000)
+    cost = produce(ring)
+    print(f"  no other readers          producer {cost * 1e6:7.1f} µs/chunk")
+
+    # Copies: the device hands every chunk to a queue per reader
+    results = context.Queue()
+    queues = [context.Queue() for _ in range(3)]
+    processes = [context.Process(target=_queue_reader, args=(queue, results), daemon=True) for queue in queues]
+    for process in processes:
+        process.start()
+    collect(results, processes)
+    ring = PcmRingBuffer(FRAME_SAMPLES, 10 * 16000)
+    cost = produce(ring, queues)
+    reports = finish(results, processes)
+    reader_cpu = sum(report[5] for report in reports) / len(reports)
+    print(f"  3 readers, queue copies   producer {cost * 1e6:7.1f} µs/chunk, "
+          f"reader CPU {reader_cpu / seconds * 100:.3f}% of audio time")
+
+    # Shared memory: readers attach to the device's ring by name
+    name = f"wakeword-bench-{os.getpid()}"
+    readers = [(FRAME_SAMPLES, 0), (1280, 0), (1600, 0), (FRAME_SAMPLES, 0.05)]
+    ring = PcmRingBuffer(FRAME_SAMPLES, 10 * 16000, shared_name=name)
+    try:
+        processes = [context.Process(target=_channel_reader, args=(name, frame_samples, delay, results), daemon=True)
+                     for frame_samples, delay in readers]
+        for process in processes:
+            process.start()
+        collect(results, processes)
+        cost = produce(ring)
+        reports = finish(results, processes)
+    finally:
+        ring.release()
+    print(f"  4 readers, shared memory  producer {cost * 1e6:7.1f} µs/chunk")
+    for frame_samples, delay, samples, digest, stats, cpu in sorted(reports, key=lambda report: report[1]):
+        expected = hashlib.sha1(pcm[:samples]).hexdigest()
+        if delay:
+            kind = f"slow reader ({delay * 1000:.0f} ms per {frame_samples}-sample frame)"
+            check = f"{stats['overruns']} overrun(s), {stats['dropped_samples'] / 16000:.1f}s skipped"
+        else:
+            kind = f"reader, {frame_samples}-sample frames"
+            check = "audio identical" if digest == expected and samples == len(pcm) // frame_samples * frame_samples \
+                else f"audio differs ({samples} samples, {stats['overruns']} overrun(s))"
+        print(f"    {kind:44s} CPU {cpu / seconds * 100:.3f}% of audio time, {check}")
+
+
+def bench_wakeword_engines(args):
+    """CPU per device of each wakeword engine, every device on its own thread"""
+    from wakeword import PorcupineEngine, OpenWakeWordEngine
+
+    print_header("Wakeword engines: CPU per device")
+    devices = args.devices
+    seconds = min(args.seconds, 30)
+    frames = int(seconds * 16000) // FRAME_SAMPLES
+    audio = [np.frombuffer(synthetic_pcm(frames * FRAME_SAMPLES / 16000, seed=i), dtype=np.int16)
+             for i in range(devices)]
+
+    candidates = []
+    access_key = os.getenv('PORCUPINE_ACCESS_KEY')
+    if access_key:
+        candidates.append(('porcupine', lambda: PorcupineEngine(access_key)))
+    else:
+        print("  porcupine            skipped (PORCUPINE_ACCESS_KEY not set)")
+    if args.oww_model:
+        candidates.append(('openwakeword', lambda: OpenWakeWordEngine(
+            args.oww_model, feature_dir=args.oww_feature_dir)))
+        candidates.append(('openwakeword-batch', lambda: OpenWakeWordEngine(
+            args.oww_model, feature_dir=args.oww_feature_dir, batch=True, max_batch=devices)))
+    else:
+        print("  openwakeword         skipped (--oww-model not given)")
+
+    def run_device(detector, pcm):
+        for k in range(frames):
+            detector.process(pcm[k * FRAME_SAMPLES:(k + 1) * FRAME_SAMPLES])
+
+    for name, factory in candidates:
+        engine = factory()
+        engine.start()
+        detectors = [engine.create_detector() for _ in range(devices)]
+        threads = [threading.Thread(target=run_device, args=(detectors[i], audio[i]))
+                   for i in range(devices)]
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        cpu = time.process_time() - cpu_start
+        wall = time.perf_counter() - start
+        engine.stop()
+        for detector in detectors:
+            detector.delete()
+
+        batches = ""
+        scheduler = getattr(engine, 'scheduler', None)
+        if scheduler and scheduler.batches:
+            batches = f"  mean batch {scheduler.windows / scheduler.batches:5.1f}"
+        print(f"  {name:20s} {cpu / (devices * seconds) * 100:6.2f}% of a core per device  "
+              f"({cpu:.2f}s CPU, {wall:.2f}s wall for {devices} x {seconds:.0f}s){batches}")
+
+
+def bench_logging(args):
+    """Hot-loop frame latency with stdout blocked: inline print() vs. the asynchronous logger"""
+    from service_log import log
+
+    seconds = min(args.seconds, 120)
+    print_header(f"Logging: {seconds:.0f}s of audio, a wakeword every 0.6s, stdout free vs. blocked")
+
+    # A wakeword marker every 0.6 seconds; each one logs detection,
+    # recording and endpoint
+    pcm = np.zeros(int(seconds * 16000), dtype=np.int16)
+    marker_offsets = list(range(16000, len(pcm) - FRAME_SAMPLES, 9600))
+    pcm[marker_offsets] = _MarkerDetector.marker
+
+    def inline_print(level, message, device, key, fields):
+        # The previous behaviour: format and write in the calling thread
+        print(log._format((time.time(), level, device, message, fields)), file=log.stream)
+
+    def run(mode, output):
+        if output == 'blocked':
+            # A pipe nobody reads, as stdout under journald backpressure
+            read_fd, write_fd = os.pipe()
+            target = os.fdopen(write_fd, 'w', buffering=1, encoding='utf-8')
+        else:
+            read_fd = None
+            target = open(os.devnull, 'w', buffering=1, encoding='utf-8')
+        log.stream = target
+        if mode == 'print':
+            log._log = inline_print
+
+        device = _bench_device(_MarkerDetector((0, 0), (50e-6, 50e-6)), _ConstantVAD(100e-6))
+        device.min_recording_time = 0.2
+        device.max_recording_time = 0.5
+        ring = device.audio_buffer
+        stream = io.BytesIO(pcm.tobytes())
+        timings = []
+
+        def process():
+            while ring.fill_from(stream, CHUNK_BYTES):
+                while (frame := ring.read_frame(timeout=0)) is not None:
+                    t0 = time.perf_counter()
+                    device.process_frame(frame)
+                    timings.append(time.perf_counter() - t0)
+
+        written_before = log.written
+        worker = threading.Thread(target=process, daemon=True)
+        started = time.perf_counter()
+        worker.start()
+        worker.join(timeout=seconds / 10 + 5)
+        stalled = worker.is_alive()
+        frames = len(timings)
+        if stalled:
+            # Count the frame stuck in print() so far
+            timings.append(time.perf_counter() - started - sum(timings))
+
+        drainer = None
+        if read_fd is not None:
+            # Unblock the pipe so the run and the log writer can finish
+            def drain():
+                while os.read(read_fd, 65536):
+                    pass
+            drainer = threading.Thread(target=drain, daemon=True)
+            drainer.start()
+        worker.join()
+        log.flush(timeout=10)
+        lines = log.written - written_before
+        if mode == 'print':
+            del log._log
+        log.stream = None
+        target.close()
+        if drainer:
+            drainer.join(timeout=2)
+            os.close(read_fd)
+
+        timings = np.array(timings) * 1e6
+        total = len(pcm) // FRAME_SAMPLES
+        status = f"stalled after {frames}/{total} frames" if stalled else f"{frames} frames"
+        print(f"  {mode:6s} {output:8s} p50 {np.percentile(timings, 50):6.0f} µs  "
+              f"p99 {np.percentile(timings, 99):7.0f} µs  max {timings.max() / 1000:8.1f} ms  "
+              f"{status}" + (f", {lines} records written" if mode == 'async' else ""))
+
+    for mode in ('print', 'async'):
+        for output in ('free', 'blocked'):
+            run(mode, output)
+
+    # Rate limiting: a processing error on every frame for 5 seconds of audio
+    errors = 5 * 16000 // FRAME_SAMPLES
+    target = open(os.devnull, 'w', encoding='utf-8')
+    log.stream = target
+    before = log.written
+    for _ in range(errors):
+        log.error("⚠️ Processing error: boom", device='bench', key='processing', error="RuntimeError('boom')")
+    log.flush()
+    log.stream = None
+    target.close()
+    print(f"\n  {errors} identical processing errors → {log.written - before} record(s) written, "
+          f"{log.suppressed} suppressed (reported once the {log.rate_limit:.0f}s interval is over)")
+
+
+def _thread_syscalls():
+    """Read and write system calls made by the calling thread so far"""
+    with open('/proc/thread-self/io') as f:
+        counters = dict(line.split(': ') for line in f.read().splitlines())
+    return int(counters['syscr']) + int(counters['syscw'])
+
+
+def bench_capture(args):
+    """Hot-loop cost of the rolling capture: time and system calls per frame"""
+    import shutil
+    import resource
+    import tempfile
+    from capture import RollingCapture, CaptureFile
+    from service_log import log
+
+    seconds = min(args.seconds, 300)
+    print_header(f"Rolling capture: {seconds:.0f}s of audio, a wakeword every 3s, 1 min ring")
+
+    pcm = np.frombuffer(synthetic_pcm(seconds), dtype=np.int16).copy()
+    pcm[list(range(16000, len(pcm) - FRAME_SAMPLES, 3 * 16000))] = _MarkerDetector.marker
+
+    # Reading the counters costs system calls of its own
+    before = _thread_syscalls()
+    baseline = _thread_syscalls() - before
+
+    directory = tempfile.mkdtemp(prefix='capture-bench-')
+    level = log.level
+    log.set_level('WARNING')
+
+    def run(audio, capture, pace):
+        """process_frame() times and system calls; pace > 0 delivers frames at that multiple of real time"""
+        device = _bench_device(_MarkerDetector((0, 0), (50e-6, 50e-6)), _ConstantVAD(100e-6))
+        device.min_recording_time = 0.5
+        device.max_recording_time = 1.5
+        if capture:
+            shutil.rmtree(directory)
+            device.capture = RollingCapture(os.path.join(directory, 'bench.pcm'), minutes=1,
+                                            clip_dir=os.path.join(directory, 'clips'), device_id='bench')
+        ring = device.audio_buffer
+        stream = io.BytesIO(audio.tobytes())
+        timings = []
+        syscalls = [0]
+        faults = [0]
+
+        def process():
+            started = time.perf_counter()
+            while ring.fill_from(stream, CHUNK_BYTES):
+                while (frame := ring.read_frame(timeout=0)) is not None:
+                    if pace:
+                        # Idle until the frame is due, as with a live stream
+                        due = started + device.samples_consumed / 16000 / pace
+                        time.sleep(max(0.0, due - time.perf_counter()))
+                    before = _thread_syscalls()
+                    faulted = resource.getrusage(resource.RUSAGE_THREAD).ru_minflt
+                    t0 = time.perf_counter()
+                    device.process_frame(frame)
+                    timings.append(time.perf_counter() - t0)
+                    faults[0] += resource.getrusage(resource.RUSAGE_THREAD).ru_minflt - faulted
+                    syscalls[0] += _thread_syscalls() - before - baseline
+
+        worker = threading.Thread(target=process)
+        worker.start()
+        worker.join()
+        if capture:
+            device.capture.close()
+        return np.array(timings) * 1e6, syscalls[0], faults[0], device.capture
+
+    rounds = 3
+    for pace, audio in ((0, pcm), (4, pcm[:int(16000 * min(seconds, 30))])):
+        label = f"paced at {pace}x real time, {len(audio) / 16000:.0f}s" if pace else "back to back"
+        print(f"  {label}, {rounds} alternating rounds:")
+        results = {'off': [], 'on': []}
+        syscalls = {'off': 0, 'on': 0}
+        faults = {'off': 0, 'on': 0}
+        # Alternate so that drift between runs does not favour either
+        for _ in range(rounds):
+            for name in ('off', 'on'):
+                timings, count, faulted, capture = run(audio, name == 'on', pace)
+                results[name].append(timings)
+                syscalls[name] += count
+                faults[name] += faulted
+        for name in ('off', 'on'):
+            timings = results[name] = np.concatenate(results[name])
+            print(f"    capture {name:3s}  p50 {np.percentile(timings, 50):6.1f} µs  "
+                  f"p99 {np.percentile(timings, 99):6.1f} µs  mean {timings.mean():6.1f} µs  "
+                  f"per frame: {syscalls[name] / len(timings):.2f} system calls, "
+                  f"{faults[name] / len(timings):.2f} page faults")
+        print(f"    overhead: mean {results['on'].mean() - results['off'].mean():+.1f} µs, "
+              f"p50 {np.percentile(results['on'], 50) - np.percentile(results['off'], 50):+.1f} µs, "
+              f"p99 {np.percentile(results['on'], 99) - np.percentile(results['off'], 99):+.1f} µs")
+
+    # The paced run is the one left on disk
+    clips = [name for name in os.listdir(os.path.join(directory, 'clips')) if name.endswith('.wav')]
+    check = CaptureFile(os.path.join(directory, 'bench.pcm'))
+    tail = check.read(check.oldest(), check.written)
+    played = audio[:len(audio) - len(audio) % FRAME_SAMPLES]
+    print(f"\n  {capture.stats()['markers']} markers, {len(clips)} clips; the ring holds the last "
+          f"{len(tail) / 16000:.0f}s, identical to the input: {np.array_equal(tail, played[-len(tail):])}")
+    check.close()
+
+    # The copy alone
+    capture = RollingCapture(os.path.join(directory, 'copy.pcm'), minutes=1)
+    frame = pcm[:FRAME_SAMPLES]
+    frames = 200000
+    t0 = time.perf_counter()
+    for _ in range(frames):
+        capture.write(frame)
+    elapsed = time.perf_counter() - t0
+    capture.close()
+    print(f"  write(): {elapsed / frames * 1e9:.0f} ns per 512-sample frame")
+
+    log.set_level(level)
+    shutil.rmtree(directory)
+
+BENCHMARKS = {
+    'ring-buffer': bench_ring_buffer,
+    'frame-delivery': bench_frame_delivery,
+    'vad-streams': bench_vad_streams,
+    'vad-backends': bench_vad_backends,
+    'runtime': bench_runtime,
+    'ingest': bench_ingest,
+    'supervisor': bench_supervisor,
+    'catch-up': bench_catch_up,
+    'metrics': bench_metrics,
+    'wakeword-engines': bench_wakeword_engines,
+    'utterance-stream': bench_utterance_stream,
+    'mqtt-publisher': bench_mqtt_publisher,
+    'startup': bench_startup,
+    'hot-loop': bench_hot_loop,
+    'pcm-channel': bench_pcm_channel,
+    'logging': bench_logging,
+    'capture': bench_capture,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('benchmark', nargs='?', choices=sorted(BENCHMARKS))
+    parser.add_argument('--seconds', type=float, default=600,
+                        help='seconds of synthetic audio per run (default: 600)')
+    parser.add_argument('--devices', type=int, default=8,
+                        help='number of simulated devices (default: 8)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='asyncio inference workers (default: CPU count)')
+    parser.add_argument('--vad-backend', default='torch',
+                        choices=['torch', 'torchscript', 'onnx'],
+                        help='VAD backend (default: torch)')
+    parser.add_argument('--vad-model', help='local VAD model file for torchscript/onnx')
+    parser.add_argument('--torchscript-model', help='TorchScript model for vad-backends')
+    parser.add_argument('--onnx-model', help='ONNX model for vad-backends')
+    parser.add_argument('--oww-model', help='openWakeWord keyword model for wakeword-engines')
+    parser.add_argument('--oww-feature-dir',
+                        help='directory with melspectrogram.onnx and embedding_model.onnx '
+                             '(default: next to --oww-model)')
+    args = parser.parse_args()
+
+    if not args.benchmark:
+        parser.print_help()
+        sys.exit(1)
+
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Rolling audio capture
+Keeps the last N minutes of a device's 16 kHz PCM in a memory-mapped
+circular file on disk, together with markers for wakewords, endpoints
+(silence, timeout) and wakewords lost to another device of the group. The
+processing thread copies each frame into the mapping and stores the
+positions of events; the kernel writes the pages back, so the hot path
+makes no system calls.
+
+Around each detection a clip is cut from the ring, from pre_roll_ms
+before the wakeword to post_roll_ms after the end of the recording, and
+written as a WAV file with a JSON file of its markers by a background
+thread. The capture file itself survives a restart and can be exported
+while the service runs, e.g. after a missed wakeword:
+
+    python capture.py captures/office.pcm --last 120 --output office.wav
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import wave
+import argparse
+import threading
+from collections import deque
+
+import numpy as np
+
+from service_log import log
+
+
+MAGIC = int.from_bytes(b"WAKECAP1", "little")
+SAMPLE_RATE = 16000
+
+# Header fields (uint64)
+MAGIC_FIELD, CAPACITY, RATE, WRITE, MARKER_CAPACITY, MARKERS = range(6)
+HEADER_BYTES = 64
+
+MARKER_DTYPE = np.dtype([
+    ('position', '<u8'),      # samples written when the event happened
+    ('timestamp', '<f8'),     # wall clock
+    ('audio_time', '<f8'),    # the device's audio clock
+    ('kind', '<u4'),
+    ('value', '<f4'),         # detector score, NaN if none
+])
+MARKER_KINDS = ('wakeword', 'silence', 'timeout', 'suppressed')
+
+
+class CaptureFile:
+    """A capture file mapped into memory: header, marker ring and sample ring"""
+    def __init__(self, path, writable=False):
+        self.path = path
+        fd = os.open(path, os.O_RDWR if writable else os.O_RDONLY)
+        try:
+            self._map = mmap.mmap(fd, os.fstat(fd).st_size,
+                                  prot=mmap.PROT_READ | (mmap.PROT_WRITE if writable else 0))
+        finally:
+            os.close(fd)
+        self._header = np.ndarray((HEADER_BYTES // 8,), dtype=np.uint64, buffer=self._map)
+        if int(self._header[MAGIC_FIELD]) != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a capture file")
+        self.capacity_samples = int(self._header[CAPACITY])
+        self.marker_capacity = int(self._header[MARKER_CAPACITY])
+        self._markers = np.ndarray((self.marker_capacity,), dtype=MARKER_DTYPE,
+                                   buffer=self._map, offset=HEADER_BYTES)
+        self._samples = np.ndarray((self.capacity_samples,), dtype=np.int16, buffer=self._map,
+                                   offset=HEADER_BYTES + self.marker_capacity * MARKER_DTYPE.itemsize)
+
+    @staticmethod
+    def size(capacity_samples, marker_capacity):
+        return HEADER_BYTES + marker_capacity * MARKER_DTYPE.itemsize + capacity_samples * 2
+
+    @property
+    def written(self):
+        """Samples written since the file was created"""
+        return int(self._header[WRITE])
+
+    def oldest(self):
+        """Position of the oldest sample still in the ring"""
+        return max(0, self.written - self.capacity_samples)
+
+    def read(self, start, end):
+        """Copy of the samples from position start to end, clamped to what the ring holds"""
+        start = max(start, self.oldest())
+        end = min(end, self.written)
+        if end <= start:
+            return np.zeros(0, dtype=np.int16)
+        first = start % self.capacity_samples
+        last = first + (end - start)
+        if last <= self.capacity_samples:
+            return self._samples[first:last].copy()
+        return np.concatenate((self._samples[first:], self._samples[:last - self.capacity_samples]))
+
+    def markers(self, start=0, end=None):
+        """Markers between two positions, oldest first"""
+        count = int(self._header[MARKERS])
+        entries = self._markers[np.arange(max(0, count - self.marker_capacity), count) % self.marker_capacity]
+        end = self.written if end is None else end
+        entries = entries[(entries['position'] >= start) & (entries['position'] <= end)]
+        return [{
+            'kind': MARKER_KINDS[int(entry['kind'])],
+            'position': int(entry['position']),
+            'timestamp': round(float(entry['timestamp']), 3),
+            'audio_time_s': round(float(entry['audio_time']), 3),
+            'score': None if np.isnan(entry['value']) else round(float(entry['value']), 3),
+        } for entry in entries]
+
+    def close(self):
+        self._header = self._markers = self._samples = None
+        try:
+            self._map.close()
+        except BufferError:
+            # A caller still holds a view; the mapping goes with it
+            pass
+
+
+class RollingCapture(CaptureFile):
+    """Single-writer rolling capture of one device
+
+    write() and mark() are called from the processing thread only. A file
+    of the same size is continued after a restart; otherwise it is
+    recreated with its disk blocks allocated up front, so a full disk
+    cannot fault a page in the hot path.
+    """
+    def __init__(self, path, minutes=10, marker_capacity=4096, pre_roll_ms=2000, post_roll_ms=1000,
+                 clip_dir=None, max_clips=200, device_id=None):
+        capacity_samples = int(minutes * 60 * SAMPLE_RATE)
+        size = self.size(capacity_samples, marker_capacity)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size or not self._continues(fd, capacity_samples, marker_capacity):
+                os.ftruncate(fd, 0)
+                if hasattr(os, 'posix_fallocate'):
+                    os.posix_fallocate(fd, 0, size)
+                else:
+                    os.ftruncate(fd, size)
+                header = np.zeros(HEADER_BYTES // 8, dtype=np.uint64)
+                header[[MAGIC_FIELD, CAPACITY, RATE, MARKER_CAPACITY]] = (
+                    MAGIC, capacity_samples, SAMPLE_RATE, marker_capacity)
+                os.pwrite(fd, header.tobytes(), 0)
+        finally:
+            os.close(fd)
+        super().__init__(path, writable=True)
+
+        self.device_id = device_id
+        self.pre_roll_samples = int(pre_roll_ms * SAMPLE_RATE / 1000)
+        self.post_roll_samples = int(post_roll_ms * SAMPLE_RATE / 1000)
+        self.clip_dir = clip_dir
+        self.max_clips = max_clips
+        self.position = self.written
+        self.marker_count = int(self._header[MARKERS])
+        # Start of the clip being recorded, and clips waiting for their post-roll
+        self._clip = None
+        self._closing = deque()
+
+        # Statistics
+        self.clips_queued = 0
+        self.clips_written = 0
+
+    @staticmethod
+    def _continues(fd, capacity_samples, marker_capacity):
+        """Whether the file is a capture with the same layout"""
+        header = np.frombuffer(os.pread(fd, HEADER_BYTES, 0), dtype=np.uint64)
+        return (len(header) == HEADER_BYTES // 8 and int(header[MAGIC_FIELD]) == MAGIC
+                and int(header[CAPACITY]) == capacity_samples and int(header[MARKER_CAPACITY]) == marker_capacity)
+
+    def write(self, frame):
+        """Append one frame: a single copy into the mapping"""
+        n = len(frame)
+        start = self.position % self.capacity_samples
+        end = start + n
+        if end <= self.capacity_samples:
+            self._samples[start:end] = frame
+        else:
+            split = self.capacity_samples - start
+            self._samples[start:] = frame[:split]
+            self._samples[:end - self.capacity_samples] = frame[split:]
+        self.position += n
+        self._header[WRITE] = self.position
+        if self._closing and self.position >= self._closing[0][1]:
+            _clip_writer.submit(self, *self._closing.popleft())
+
+    def mark(self, kind, score=None, audio_time=0.0):
+        """Record an event at the current position; wakewords open a clip, the other kinds close it"""
+        now = time.time()
+        self._markers[self.marker_count % self.marker_capacity] = (
+            self.position, now, audio_time, MARKER_KINDS.index(kind),
+            np.nan if score is None else score)
+        self.marker_count += 1
+        self._header[MARKERS] = self.marker_count
+
+        if self.clip_dir is None:
+            return
+        if kind == 'wakeword':
+            if self._clip is None:
+                self._clip = (self.position - self.pre_roll_samples, now)
+        elif self._clip is not None:
+            start, started = self._clip
+            self._clip = None
+            self._closing.append((start, self.position + self.post_roll_samples, started, kind))
+            self.clips_queued += 1
+
+    def describe(self):
+        minutes = self.capacity_samples / SAMPLE_RATE / 60
+        clips = f", clips in {self.clip_dir}" if self.clip_dir else ""
+        return f"last {minutes:.0f} min in {self.path}{clips}"
+
+    def stats(self):
+        return {
+            'markers': self.marker_count,
+            'clips': self.clips_queued,
+            'clips_written': self.clips_written,
+        }
+
+    def close(self, timeout=2.0):
+        """Cut the pending clips with the audio there is, then unmap the file
+
+        Clips not written within timeout are abandoned. If one is still
+        being written, the file stays mapped until the writer lets go of
+        the capture.
+        """
+        if self._clip is not None:
+            self._closing.append((self._clip[0], self.position, self._clip[1], 'shutdown'))
+            self._clip = None
+        while self._closing:
+            start, _, started, kind = self._closing.popleft()
+            _clip_writer.submit(self, start, self.position, started, kind)
+        abandoned = _clip_writer.flush(self, timeout)
+        if abandoned:
+            log.warning(f"⚠️ {abandoned} capture clip(s) abandoned - not written within {timeout}s",
+                        device=self.device_id, abandoned=abandoned)
+        self._map.flush()
+        if _clip_writer.writing(self):
+            return
+        super().close()
+
+
+class _ClipWriter:
+    """Background thread, shared by all captures, that writes clips to disk"""
+    def __init__(self):
+        self._clips = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._busy = None
+
+    def submit(self, capture, start, end, started, kind):
+        with self._cond:
+            self._clips.append((capture, start, end, started, kind))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='capture-clips', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def flush(self, capture, timeout):
+        """Wait for the clips of one capture to be written
+
+        On timeout the capture's queued clips are dropped; returns how
+        many. A clip already being written is left to finish.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._writing(capture) or any(clip[0] is capture for clip in self._clips):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    clips = deque(clip for clip in self._clips if clip[0] is not capture)
+                    abandoned = len(self._clips) - len(clips)
+                    self._clips = clips
+                    return abandoned
+                self._cond.wait(remaining)
+        return 0
+
+    def writing(self, capture):
+        """Whether a clip of capture is being written right now"""
+        with self._cond:
+            return self._writing(capture)
+
+    def _writing(self, capture):
+        return self._busy is not None and self._busy[0] is capture
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._busy = None
+                self._cond.notify_all()
+                while not self._clips:
+                    self._cond.wait()
+                clip = self._busy = self._clips.popleft()
+                capture = clip[0]
+            try:
+                self._write(*clip)
+                capture.clips_written += 1
+            except Exception as e:
+                log.error(f"⚠️ Capture clip failed: {e}", device=capture.device_id, key='capture-clip',
+                          error=repr(e))
+
+    def _write(self, capture, start, end, started, kind):
+        start = max(start, capture.oldest())
+        audio = capture.read(start, end)
+        os.makedirs(capture.clip_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(started)) + f"-{int(started * 1000) % 1000:03d}"
+        base = os.path.join(capture.clip_dir, f"{stamp}-{kind}")
+        write_wav(base + '.wav', audio)
+        markers = capture.markers(start, end)
+        for marker in markers:
+            marker['offset_s'] = round((marker.pop('position') - start) / SAMPLE_RATE, 3)
+        with open(base + '.json', 'w') as f:
+            json.dump({
+                'device_id': capture.device_id,
+                'timestamp': round(started, 3),
+                'end': kind,
+                'duration_s': round(len(audio) / SAMPLE_RATE, 3),
+                'markers': markers,
+            }, f, indent=2)
+
+        clips = sorted(name for name in os.listdir(capture.clip_dir) if name.endswith('.wav'))
+        for name in clips[:max(0, len(clips) - capture.max_clips)]:
+            for extension in ('.wav', '.json'):
+                try:
+                    os.remove(os.path.join(capture.clip_dir, name[:-4] + extension))
+                except FileNotFoundError:
+                    pass
+
+
+_clip_writer = _ClipWriter()
+
+
+def write_wav(path, audio):
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(audio.tobytes())
+
+
+def create_capture(device_id, capture_config, device_config):
+    """Build the rolling capture of a device from the capture: config section, or None when off
+
+    A device's own 'capture' key overrides capture.enabled.
+    """
+    if not device_config.get('capture', capture_config.get('enabled', False)):
+        return None
+    directory = capture_config.get('directory', 'captures')
+    return RollingCapture(
+        os.path.join(directory, f"{device_id}.pcm"),
+        minutes=capture_config.get('minutes', 10),
+        pre_roll_ms=capture_config.get('pre_roll_ms', 2000),
+        post_roll_ms=capture_config.get('post_roll_ms', 1000),
+        clip_dir=os.path.join(directory, 'clips', device_id) if capture_config.get('clips', True) else None,
+        max_clips=capture_config.get('max_clips', 200),
+        device_id=device_id
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export audio and markers from a rolling capture file")
+    parser.add_argument('path', help='capture file, e.g. captures/office.pcm')
+    parser.add_argument('--last', type=float, help='seconds of audio to export (default: all of the ring)')
+    parser.add_argument('--output', help='WAV file to write; the markers go to the same name with .json')
+    args = parser.parse_args()
+
+    try:
+        capture = CaptureFile(args.path)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    end = capture.written
+    start = capture.oldest() if args.last is None else max(capture.oldest(), end - int(args.last * SAMPLE_RATE))
+    markers = capture.markers(start, end)
+    print(f"{args.path}: {(end - start) / SAMPLE_RATE:.1f}s of {capture.capacity_samples / SAMPLE_RATE:.0f}s, "
+          f"{len(markers)} marker(s)")
+    for marker in markers:
+        when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(marker['timestamp']))
+        score = f"  score {marker['score']:.3f}" if marker['score'] is not None else ""
+        print(f"  {(marker['position'] - start) / SAMPLE_RATE:8.2f}s  {when}  {marker['kind']}{score}")
+
+    if args.output:
+        write_wav(args.output, capture.read(start, end))
+        for marker in markers:
+            marker['offset_s'] = round((marker.pop('position') - start) / SAMPLE_RATE, 3)
+        with open(os.path.splitext(args.output)[0] + '.json', 'w') as f:
+            json.dump({'source': args.path, 'duration_s': round((end - start) / SAMPLE_RATE, 3),
+                       'markers': markers}, f, indent=2)
+        print(f"✓ Written to {args.output}")
+    capture.close()
+
+
+if __name__ == "__main__":
+    main()
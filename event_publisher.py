@@ -0,0 +1,234 @@
+"""
+Non-blocking MQTT event publisher
+Device threads hand events to a bounded queue and return immediately; a
+single publisher thread writes them to the broker. paho-mqtt reconnects
+with backoff after a connection loss, and events queued while the broker
+is away are sent once it is back, oldest first. When the queue is full,
+the oldest event is dropped and counted. Lossy events (utterance audio) are
+only worth sending live: they are dropped while the broker is away and are
+held in small numbers, so they never push other events out.
+"""
+
+import time
+import threading
+from collections import deque
+
+import paho.mqtt.client as mqtt
+
+from metrics import Histogram
+from service_log import log
+
+
+# Seconds from publish() to the broker's acknowledgement (or, for QoS 0,
+# the socket write); the long tail covers events buffered through an outage
+PUBLISH_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0, 30.0)
+
+
+class EventPublisher:
+    """Shared MQTT client whose publish() never blocks the caller"""
+    def __init__(self, broker, port=1883, client_id='axis_audio_service', username=None, password=None,
+                 keepalive=60, max_queue=1000, max_lossy=100, reconnect_min_delay=1, reconnect_max_delay=30):
+        self.broker = broker
+        self.port = port
+        self.keepalive = keepalive
+        self.max_queue = max_queue
+        self.max_lossy = max_lossy
+
+        try:
+            self.client = mqtt.Client(
+                callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+                client_id=client_id
+            )
+        except AttributeError:
+            self.client = mqtt.Client(client_id)
+        if username:
+            self.client.username_pw_set(username, password)
+        self.client.reconnect_delay_set(reconnect_min_delay, reconnect_max_delay)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_publish = self._on_publish
+
+        self._events = deque()
+        self._lossy_queued = 0
+        self._cond = threading.Condition()
+        self._connected = threading.Event()
+        self._thread = None
+        self.running = False
+
+        # Messages handed to paho and waiting for their acknowledgement
+        self._ack_lock = threading.Lock()
+        self._acks = threading.Condition(self._ack_lock)
+        self._pending = {}
+        self._early = {}
+
+        # Statistics
+        self.connected = False
+        self.connects = 0
+        self.published = 0
+        self.dropped = 0
+        self.lossy_dropped = 0
+        self.publish_seconds = Histogram(PUBLISH_BUCKETS)
+
+    def start(self, timeout=5.0):
+        """Connect in the background; returns whether the broker answered within timeout
+
+        Events are queued either way and sent once the connection is up.
+        """
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self.client.connect_async(self.broker, self.port, self.keepalive)
+        self.client.loop_start()
+        return self._connected.wait(timeout)
+
+    def stop(self, timeout=2.0):
+        """Flush queued events and QoS 1/2 acknowledgements for up to timeout seconds, then disconnect"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._events and self.connected and time.monotonic() < deadline:
+                self._cond.wait(0.05)
+            self.running = False
+            self._cond.notify_all()
+            unsent = len(self._events)
+        if unsent:
+            log.warning(f"⚠️ MQTT: {unsent} queued event(s) not sent", unsent=unsent)
+        if self._thread:
+            self._thread.join(timeout=1)
+        # paho holds QoS 1/2 messages until the broker acknowledges them and
+        # discards them on disconnect
+        with self._acks:
+            while self._awaiting_ack() and time.monotonic() < deadline:
+                self._acks.wait(0.05)
+            unacked = self._awaiting_ack()
+        if unacked:
+            log.warning(f"⚠️ MQTT: {unacked} QoS 1/2 event(s) not acknowledged by the broker", unacked=unacked)
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def publish(self, topic, payload=None, qos=0, retain=False, on_ack=None, lossy=False):
+        """Queue an event; on_ack(monotonic time) runs once the broker has it
+
+        A lossy event is dropped instead while the broker is unreachable
+        or max_lossy of them are already waiting. Returns whether the
+        event was queued.
+        """
+        event = (topic, payload, qos, retain, on_ack, time.monotonic(), lossy)
+        with self._cond:
+            if lossy:
+                if not self.connected or self._lossy_queued >= self.max_lossy:
+                    self.lossy_dropped += 1
+                    return False
+                self._lossy_queued += 1
+            elif len(self._events) >= self.max_queue:
+                if self._events.popleft()[6]:
+                    self._lossy_queued -= 1
+                self.dropped += 1
+            self._events.append(event)
+            self._cond.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self.running and not (self._events and self.connected):
+                    self._cond.wait()
+                if not self.running:
+                    return
+                event = self._events.popleft()
+                if event[6]:
+                    self._lossy_queued -= 1
+
+            topic, payload, qos, retain, on_ack, queued, lossy = event
+            info = self.client.publish(topic, payload, qos=qos, retain=retain)
+            # paho keeps a QoS 1/2 message it could not send for lack of a
+            # connection and sends it again after reconnecting; publishing
+            # it once more would deliver it twice
+            kept = qos > 0 and info.rc == mqtt.MQTT_ERR_NO_CONN
+            if info.rc != mqtt.MQTT_ERR_SUCCESS and not kept:
+                # Lost the connection since the check (QoS 0) or paho's own
+                # queue is full; retry after reconnecting, unless the event
+                # would be stale by then
+                with self._cond:
+                    if lossy:
+                        self.lossy_dropped += 1
+                    else:
+                        self._events.appendleft(event)
+                    self._cond.wait(0.1)
+                continue
+            self._track(info.mid, qos, queued, on_ack)
+
+    def _track(self, mid, qos, queued, on_ack):
+        with self._ack_lock:
+            # The acknowledgement may beat publish() returning
+            acked = self._early.pop(mid, None)
+            if acked is None:
+                self._pending[mid] = (qos, queued, on_ack)
+                # QoS 0 messages lost with a connection are never acknowledged
+                if len(self._pending) > 10000:
+                    self._pending.clear()
+                return
+            self._acked(acked, queued, on_ack)
+
+    def _acked(self, acked, queued, on_ack):
+        """Record an acknowledgement; called with _ack_lock held, from either thread"""
+        self.published += 1
+        self.publish_seconds.observe(acked - queued)
+        if on_ack is not None:
+            on_ack(acked)
+
+    def _on_publish(self, client, userdata, mid, *args):
+        """paho-mqtt on_publish callback (v1 and v2 signatures)"""
+        now = time.monotonic()
+        with self._ack_lock:
+            entry = self._pending.pop(mid, None)
+            if entry is None:
+                self._early[mid] = now
+                if len(self._early) > 1000:
+                    self._early.clear()
+                return
+            qos, queued, on_ack = entry
+            self._acked(now, queued, on_ack)
+            self._acks.notify_all()
+
+    def _awaiting_ack(self):
+        """QoS 1/2 messages paho still holds; called with _ack_lock held"""
+        return sum(1 for qos, _, _ in self._pending.values() if qos > 0)
+
+    def _on_connect(self, client, userdata, flags, reason_code, *args):
+        if reason_code != 0:
+            log.error(f"❌ MQTT connection to {self.broker}:{self.port} refused: {reason_code}", key='mqtt-refused')
+            return
+        self.connects += 1
+        if self.connects > 1:
+            log.info(f"✓ MQTT reconnected to {self.broker}:{self.port} ({len(self._events)} queued event(s))")
+        with self._cond:
+            self.connected = True
+            self._cond.notify_all()
+        self._connected.set()
+
+    def _on_disconnect(self, client, userdata, *args):
+        with self._cond:
+            was_connected = self.connected
+            self.connected = False
+            # Audio queued before the drop would be stale after reconnecting
+            if self._lossy_queued:
+                events = [event for event in self._events if not event[6]]
+                self.lossy_dropped += len(self._events) - len(events)
+                self._events = deque(events)
+                self._lossy_queued = 0
+        if was_connected and self.running:
+            log.warning(f"⚠️ MQTT connection to {self.broker}:{self.port} lost - queueing events, reconnecting...")
+
+    def stats(self):
+        """Connection state and queue counters"""
+        with self._ack_lock:
+            awaiting_ack = self._awaiting_ack()
+        return {
+            'connected': self.connected,
+            'reconnects': max(0, self.connects - 1),
+            'queued': len(self._events),
+            'published': self.published,
+            'awaiting_ack': awaiting_ack,
+            'dropped': self.dropped,
+            'lossy_dropped': self.lossy_dropped,
+        }
@@ -0,0 +1,588 @@
+#!/usr/bin/env python3
+"""
+Load simulator: hundreds of virtual speakers against the full service
+Starts app.py with N simulated devices whose audio comes from named pipes
+instead of RTSP. A generator writes each pipe in real time, looping a
+scripted recording (a wakeword followed by a command, at a known position)
+over background noise, and a local MQTT broker stand-in receives the
+events. For each N of the ramp, the service's CPU, RSS and thread count
+and the p50/p99 detection and endpoint latencies are measured, and the
+scaling curve is written as JSON.
+
+Latency is measured from the moment the generator wrote the audio at which
+the event fires, found by replaying the same audio through replay.py,
+until the broker received the event.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import errno
+import shutil
+import signal
+import socket
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+import contextlib
+import urllib.request
+
+import numpy as np
+import yaml
+
+from mqtt_testing import LoopbackMqttBroker
+from replay import SAMPLE_RATE, load_audio, replay, _git_version
+
+# Loops are a multiple of both the 512-sample frame and the 1600-sample
+# chunk, so every loop is framed exactly like the calibration replay
+LOOP_SAMPLES = 12800
+
+
+class _Speaker:
+    """One simulated device: its pipe, scripted audio and delivery times"""
+    def __init__(self, device_id, path, pcm, script):
+        self.device_id = device_id
+        self.path = path
+        self.pcm = pcm.tobytes()
+        # [(kind, audio time)] of the first loop, then of every later one
+        self.first, self.steady = script
+        self.fd = None
+        self.started = None
+        self.base = 0
+        self.sent = 0
+        self.loop = 0
+        self.index = 0
+        # (kind, audio time, monotonic time its audio was written)
+        self.deliveries = []
+        self.blocked = 0
+        self.disconnects = 0
+
+    def next_event(self):
+        """(kind, audio time) of the next scripted event"""
+        events = self.first if self.loop == 0 else self.steady
+        while self.index >= len(events):
+            if not self.steady:
+                return None
+            self.loop += 1
+            self.index = 0
+            events = self.steady
+        kind, audio_time = events[self.index]
+        return kind, self.loop * len(self.pcm) / 2 / SAMPLE_RATE + audio_time
+
+    def pump(self, tick):
+        """Write the audio that is due by now; returns False while no reader is connected"""
+        now = time.monotonic()
+        if self.fd is None:
+            try:
+                self.fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError as e:
+                if e.errno != errno.ENXIO:
+                    raise
+                return False
+            self.started = now
+            self.base = self.sent
+
+        chunk = int(tick * SAMPLE_RATE) * 2
+        due = self.base + (int((now - self.started) / tick) + 1) * chunk
+        length = len(self.pcm)
+        while self.sent < due:
+            offset = self.sent % length
+            try:
+                written = os.write(self.fd, self.pcm[offset:min(length, offset + due - self.sent)])
+            except BlockingIOError:
+                # The service is not reading its pipe fast enough
+                self.blocked += 1
+                break
+            except BrokenPipeError:
+                os.close(self.fd)
+                self.fd = None
+                self.disconnects += 1
+                return False
+            self.sent += written
+
+        written_at = time.monotonic()
+        event = self.next_event()
+        while event is not None and event[1] * SAMPLE_RATE * 2 <= self.sent:
+            self.deliveries.append((event[0], event[1], written_at))
+            self.index += 1
+            event = self.next_event()
+        return True
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class PipeGenerator:
+    """Writes every simulated device's pipe in real time from one thread"""
+    def __init__(self, speakers, chunk_ms=100):
+        self.speakers = speakers
+        self.tick = chunk_ms / 1000
+        self.connected = 0
+        self.cpu_seconds = 0.0
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='pipe-generator', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=5)
+        for speaker in self.speakers:
+            speaker.close()
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while self._running:
+            self.connected = sum(speaker.pump(self.tick) for speaker in self.speakers)
+            self.cpu_seconds = time.thread_time()
+            next_tick += self.tick
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+
+
+def build_script(clip, seconds, variants, noise, seed=0):
+    """One loop of audio per variant: noise with the clip at a staggered offset"""
+    loop = int(np.ceil(seconds * SAMPLE_RATE / LOOP_SAMPLES)) * LOOP_SAMPLES
+    # Room after the clip for the endpoint and the next loop's lead-in
+    slack = loop - len(clip) - 3 * SAMPLE_RATE
+    if slack < 0:
+        raise ValueError(f"--interval must be at least {len(clip) / SAMPLE_RATE + 3:.1f}s for this clip")
+    rng = np.random.default_rng(seed)
+    pcms = []
+    for variant in range(variants):
+        audio = rng.normal(0, noise, loop)
+        offset = SAMPLE_RATE // 2 + slack * variant // variants
+        audio[offset:offset + len(clip)] += clip
+        pcms.append(np.clip(np.round(audio), -32768, 32767).astype(np.int16))
+    return pcms
+
+
+def calibrate(config, pcms, access_key):
+    """Replay two loops of each variant; [(first loop events, later loop events)]
+
+    Events are (kind, audio time) pairs, as the service would publish them
+    with no processing delay at all.
+    """
+    from app import DeviceMonitor
+    from service_log import log
+    from vad import load_vad
+    from wakeword import load_wakeword
+
+    device_config = config['axis']['devices'][0]
+    scripts = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        vad = load_vad(config.get('vad', {}))
+        engine = load_wakeword(config.get('wakeword', {}), access_key)
+        engine.start()
+        try:
+            for pcm in pcms:
+                device = DeviceMonitor(device_config, config, access_key)
+                if not device.initialize(None, vad, start_stream=False, wakeword_engine=engine):
+                    raise RuntimeError("device initialization failed")
+                events = replay(device, np.concatenate([pcm, pcm]))['events']
+                log.flush()
+                device.shutdown()
+                loop_seconds = len(pcm) / SAMPLE_RATE
+                first = [(event['type'], event['audio_time_s']) for event in events
+                         if event['audio_time_s'] < loop_seconds]
+                steady = [(event['type'], event['audio_time_s'] - loop_seconds) for event in events
+                          if event['audio_time_s'] >= loop_seconds]
+                scripts.append((first, steady))
+        finally:
+            engine.stop()
+            log.flush()
+    return scripts
+
+
+def _process_tree(pid):
+    """pid and all its descendants"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+def sample_processes(pid):
+    """CPU seconds, RSS (MB), threads and process count of a process tree"""
+    cpu, rss, threads = 0.0, 0.0, 0
+    tree = _process_tree(pid)
+    for member in tree:
+        try:
+            with open(f'/proc/{member}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+            with open(f'/proc/{member}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        rss += int(line.split()[1]) / 1024
+                    elif line.startswith('Threads:'):
+                        threads += int(line.split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    return cpu, rss, threads, len(tree)
+
+
+def scrape_metrics(port):
+    """Overruns, catch-up skips and the highest processing lag from /metrics"""
+    totals = {'overruns': 0, 'catchup_skips': 0, 'max_lag_ms': 0.0}
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=2) as response:
+            text = response.read().decode()
+    except OSError:
+        return None
+    for line in text.splitlines():
+        if line.startswith('#') or ' ' not in line:
+            continue
+        name, value = line.rsplit(' ', 1)
+        name = name.split('{')[0]
+        if name in ('wakeword_buffer_overruns_total', 'wakeword_shard_buffer_overruns_total'):
+            totals['overruns'] += int(float(value))
+        elif name == 'wakeword_catchup_skips_total':
+            totals['catchup_skips'] += int(float(value))
+        elif name in ('wakeword_processing_lag_seconds', 'wakeword_shard_processing_lag_seconds'):
+            totals['max_lag_ms'] = max(totals['max_lag_ms'], float(value) * 1000)
+    return totals
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def match_events(deliveries, received, window):
+    """Pair scripted events with received ones in order
+
+    Returns [(delivered, received or None)] and the received times that
+    matched no scripted event.
+    """
+    pairs, unmatched = [], []
+    received = sorted(received)
+    index = 0
+    for delivered in sorted(deliveries):
+        # Anything received well before this event's audio was written is unexpected
+        while index < len(received) and received[index] < delivered - 0.25:
+            unmatched.append(received[index])
+            index += 1
+        if index < len(received) and received[index] <= delivered + window:
+            pairs.append((delivered, received[index]))
+            index += 1
+        else:
+            pairs.append((delivered, None))
+    return pairs, unmatched + received[index:]
+
+
+def _latency_summary(latencies, expected, missed, unexpected):
+    values = np.array(latencies) * 1000
+    return {
+        'expected': expected,
+        'detected': len(latencies),
+        'missed': missed,
+        'unexpected': unexpected,
+        'p50_ms': round(float(np.percentile(values, 50)), 1) if len(values) else None,
+        'p99_ms': round(float(np.percentile(values, 99)), 1) if len(values) else None,
+        'max_ms': round(float(values.max()), 1) if len(values) else None,
+    }
+
+
+def run_step(args, base_config, pcms, scripts, devices, workdir):
+    """Run the service with the given number of simulated devices and measure it"""
+    step_dir = os.path.join(workdir, f'{devices}')
+    os.makedirs(step_dir)
+    speakers = []
+    device_configs = []
+    for index in range(devices):
+        device_id = f'sim-{index:03d}'
+        path = os.path.join(step_dir, f'{device_id}.pcm')
+        os.mkfifo(path)
+        variant = index % len(pcms)
+        speakers.append(_Speaker(device_id, path, pcms[variant], scripts[variant]))
+        device_configs.append({'name': f'Simulated {index}', 'id': device_id, 'pcm': path})
+
+    broker = LoopbackMqttBroker()
+    broker.start()
+    metrics_port = _free_port()
+    config = json.loads(json.dumps(base_config))
+    config['axis'] = {'devices': device_configs}
+    config['mqtt'] = dict(config['mqtt'], broker='127.0.0.1', port=broker.port)
+    config['capture'] = dict(config.get('capture') or {}, enabled=False)
+    service = config.setdefault('service', {})
+    service.update(metrics_port=metrics_port, metrics_host='127.0.0.1', health_check_interval=3600)
+    if args.runtime:
+        service['runtime'] = args.runtime
+    if not args.verbose:
+        service['log_level'] = 'WARNING'
+    config_path = os.path.join(step_dir, 'config.yaml')
+    with open(config_path, 'w') as f:
+        yaml.safe_dump(config, f)
+
+    topics = {}
+    for speaker in speakers:
+        for kind, key in (('wakeword', 'wakeword'), ('endpoint', 'vad_stop')):
+            topics[config['mqtt']['topics'][key].replace('{device_id}', speaker.device_id)] = (speaker, kind)
+
+    generator = PipeGenerator(speakers, args.chunk_ms)
+    generator.start()
+    log_path = os.path.join(step_dir, 'service.log')
+    with open(log_path, 'w') as log_file:
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py'),
+             '--config', config_path],
+            stdout=None if args.verbose else log_file,
+            stderr=subprocess.STDOUT
+        )
+
+    result = {'devices': devices}
+    try:
+        started = time.monotonic()
+        while generator.connected < devices:
+            if process.poll() is not None:
+                raise RuntimeError(f"service exited with code {process.returncode} (see {log_path})")
+            if time.monotonic() - started > args.startup_timeout:
+                raise RuntimeError(f"only {generator.connected} of {devices} device(s) connected "
+                                   f"after {args.startup_timeout:.0f}s (see {log_path})")
+            time.sleep(0.1)
+        result['startup_s'] = round(time.monotonic() - started, 2)
+        time.sleep(args.warmup)
+
+        window_start = time.monotonic()
+        first = sample_processes(process.pid)
+        load_cpu = generator.cpu_seconds
+        metrics_start = scrape_metrics(metrics_port) or {}
+        samples, max_lag = [], 0.0
+        while time.monotonic() - window_start < args.seconds:
+            time.sleep(1.0)
+            if process.poll() is not None:
+                raise RuntimeError(f"service exited with code {process.returncode} (see {log_path})")
+            samples.append(sample_processes(process.pid))
+            scraped = scrape_metrics(metrics_port)
+            if scraped:
+                max_lag = max(max_lag, scraped['max_lag_ms'])
+        window_end = time.monotonic()
+        last = samples[-1]
+        metrics_end = scrape_metrics(metrics_port) or {}
+        # Let events for audio written near the end arrive
+        time.sleep(args.match_window)
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        generator.stop()
+        broker.stop()
+
+    elapsed = window_end - window_start
+    result.update({
+        'cpu_percent': round((last[0] - first[0]) / elapsed * 100, 1),
+        'cpu_percent_per_device': round((last[0] - first[0]) / elapsed * 100 / devices, 2),
+        'rss_mb': round(max(sample[1] for sample in samples), 1),
+        'rss_mb_per_device': round(max(sample[1] for sample in samples) / devices, 2),
+        'threads': max(sample[2] for sample in samples),
+        'processes': max(sample[3] for sample in samples),
+        'overruns': metrics_end.get('overruns', 0) - metrics_start.get('overruns', 0),
+        'catchup_skips': metrics_end.get('catchup_skips', 0) - metrics_start.get('catchup_skips', 0),
+        'max_lag_ms': round(max_lag, 1),
+        'generator_cpu_percent': round((generator.cpu_seconds - load_cpu) / elapsed * 100, 1),
+        'generator_blocked_writes': sum(speaker.blocked for speaker in speakers),
+    })
+
+    received = {}
+    for received_at, topic, _, _, _ in broker.messages:
+        if topic in topics and window_start - args.match_window <= received_at <= window_end + args.match_window:
+            speaker, kind = topics[topic]
+            received.setdefault((speaker.device_id, kind), []).append(received_at)
+    for kind, name in (('wakeword', 'detection'), ('endpoint', 'endpoint')):
+        latencies, expected, missed, unexpected = [], 0, 0, 0
+        for speaker in speakers:
+            deliveries = [written_at for event_kind, _, written_at in speaker.deliveries if event_kind == kind]
+            pairs, unmatched = match_events(deliveries, received.get((speaker.device_id, kind), []),
+                                            args.match_window)
+            # Only events whose audio was written inside the window count
+            for delivered, arrival in pairs:
+                if window_start <= delivered < window_end:
+                    expected += 1
+                    if arrival is None:
+                        missed += 1
+                    else:
+                        latencies.append(arrival - delivered)
+            unexpected += sum(1 for arrival in unmatched if window_start <= arrival < window_end)
+        result[name] = _latency_summary(latencies, expected, missed, unexpected)
+    return result
+
+
+def print_step(result):
+    detection, endpoint = result['detection'], result['endpoint']
+
+    def latency(summary):
+        if summary['p50_ms'] is None:
+            return f"{'-':>15}"
+        return f"{summary['p50_ms']:>6.0f} / {summary['p99_ms']:<6.0f}"
+
+    print(f"{result['devices']:>7}  {result['cpu_percent']:>6.1f}  {result['rss_mb']:>7.0f}  "
+          f"{result['threads']:>7}  {latency(detection)}  {latency(endpoint)}  "
+          f"{detection['missed']:>3}/{detection['expected']:<4}  {result['overruns']:>8}")
+
+
+def main():
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clip', required=True,
+                        help='WAV or raw 16 kHz s16le recording of the wakeword followed by a command')
+    parser.add_argument('--config', default='config.yaml',
+                        help='configuration with the wakeword/vad/service settings (default: config.yaml)')
+    parser.add_argument('--devices', default='10,25,50,100,200,400',
+                        help='comma-separated device counts to ramp through (default: 10,25,50,100,200,400)')
+    parser.add_argument('--runtime', choices=['threaded', 'asyncio', 'sharded'],
+                        help='override service.runtime')
+    parser.add_argument('--seconds', type=float, default=60, help='measured seconds per step (default: 60)')
+    parser.add_argument('--warmup', type=float, default=10,
+                        help='seconds after every device connected before measuring (default: 10)')
+    parser.add_argument('--interval', type=float, default=10,
+                        help='seconds between utterances on each device (default: 10)')
+    parser.add_argument('--variants', type=int, default=8,
+                        help='distinct scripts, staggered over the interval (default: 8)')
+    parser.add_argument('--noise', type=float, default=30, help='background noise standard deviation (default: 30)')
+    parser.add_argument('--chunk-ms', type=float, default=100,
+                        help='audio written to each pipe per write (default: 100)')
+    parser.add_argument('--match-window', type=float, default=3,
+                        help='seconds an event may lag its audio and still count (default: 3)')
+    parser.add_argument('--max-p99-ms', type=float, default=1000,
+                        help='stop the ramp once p99 detection latency exceeds this (default: 1000)')
+    parser.add_argument('--max-missed', type=float, default=0.05,
+                        help='stop the ramp once this fraction of wakewords is missed (default: 0.05)')
+    parser.add_argument('--startup-timeout', type=float, default=120,
+                        help='seconds for every device to connect (default: 120)')
+    parser.add_argument('--output', help='write the scaling curve as JSON to this file')
+    parser.add_argument('--keep', action='store_true', help='keep the generated configs and service logs')
+    parser.add_argument('--verbose', action='store_true', help='show the service output')
+    args = parser.parse_args()
+    if args.seconds < 1:
+        # Processes are sampled once a second over the measured window
+        parser.error('--seconds must be at least 1')
+
+    load_dotenv()
+    access_key = os.getenv('PORCUPINE_ACCESS_KEY')
+    with open(args.config, 'r') as f:
+        base_config = yaml.safe_load(f)
+    ramp = [int(count) for count in args.devices.split(',')]
+
+    # Every simulated device holds a pipe and a wakeup pipe open, and the
+    # generator holds the other end
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or hard > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    try:
+        pcms = build_script(load_audio(args.clip).astype(np.float64), args.interval, args.variants, args.noise)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    calibration_config = dict(base_config, axis={'devices': [{'name': 'Calibration', 'id': 'calibration'}]})
+    try:
+        scripts = calibrate(calibration_config, pcms, access_key)
+    except Exception as e:
+        print(f"❌ Calibration failed: {e}")
+        sys.exit(1)
+    wakewords = [sum(1 for kind, _ in steady if kind == 'wakeword') for _, steady in scripts]
+    if not all(wakewords):
+        print(f"❌ The wakeword in {args.clip} is not detected in {wakewords.count(0)} of "
+              f"{len(scripts)} script(s) - check the clip and wakeword settings")
+        sys.exit(1)
+
+    loop_seconds = len(pcms[0]) / SAMPLE_RATE
+    runtime = args.runtime or base_config.get('service', {}).get('runtime', 'threaded')
+    print(f"✓ {len(pcms)} script(s) of {loop_seconds:.1f}s calibrated, "
+          f"{sum(wakewords) / len(wakewords):.1f} wakeword(s) per loop")
+    print(f"Runtime: {runtime}, {os.cpu_count()} CPU(s), {args.seconds:.0f}s measured per step\n")
+    print(f"{'devices':>7}  {'CPU %':>6}  {'RSS MB':>7}  {'threads':>7}  {'detect p50/p99':>15}  "
+          f"{'endpoint p50/p99':>15}  {'missed':>8}  {'overruns':>8}")
+
+    results = {
+        'version': _git_version(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'runtime': runtime,
+        'wakeword_engine': base_config.get('wakeword', {}).get('engine', 'porcupine'),
+        'vad_backend': base_config.get('vad', {}).get('backend', 'torch'),
+        'clip': os.path.basename(args.clip),
+        'interval_s': loop_seconds,
+        'seconds': args.seconds,
+        'steps': [],
+        'limit': None,
+    }
+    workdir = tempfile.mkdtemp(prefix='wakeword-loadtest-')
+    try:
+        for devices in ramp:
+            try:
+                result = run_step(args, base_config, pcms, scripts, devices, workdir)
+            except RuntimeError as e:
+                print(f"❌ {devices} device(s): {e}")
+                results['limit'] = {'devices': devices, 'reason': str(e)}
+                break
+            results['steps'].append(result)
+            print_step(result)
+
+            detection = result['detection']
+            missed = detection['missed'] / detection['expected'] if detection['expected'] else 1.0
+            if detection['p99_ms'] is None or detection['p99_ms'] > args.max_p99_ms:
+                reason = f"p99 detection latency above {args.max_p99_ms:.0f}ms"
+            elif missed > args.max_missed:
+                reason = f"{missed * 100:.0f}% of wakewords missed"
+            else:
+                continue
+            results['limit'] = {'devices': devices, 'reason': reason}
+            break
+    except KeyboardInterrupt:
+        print("\nInterrupted")
+    finally:
+        if args.keep:
+            print(f"\nConfigs and service logs kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    passed = [step['devices'] for step in results['steps']
+              if results['limit'] is None or step['devices'] < results['limit']['devices']]
+    if results['limit']:
+        print(f"\n⚠️ Limit at {results['limit']['devices']} device(s): {results['limit']['reason']}")
+    if passed:
+        print(f"✓ Kept up with {max(passed)} device(s)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
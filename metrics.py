@@ -0,0 +1,243 @@
+"""
+Prometheus-style metrics for the device pipelines
+Devices record wakeword/VAD latencies on the hot path with two clock reads
+and a list append, and fold them into fixed-bucket histograms in batches;
+everything else, such as buffer depth, overruns, lag and stream uptime, is
+read from the existing counters when the endpoint is scraped.
+"""
+
+import time
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Seconds; wakeword and VAD calls take tens of µs to a few ms
+INFERENCE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+# Seconds from wakeword frame arrival to the broker's acknowledgement
+ACK_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a lock-free single-writer observe()"""
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def observe_many(self, values):
+        counts, buckets = self.counts, self.buckets
+        for value in values:
+            counts[bisect_left(buckets, value)] += 1
+        self.sum += sum(values)
+        self.count += len(values)
+
+    def render(self, name, labels, lines):
+        """Append the Prometheus text lines of this histogram"""
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+
+
+class BatchedHistogram(Histogram):
+    """Histogram whose record() only appends; samples are folded in every batch
+
+    A scrape does not see the samples of the batch in progress, about a
+    second of frames at the default size.
+    """
+    __slots__ = ('batch', 'pending')
+
+    def __init__(self, buckets, batch=16):
+        super().__init__(buckets)
+        self.batch = batch
+        self.pending = []
+
+    def record(self, value):
+        pending = self.pending
+        pending.append(value)
+        if len(pending) >= self.batch:
+            self.pending = []
+            self.observe_many(pending)
+
+
+class DeviceMetrics:
+    """Hot-path measurements of one device"""
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self.wakeword_seconds = BatchedHistogram(INFERENCE_BUCKETS)
+        self.vad_seconds = BatchedHistogram(INFERENCE_BUCKETS)
+        self.wakeword_ack_seconds = Histogram(ACK_BUCKETS)
+        self.wakewords = 0
+
+
+class MetricsRegistry:
+    """Renders the metrics of every device (and shard) in Prometheus text format"""
+    def __init__(self):
+        self.devices = []
+        self.publisher = None
+        self.shard_supervisor = None
+        self._last_scrape = {}
+
+    def add_device(self, device):
+        """Register a DeviceMonitor whose metrics are enabled"""
+        self.devices.append(device)
+
+    def remove_device(self, device):
+        """Stop reporting a DeviceMonitor that was shut down"""
+        self.devices = [d for d in self.devices if d is not device]
+        self._last_scrape.pop(device.device_id, None)
+
+    def render(self):
+        lines = []
+        if self.devices:
+            self._render_devices(lines)
+        if self.shard_supervisor:
+            self._render_shards(lines)
+        if self.publisher:
+            self._render_publisher(lines)
+        return '\n'.join(lines) + '\n'
+
+    def _render_devices(self, lines):
+        now = time.monotonic()
+        rows = []
+        for device in self.devices:
+            buffer_stats = device.audio_buffer.stats()
+            stream_stats = device.stream_supervisor.stats() if device.stream_supervisor else None
+            frames = buffer_stats['frames_read']
+            last = self._last_scrape.get(device.device_id)
+            fps = (frames - last[1]) / (now - last[0]) if last and now > last[0] else 0.0
+            self._last_scrape[device.device_id] = (now, frames)
+            rows.append((f'device="{device.device_id}"', device, buffer_stats, stream_stats, fps))
+
+        def gauge(name, kind, help_text, value_of):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, device, buffer_stats, stream_stats, fps in rows:
+                value = value_of(device, buffer_stats, stream_stats, fps)
+                if value is not None:
+                    lines.append(f'{name}{{{labels}}} {value}')
+
+        gauge('wakeword_frames_processed_total', 'counter', 'Audio frames processed',
+              lambda d, b, s, fps: b['frames_read'])
+        gauge('wakeword_frames_per_second', 'gauge', 'Frames processed per second since the last scrape',
+              lambda d, b, s, fps: f'{fps:.2f}')
+        gauge('wakeword_buffer_depth_samples', 'gauge', 'Unprocessed samples in the audio buffer',
+              lambda d, b, s, fps: b['depth_samples'])
+        gauge('wakeword_buffer_overruns_total', 'counter', 'Audio buffer overruns',
+              lambda d, b, s, fps: b['overruns'])
+        gauge('wakeword_processing_lag_seconds', 'gauge', 'Audio waiting to be processed',
+              lambda d, b, s, fps: f'{d.lag_samples / 16000:.3f}')
+        gauge('wakeword_catchup_skips_total', 'counter', 'Backlog skips after exceeding the maximum lag',
+              lambda d, b, s, fps: d.catchup_skips)
+        gauge('wakeword_stream_up', 'gauge', 'Whether the RTSP stream is connected',
+              lambda d, b, s, fps: int(s['connected']) if s else None)
+        gauge('wakeword_stream_uptime_seconds', 'gauge', 'Seconds since the RTSP stream (re)connected',
+              lambda d, b, s, fps: f"{s['uptime_s']:.1f}" if s else None)
+        gauge('wakeword_stream_reconnects_total', 'counter', 'RTSP stream reconnects',
+              lambda d, b, s, fps: s['reconnects'] if s else None)
+        gauge('wakeword_gated_frames_total', 'counter', 'Frames the energy gate kept from the wakeword detector',
+              lambda d, b, s, fps: d.wakeword_gate.gated if d.wakeword_gate else None)
+        gauge('wakeword_detections_total', 'counter', 'Wakewords detected',
+              lambda d, b, s, fps: d.metrics.wakewords)
+        gauge('wakeword_suppressed_total', 'counter', 'Wakewords dropped because another device in the group won',
+              lambda d, b, s, fps: d.suppressed_wakewords if d.arbiter is not None else None)
+
+        for name, attribute, help_text in (
+            ('wakeword_detector_seconds', 'wakeword_seconds', 'Wakeword detector latency per frame'),
+            ('wakeword_vad_seconds', 'vad_seconds', 'VAD inference latency'),
+            ('wakeword_publish_ack_seconds', 'wakeword_ack_seconds',
+             'Wakeword frame arrival to MQTT publish acknowledgement'),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, device, _, _, _ in rows:
+                getattr(device.metrics, attribute).render(name, labels, lines)
+
+    def _render_shards(self, lines):
+        shards = sorted(self.shard_supervisor.shard_metrics().items())
+        for name, key, kind, help_text in (
+            ('wakeword_shard_devices', 'devices', 'gauge', 'Devices running in the shard'),
+            ('wakeword_shard_cpu_percent', 'cpu_percent', 'gauge', 'Shard worker CPU usage'),
+            ('wakeword_shard_frames_per_second', 'frames_per_second', 'gauge', 'Frames processed per second'),
+            ('wakeword_shard_buffer_overruns_total', 'overruns', 'counter', 'Audio buffer overruns'),
+            ('wakeword_shard_processing_lag_seconds', 'max_lag_ms', 'gauge', 'Highest device lag'),
+            ('wakeword_shard_restarts_total', 'restarts', 'counter', 'Worker restarts'),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for shard_id, stats in shards:
+                value = stats[key] / 1000 if key == 'max_lag_ms' else stats[key]
+                lines.append(f'{name}{{shard="{shard_id}"}} {value}')
+
+    def _render_publisher(self, lines):
+        stats = self.publisher.stats()
+        for name, key, kind, help_text in (
+            ('wakeword_mqtt_connected', 'connected', 'gauge', 'Whether the MQTT broker connection is up'),
+            ('wakeword_mqtt_reconnects_total', 'reconnects', 'counter', 'MQTT reconnects'),
+            ('wakeword_mqtt_queued_events', 'queued', 'gauge', 'Events waiting to be published'),
+            ('wakeword_mqtt_published_total', 'published', 'counter',
+             'Events acknowledged by the broker (QoS 0: written to the socket)'),
+            ('wakeword_mqtt_awaiting_ack_events', 'awaiting_ack', 'gauge',
+             'QoS 1/2 events sent and waiting for the broker to acknowledge them'),
+            ('wakeword_mqtt_dropped_total', 'dropped', 'counter', 'Events dropped because the queue was full'),
+            ('wakeword_mqtt_audio_dropped_total', 'lossy_dropped', 'counter',
+             'Utterance audio chunks dropped while the broker was unreachable or behind'),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {int(stats[key])}')
+        name = 'wakeword_mqtt_publish_seconds'
+        lines.append(f'# HELP {name} Event queued to broker acknowledgement')
+        lines.append(f'# TYPE {name} histogram')
+        self.publisher.publish_seconds.render(name, 'client="events"', lines)
+
+
+class MetricsServer:
+    """Serves a MetricsRegistry on http://host:port/metrics"""
+    def __init__(self, registry, host='127.0.0.1', port=9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server = None
+        self._thread = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
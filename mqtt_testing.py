@@ -0,0 +1,152 @@
+"""
+MQTT stand-ins for replay, benchmarks and load tests
+InMemoryMqttClient replaces a device's MQTT client and records what it
+publishes; LoopbackMqttBroker is a minimal broker on localhost that the
+real paho client and EventPublisher can connect to.
+"""
+
+import time
+import socket
+import struct
+import threading
+
+
+class InMemoryMqttClient:
+    """MQTT client stand-in that records every publish with its audio time"""
+    def __init__(self, clock):
+        self.clock = clock
+        self.messages = []
+        self._start = time.perf_counter()
+
+    def publish(self, topic, payload=None, qos=0, retain=False, on_ack=None, lossy=False):
+        self.messages.append({
+            'topic': topic,
+            'payload': payload,
+            'qos': qos,
+            'retain': retain,
+            'audio_time_s': round(self.clock(), 4),
+            'processing_time_s': round(time.perf_counter() - self._start, 4),
+        })
+
+
+class LoopbackMqttBroker:
+    """Minimal MQTT 3.1.1 broker stand-in that records every PUBLISH
+
+    Handles CONNECT, PUBLISH at QoS 0-2, PINGREQ and DISCONNECT. stop()
+    drops all connections and the listener to simulate an outage, and
+    start() listens on the same port again. ack_delay holds back QoS 1/2
+    acknowledgements, like a slow broker.
+    """
+    def __init__(self):
+        self.port = 0
+        self.messages = []
+        self.credentials = []
+        self.ack_delay = 0
+        self.listener = None
+        self.clients = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(('127.0.0.1', self.port))
+        self.listener.listen(16)
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self._accept, args=(self.listener,), daemon=True).start()
+
+    def stop(self):
+        # shutdown() wakes the accept() thread; close() alone would leave the
+        # port bound until it returns
+        try:
+            self.listener.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.listener.close()
+        with self._lock:
+            clients, self.clients = self.clients, []
+        for client in clients:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            client.close()
+
+    def _accept(self, listener):
+        while True:
+            try:
+                client, _ = listener.accept()
+            except OSError:
+                return
+            with self._lock:
+                self.clients.append(client)
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    @staticmethod
+    def _read_packet(client):
+        header = client.recv(1)
+        if not header:
+            return None, None
+        length, shift = 0, 0
+        while True:
+            byte = client.recv(1)
+            if not byte:
+                return None, None
+            length |= (byte[0] & 0x7F) << shift
+            shift += 7
+            if not byte[0] & 0x80:
+                break
+        body = b''
+        while len(body) < length:
+            chunk = client.recv(length - len(body))
+            if not chunk:
+                return None, None
+            body += chunk
+        return header[0], body
+
+    def _serve(self, client):
+        try:
+            while True:
+                first, body = self._read_packet(client)
+                if first is None:
+                    break
+                kind = first >> 4
+                if kind == 1:  # CONNECT
+                    offset = 2 + struct.unpack('>H', body[:2])[0] + 1
+                    flags = body[offset]
+                    offset += 3
+                    fields = []
+                    while offset < len(body):
+                        size = struct.unpack('>H', body[offset:offset + 2])[0]
+                        fields.append(body[offset + 2:offset + 2 + size])
+                        offset += 2 + size
+                    # Client id, then user name and password when flagged
+                    user = fields[1].decode() if flags & 0x80 and len(fields) > 1 else None
+                    password = fields[2].decode() if flags & 0x40 and len(fields) > 2 else None
+                    self.credentials.append((user, password))
+                    client.sendall(b'\x20\x02\x00\x00')
+                elif kind == 3:  # PUBLISH
+                    qos = (first >> 1) & 3
+                    size = struct.unpack('>H', body[:2])[0]
+                    topic = body[2:2 + size].decode()
+                    offset = 2 + size
+                    if qos:
+                        packet_id = body[offset:offset + 2]
+                        offset += 2
+                    with self._lock:
+                        self.messages.append((time.monotonic(), topic, body[offset:], qos, bool(first & 1)))
+                    if qos and self.ack_delay:
+                        time.sleep(self.ack_delay)
+                    if qos == 1:
+                        client.sendall(b'\x40\x02' + packet_id)
+                    elif qos == 2:
+                        client.sendall(b'\x50\x02' + packet_id)
+                elif kind == 6:  # PUBREL
+                    client.sendall(b'\x70\x02' + body[:2])
+                elif kind == 12:  # PINGREQ
+                    client.sendall(b'\xd0\x00')
+                elif kind == 14:  # DISCONNECT
+                    break
+        except OSError:
+            pass
+        finally:
+            client.close()
@@ -0,0 +1,242 @@
+"""
+Preallocated PCM ring buffer for a single device stream
+The reader thread fills the buffer in place with readinto() and the
+processing loop blocks until a full frame is ready, then receives it as
+an int16 view, so no audio is copied between the FFmpeg pipe and
+Porcupine. With a shared name, the ring lives in shared memory and other
+processes can follow the stream with a pcm_channel.PcmChannelReader.
+"""
+
+import threading
+import numpy as np
+
+from pcm_channel import create_shared_ring, CommitSignal, WRITE, RESERVED, GENERATION, CLOSED
+
+
+class PcmRingBuffer:
+    """Fixed-size int16 ring buffer with a single writer and a single reader"""
+    def __init__(self, frame_samples, capacity_samples, history_samples=0, shared_name=None):
+        self.frame_samples = frame_samples
+        self.frame_bytes = frame_samples * 2
+
+        # Round capacity up to whole frames so frames never wrap the ring;
+        # history_samples of already-read audio are kept on top of it
+        frames = max(2, -(-capacity_samples // frame_samples)) + -(-history_samples // frame_samples)
+        self.capacity_samples = frames * frame_samples
+        self.capacity_bytes = self.capacity_samples * 2
+        self.history_bytes = history_samples * 2
+
+        self.shared_name = shared_name
+        self._shm = None
+        self._header = None
+        self._signal = None
+        if shared_name:
+            self._shm, self._header, self._samples = create_shared_ring(
+                shared_name, self.capacity_samples, frame_samples)
+            try:
+                self._signal = CommitSignal(shared_name)
+            except OSError:
+                self._shm.close()
+                self._shm.unlink()
+                raise
+        else:
+            self._samples = np.zeros(self.capacity_samples, dtype=np.int16)
+        self._bytes = memoryview(self._samples).cast('B')
+        # Reads are frame-aligned, so each frame slot's view is made once
+        self._frames = [self._samples[start:start + frame_samples]
+                        for start in range(0, self.capacity_samples, frame_samples)]
+        self._lock = threading.Lock()
+        self._frame_ready = threading.Condition(self._lock)
+        self._closed = False
+
+        # Absolute byte positions; the frame lent to the reader starts at _hold
+        self._write = 0
+        self._read = 0
+        self._hold = 0
+
+        # Statistics
+        self.bytes_written = 0
+        self.frames_read = 0
+        self.overruns = 0
+        self.dropped_bytes = 0
+        self.skipped_bytes = 0
+
+    def fill_from(self, stream, max_bytes=3200):
+        """Read up to max_bytes from a binary stream directly into the ring
+
+        Returns the number of bytes stored, 0 on EOF.
+        """
+        start, end = self._reserve(max_bytes)
+
+        # Blocking I/O happens outside the lock; the reader never touches
+        # the region between _write and _hold + capacity
+        count = stream.readinto(self._bytes[start:end])
+        if not count:
+            return 0
+
+        self._commit(count)
+        return count
+
+    def write(self, data):
+        """Copy a chunk of bytes into the ring, for producers without readinto()"""
+        data = memoryview(data).cast('B')
+        offset = 0
+        while offset < len(data):
+            start, end = self._reserve(len(data) - offset)
+            count = end - start
+            self._bytes[start:end] = data[offset:offset + count]
+            self._commit(count)
+            offset += count
+        return offset
+
+    def reserve(self, max_samples):
+        """Contiguous int16 view the writer may fill next, up to max_samples long
+
+        For producers that decode whole samples in place; publish the
+        filled samples with commit().
+        """
+        start, end = self._reserve(max_samples * 2)
+        return self._samples[start // 2:end // 2]
+
+    def commit(self, samples):
+        """Publish samples written into the view returned by reserve()"""
+        self._commit(samples * 2)
+
+    def _reserve(self, max_bytes):
+        """Return the contiguous (start, end) byte region the writer may fill next"""
+        with self._lock:
+            free = self._hold - self.history_bytes + self.capacity_bytes - self._write
+            if free < max_bytes:
+                self._drop_backlog()
+                free = self._hold - self.history_bytes + self.capacity_bytes - self._write
+            start = self._write % self.capacity_bytes
+            end = min(start + max_bytes, start + free, self.capacity_bytes)
+            if self._header is not None:
+                # Shared readers must not trust samples in the region being filled
+                self._header[RESERVED] = (self._write + end - start + 1) // 2
+            return start, end
+
+    def _commit(self, count):
+        """Publish count freshly written bytes to the reader"""
+        with self._lock:
+            self._write += count
+            self.bytes_written += count
+            if self._header is not None:
+                self._header[WRITE] = self._write // 2
+            if self._write - self._read >= self.frame_bytes:
+                self._frame_ready.notify()
+        if self._signal is not None:
+            self._signal.notify()
+
+    def _drop_backlog(self):
+        """Discard unread audio after the reader fell a full buffer behind"""
+        backlog = self._write - self._read
+        # Keep the stream's byte parity so a split sample stays aligned
+        self._write = self._read + (backlog % 2)
+        self.dropped_bytes += backlog - (backlog % 2)
+        self.overruns += 1
+        if self._header is not None:
+            # Positions restart behind what shared readers have seen
+            self._header[GENERATION] += 1
+            self._header[WRITE] = self._write // 2
+
+    def read_frame(self, timeout=None):
+        """Return the next frame as an int16 view
+
+        Blocks until a full frame is buffered, the timeout expires or the
+        buffer is closed; returns None in the latter two cases. A timeout
+        of 0 never blocks. The view stays valid until the next call.
+        """
+        with self._lock:
+            self._hold = self._read
+            if self._write - self._read < self.frame_bytes:
+                if timeout == 0 or self._closed:
+                    return None
+                self._frame_ready.wait_for(
+                    lambda: self._closed or self._write - self._read >= self.frame_bytes,
+                    timeout
+                )
+                if self._write - self._read < self.frame_bytes:
+                    return None
+
+            frame = self._frames[(self._read % self.capacity_bytes) // self.frame_bytes]
+            self._read += self.frame_bytes
+            self.frames_read += 1
+            return frame
+
+    def skip(self, max_samples):
+        """Discard up to max_samples of the oldest unread audio, in whole frames
+
+        Lets a reader that fell behind jump closer to live audio. Returns
+        the number of samples skipped.
+        """
+        with self._lock:
+            frames = min(max_samples * 2, self._write - self._read) // self.frame_bytes
+            self._read += frames * self.frame_bytes
+            self.skipped_bytes += frames * self.frame_bytes
+            return frames * self.frame_samples
+
+    def history(self, max_samples):
+        """Copy of up to max_samples of the most recently read audio
+
+        Includes the frame last returned by read_frame(). Audio older than
+        the history_samples the buffer was created with may be gone.
+        """
+        with self._lock:
+            count = min(max_samples * 2, self._read, self._read - self._hold + self.history_bytes) // 2
+            start = (self._read // 2 - count) % self.capacity_samples
+            end = start + count
+            if end <= self.capacity_samples:
+                return self._samples[start:end].copy()
+            return np.concatenate((self._samples[start:], self._samples[:end - self.capacity_samples]))
+
+    def close(self):
+        """Wake a blocked reader; subsequent reads only drain buffered frames"""
+        with self._lock:
+            self._closed = True
+            self._frame_ready.notify_all()
+            if self._header is not None:
+                self._header[CLOSED] = 1
+        if self._signal is not None:
+            self._signal.notify()
+
+    def release(self):
+        """Remove the shared block once the buffer is no longer used
+
+        Readers still attached keep their mapping until they close it.
+        """
+        if self._shm is None:
+            return
+        self.close()
+        self._signal.close()
+        shm, self._shm, self._signal = self._shm, None, None
+        self._header = self._samples = self._bytes = self._frames = None
+        shm.unlink()
+        try:
+            shm.close()
+        except BufferError:
+            # A frame view is still referenced; the mapping goes with it
+            pass
+
+    @property
+    def closed(self):
+        """True once the stream feeding this buffer has ended"""
+        return self._closed
+
+    def available_samples(self):
+        """Number of complete unread samples"""
+        with self._lock:
+            return (self._write - self._read) // 2
+
+    def stats(self):
+        """Snapshot of buffer counters"""
+        with self._lock:
+            return {
+                'depth_samples': (self._write - self._read) // 2,
+                'capacity_samples': self.capacity_samples,
+                'bytes_written': self.bytes_written,
+                'frames_read': self.frames_read,
+                'overruns': self.overruns,
+                'dropped_bytes': self.dropped_bytes,
+                'skipped_bytes': self.skipped_bytes,
+            }
@@ -0,0 +1,318 @@
+"""
+Shared-memory PCM channel
+A device's PCM ring buffer can live in a named multiprocessing.shared_memory
+block, so any number of other threads or processes can read the decoded
+stream without a second RTSP connection or a copy per consumer. The device
+stays the single writer; every PcmChannelReader keeps its own read cursor
+and never holds the writer back. A reader that falls a full ring behind
+skips to live audio and counts an overrun.
+
+The block starts with a small header of uint64 fields followed by the
+int16 samples. Positions are absolute sample counts; the writer bumps the
+generation whenever it rewinds after an overrun of its own reader, which
+sends every attached reader back to the live edge.
+
+Readers do not poll the header on a timer. Each one subscribes to the
+writer's Unix datagram socket and is sent a datagram after every commit,
+and waits in poll() until one arrives.
+"""
+
+import time
+import select
+import socket
+import threading
+import contextlib
+import numpy as np
+from multiprocessing import shared_memory
+
+
+MAGIC = int.from_bytes(b"WAKEPCM1", "little")
+SAMPLE_RATE = 16000
+
+# Header fields (uint64)
+MAGIC_FIELD, CAPACITY, RATE, WRITE, RESERVED, GENERATION, CLOSED, FRAME = range(8)
+HEADER_BYTES = 64
+
+# Serializes attaching with creating while registration is switched off
+_tracker_lock = threading.Lock()
+
+
+def create_shared_ring(name, capacity_samples, frame_samples):
+    """Create the shared block of a ring; returns (shm, header, samples)
+
+    A block left behind by a process that died is replaced.
+    """
+    size = HEADER_BYTES + capacity_samples * 2
+    with _tracker_lock:
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+    header = np.ndarray((HEADER_BYTES // 8,), dtype=np.uint64, buffer=shm.buf)
+    header[:] = 0
+    header[CAPACITY] = capacity_samples
+    header[RATE] = SAMPLE_RATE
+    header[FRAME] = frame_samples
+    header[MAGIC_FIELD] = MAGIC
+    samples = np.ndarray((capacity_samples,), dtype=np.int16, buffer=shm.buf, offset=HEADER_BYTES)
+    return shm, header, samples
+
+
+@contextlib.contextmanager
+def _untracked():
+    """Keep SharedMemory from registering the blocks it opens"""
+    register = shared_memory.resource_tracker.register
+    with _tracker_lock:
+        shared_memory.resource_tracker.register = lambda name, rtype: None
+        try:
+            yield
+        finally:
+            shared_memory.resource_tracker.register = register
+
+
+def _attach(name):
+    """Open an existing block without taking ownership of it
+
+    A registered block is removed by the resource tracker when the process
+    exits, even though the device still owns it. Python 3.13 can open a
+    block untracked; older versions register every block they open.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    with _untracked():
+        return shared_memory.SharedMemory(name=name)
+
+
+def _signal_address(name):
+    # Abstract Unix socket namespace: nothing is left on disk and the
+    # address goes away with the process
+    return '\0' + name + '.commit'
+
+
+class CommitSignal:
+    """Writer side of a channel's wakeups
+
+    Readers subscribe by sending b'+' to the channel's socket and b'-' to
+    leave; every notify() sends each subscriber a datagram. Sends never
+    block the writer: a reader whose socket queue is full already has
+    wakeups pending, and one that has gone is dropped.
+    """
+    def __init__(self, name):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            self.sock.bind(_signal_address(name))
+        except OSError:
+            self.sock.close()
+            raise
+        self.sock.setblocking(False)
+        self.readers = set()
+        # The device's reader thread commits while stop() closes the buffer
+        self._lock = threading.Lock()
+
+    def notify(self):
+        """Wake every subscribed reader"""
+        with self._lock:
+            if self.sock is None:
+                return
+            while True:
+                try:
+                    message, address = self.sock.recvfrom(16)
+                except BlockingIOError:
+                    break
+                if message == b'+':
+                    self.readers.add(address)
+                else:
+                    self.readers.discard(address)
+            for address in list(self.readers):
+                try:
+                    self.sock.sendto(b'.', address)
+                except BlockingIOError:
+                    pass
+                except OSError:
+                    self.readers.discard(address)
+
+    def close(self):
+        with self._lock:
+            if self.sock is not None:
+                self.sock.close()
+                self.sock = None
+
+
+class PcmChannelReader:
+    """Independent reader of a device's shared PCM ring
+
+    Frames are returned as read-only int16 views into shared memory; a
+    view stays valid until the writer has gone once around the ring after
+    it (the device's buffer_seconds), so a reader that keeps up never sees
+    it change. Only a frame that straddles the end of the ring is copied.
+    """
+    def __init__(self, name, frame_samples=512, backlog_samples=0):
+        self.name = name
+        self.frame_samples = frame_samples
+        self._shm = _attach(name)
+        self._signal = None
+        self._header = np.ndarray((HEADER_BYTES // 8,), dtype=np.uint64, buffer=self._shm.buf)
+        self._header.flags.writeable = False
+        if int(self._header[MAGIC_FIELD]) != MAGIC:
+            self.close()
+            raise ValueError(f"{name} is not a PCM channel")
+
+        self.capacity_samples = int(self._header[CAPACITY])
+        self.sample_rate = int(self._header[RATE])
+        self._samples = np.ndarray((self.capacity_samples,), dtype=np.int16,
+                                   buffer=self._shm.buf, offset=HEADER_BYTES)
+        self._samples.flags.writeable = False
+        self._scratch = np.zeros(frame_samples, dtype=np.int16)
+
+        # Subscribe before the first look at the header, so no commit after
+        # it goes unnoticed; autobind gives the socket an abstract address
+        self._signal = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._signal.bind('')
+        self._signal.setblocking(False)
+        try:
+            self._signal.sendto(b'+', _signal_address(name))
+        except OSError:
+            self.close()
+            raise ValueError(f"{name} has no writer")
+        self._poll = select.poll()
+        self._poll.register(self._signal, select.POLLIN)
+
+        # Start backlog_samples behind live audio
+        self._generation = int(self._header[GENERATION])
+        write = int(self._header[WRITE])
+        self._position = max(0, write - min(backlog_samples, self.capacity_samples - frame_samples))
+        self._held = None
+
+        # Statistics
+        self.frames_read = 0
+        self.overruns = 0
+        self.dropped_samples = 0
+
+    def read_frame(self, timeout=None):
+        """Return the next frame_samples of audio as an int16 view
+
+        Blocks until a full frame has been written, the timeout expires or
+        the device closes its buffer; returns None in the latter two cases.
+        A timeout of 0 never blocks.
+        """
+        header = self._header
+        self._check_held()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if int(header[GENERATION]) != self._generation:
+                self._skip_to_live()
+            available = int(header[WRITE]) - self._position
+            if available > self.capacity_samples - self.frame_samples:
+                self._skip_to_live()
+                available = 0
+            if available < self.frame_samples:
+                if header[CLOSED]:
+                    return None
+                # Datagrams from commits already seen are drained first; the
+                # header is read again after each wakeup
+                if self._drain():
+                    continue
+                wait = None
+                if deadline is not None:
+                    wait = deadline - time.monotonic()
+                    if wait <= 0:
+                        return None
+                    wait *= 1000
+                if not self._poll.poll(wait):
+                    return None
+                continue
+
+            start = self._position % self.capacity_samples
+            end = start + self.frame_samples
+            if end <= self.capacity_samples:
+                frame = self._samples[start:end]
+            else:
+                split = self.capacity_samples - start
+                frame = self._scratch
+                frame[:split] = self._samples[start:]
+                frame[split:] = self._samples[:end - self.capacity_samples]
+
+            # The writer may already be refilling the slot of a frame that
+            # lagged right up to the capacity; skip it rather than hand out
+            # torn audio
+            if self._intact(self._position):
+                break
+            self._skip_to_live()
+
+        # A copied frame cannot change under the caller
+        self._held = self._position if frame is not self._scratch else None
+        self._position += self.frame_samples
+        self.frames_read += 1
+        return frame
+
+    def _drain(self):
+        """Consume pending wakeups; returns whether there were any"""
+        woken = False
+        while True:
+            try:
+                self._signal.recv(64)
+            except BlockingIOError:
+                return woken
+            woken = True
+
+    def _intact(self, position):
+        """Whether the samples from position on have not been overwritten yet"""
+        return (int(self._header[GENERATION]) == self._generation
+                and int(self._header[RESERVED]) <= position + self.capacity_samples)
+
+    def _check_held(self):
+        """Count the previous frame as an overrun if it changed while it was held"""
+        if self._held is not None and not self._intact(self._held):
+            self.overruns += 1
+        self._held = None
+
+    def _skip_to_live(self):
+        generation = int(self._header[GENERATION])
+        write = int(self._header[WRITE])
+        # Positions of an earlier generation cannot be compared
+        if generation == self._generation and write > self._position:
+            self.dropped_samples += write - self._position
+        self._generation = generation
+        self._position = write
+        self._held = None
+        self.overruns += 1
+
+    def available_samples(self):
+        """Samples written but not yet read by this reader"""
+        return max(0, int(self._header[WRITE]) - self._position)
+
+    @property
+    def closed(self):
+        """True once the device has closed its buffer"""
+        return bool(self._header[CLOSED])
+
+    def stats(self):
+        """Snapshot of reader counters"""
+        return {
+            'frames_read': self.frames_read,
+            'lag_samples': self.available_samples(),
+            'overruns': self.overruns,
+            'dropped_samples': self.dropped_samples,
+        }
+
+    def close(self):
+        """Detach from the shared block; views returned earlier become invalid"""
+        if self._signal is not None:
+            try:
+                self._signal.sendto(b'-', _signal_address(self.name))
+            except OSError:
+                pass
+            self._signal.close()
+            self._signal = None
+        self._header = self._samples = self._scratch = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # A caller still holds a frame; the mapping goes with it
+            pass
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Replay WAV or raw PCM files through the detection pipeline
+Feeds recorded audio through the same ring buffer, wakeword and VAD state
+machine DeviceMonitor runs live, as fast as the CPU allows, with MQTT
+replaced by an in-memory sink. Results (real-time factor, per-stage
+latency, detection and endpoint timestamps) are written as JSON so they
+can be compared between versions.
+"""
+
+import os
+import sys
+import json
+import time
+import wave
+import argparse
+import platform
+import subprocess
+
+import numpy as np
+
+from mqtt_testing import InMemoryMqttClient
+
+SAMPLE_RATE = 16000
+CHUNK_SAMPLES = 1600
+
+
+def load_audio(path):
+    """Load a WAV file or raw 16 kHz s16le PCM as 16 kHz mono int16"""
+    if not path.lower().endswith('.wav'):
+        with open(path, 'rb') as f:
+            data = f.read()
+        return np.frombuffer(data[:len(data) // 2 * 2], dtype='<i2').astype(np.int16)
+
+    with wave.open(path, 'rb') as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        rate = wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+
+    if width == 2:
+        samples = np.frombuffer(frames, dtype='<i2').astype(np.float32)
+    elif width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) * 256
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype='<i4').astype(np.float32) / 65536
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {width * 8} bits")
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+
+    if rate != SAMPLE_RATE:
+        # Linear interpolation is enough for speech test material
+        count = int(len(samples) * SAMPLE_RATE / rate)
+        samples = np.interp(np.arange(count) * rate / SAMPLE_RATE, np.arange(len(samples)), samples)
+
+    return np.clip(np.round(samples), -32768, 32767).astype(np.int16)
+
+
+class _TimedDetector:
+    """Records the latency of each wakeword detector process() call"""
+    def __init__(self, detector):
+        self.detector = detector
+        self.timings = []
+
+    def process(self, pcm):
+        start = time.perf_counter()
+        result = self.detector.process(pcm)
+        self.timings.append(time.perf_counter() - start)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.detector, name)
+
+
+def _latency_summary(timings):
+    """Percentiles of a list of durations in seconds, reported in µs"""
+    if not timings:
+        return None
+    values = np.array(timings) * 1e6
+    return {
+        'count': len(values),
+        'mean_us': round(float(values.mean()), 2),
+        'p50_us': round(float(np.percentile(values, 50)), 2),
+        'p90_us': round(float(np.percentile(values, 90)), 2),
+        'p99_us': round(float(np.percentile(values, 99)), 2),
+        'max_us': round(float(values.max()), 2),
+    }
+
+
+class _ReplayDevice:
+    """An initialized DeviceMonitor wired for replay
+
+    MQTT is replaced by an InMemoryMqttClient, and the wakeword detector
+    and VAD calls are timed.
+    """
+    def __init__(self, device):
+        self.device = device
+        self.sink = InMemoryMqttClient(device.audio_time)
+        device.mqtt_client = self.sink
+        streamer = device.utterance_streamer
+        if streamer is not None and hasattr(streamer.sink, 'mqtt_client'):
+            streamer.sink.mqtt_client = self.sink
+        device.running = True
+
+        self.detector = device.wakeword_detector
+        device.wakeword_detector = self.timed = _TimedDetector(self.detector)
+        self.vad_timings = []
+        get_speech_probability = device.get_speech_probability
+
+        def timed_vad(audio_samples):
+            start = time.perf_counter()
+            probability = get_speech_probability(audio_samples)
+            self.vad_timings.append(time.perf_counter() - start)
+            return probability
+
+        device.get_speech_probability = timed_vad
+        self.frame_timings = []
+        self.processing = 0.0
+
+    def feed(self, chunk):
+        """Buffer a chunk of audio and process every complete frame"""
+        start = time.perf_counter()
+        device = self.device
+        device.audio_buffer.write(chunk)
+        while True:
+            frame = device.read_frame(timeout=0)
+            if frame is None:
+                break
+            frame_start = time.perf_counter()
+            device.process_frame(frame)
+            self.frame_timings.append(time.perf_counter() - frame_start)
+        self.processing += time.perf_counter() - start
+
+    def restore(self):
+        self.device.wakeword_detector = self.detector
+        del self.device.get_speech_probability
+
+    def results(self, audio_seconds, processing):
+        device = self.device
+        kinds = {device.topics['wakeword']: 'wakeword', device.topics['vad_stop']: 'endpoint'}
+        events = [{'type': kinds[message['topic']], **message}
+                  for message in self.sink.messages if message['topic'] in kinds]
+        return {
+            'audio_seconds': round(audio_seconds, 3),
+            'processing_seconds': round(processing, 4),
+            'rtf': round(processing / audio_seconds, 5) if audio_seconds else None,
+            'speed': round(audio_seconds / processing, 1) if processing else None,
+            'frames': len(self.frame_timings),
+            'latency': {
+                'frame': _latency_summary(self.frame_timings),
+                'wakeword': _latency_summary(self.timed.timings),
+                'vad': _latency_summary(self.vad_timings),
+            },
+            'gate': device.wakeword_gate.stats() if device.wakeword_gate else None,
+            'detections': sum(1 for e in events if e['type'] == 'wakeword'),
+            'endpoints': sum(1 for e in events if e['type'] == 'endpoint'),
+            'events': events,
+        }
+
+
+def replay(device, pcm, realtime=False):
+    """Run int16 PCM through an initialized DeviceMonitor and collect results
+
+    The device's MQTT client is replaced by an InMemoryMqttClient. With
+    realtime=True the audio is paced at 16 kHz, as a live stream would be;
+    endpointing runs on the audio clock, so events are the same either way.
+    """
+    return replay_group([device], [pcm], realtime)[0]
+
+
+def replay_group(devices, pcms, realtime=False):
+    """Replay recordings made at the same time, one per device, in lockstep
+
+    Every device is fed the same stretch of audio before the next one
+    starts, so devices that share a wakeword arbiter (on the audio clock)
+    see each other's detections as they would live. With several devices,
+    processing_seconds is the time spent on each device's own audio.
+    """
+    replays = [_ReplayDevice(device) for device in devices]
+    start = time.perf_counter()
+    try:
+        for offset in range(0, max(len(pcm) for pcm in pcms), CHUNK_SAMPLES):
+            if realtime:
+                due = start + offset / SAMPLE_RATE
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            for entry, pcm in zip(replays, pcms):
+                if offset < len(pcm):
+                    entry.feed(pcm[offset:offset + CHUNK_SAMPLES])
+    finally:
+        processing = time.perf_counter() - start
+        for entry in replays:
+            entry.restore()
+
+    return [entry.results(len(pcm) / SAMPLE_RATE, processing if len(replays) == 1 else entry.processing)
+            for entry, pcm in zip(replays, pcms)]
+
+
+def _git_version():
+    """Commit of the working tree, if it is a git checkout"""
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline):
+    """Print RTF and event differences against a previous results file"""
+    previous = {entry['file']: entry for entry in baseline.get('files', [])}
+    print(f"\nCompared with {baseline.get('version') or 'baseline'}:")
+    for entry in results['files']:
+        old = previous.get(entry['file'])
+        if not old:
+            print(f"  {entry['file']}: not in baseline")
+            continue
+        change = (entry['rtf'] / old['rtf'] - 1) * 100 if old.get('rtf') else 0.0
+        line = f"  {entry['file']}: RTF {old['rtf']:.4f} → {entry['rtf']:.4f} ({change:+.1f}%)"
+        old_events = [(e['type'], e['audio_time_s']) for e in old['events']]
+        new_events = [(e['type'], e['audio_time_s']) for e in entry['events']]
+        if old_events != new_events:
+            line += f"  ⚠️ events changed: {old_events} → {new_events}"
+        print(line)
+        matched, missed, extra = match_wakewords(old['events'], entry['events'])
+        print(f"    wakeword recall vs. baseline: {matched}/{matched + len(missed)} matched"
+              + (f", missed at {missed}" if missed else "")
+              + (f", new at {extra}" if extra else ""))
+
+
+def _wakeword_times(events, tolerance):
+    """Wakeword times, with repeat detections of one utterance merged"""
+    times = []
+    for event in events:
+        if event['type'] == 'wakeword' and not (times and event['audio_time_s'] - times[-1] <= tolerance):
+            times.append(event['audio_time_s'])
+    return times
+
+
+def match_wakewords(baseline_events, events, tolerance=1.0):
+    """Match wakewords to a baseline by time: (matched, missed times, new times)
+
+    Detectors with internal state may shift a detection by a few frames
+    or fire twice on one utterance when their input changes, so
+    detections within tolerance seconds count as the same one.
+    """
+    old = _wakeword_times(baseline_events, tolerance)
+    new = _wakeword_times(events, tolerance)
+    missed = [t for t in old if not any(abs(t - n) <= tolerance for n in new)]
+    extra = [t for t in new if not any(abs(t - o) <= tolerance for o in old)]
+    return len(old) - len(missed), missed, extra
+
+
+def main():
+    from dotenv import load_dotenv
+    import yaml
+    from app import DeviceMonitor
+    from arbitration import create_arbiter
+    from service_log import log
+    from vad import load_vad
+    from wakeword import load_wakeword
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('files', nargs='+', help='WAV files or raw 16 kHz s16le PCM')
+    parser.add_argument('--config', default='config.yaml',
+                        help='configuration with the wakeword/vad settings (default: config.yaml)')
+    parser.add_argument('--device', help='device id whose settings to use (default: first device)')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='previous JSON results to compare against')
+    parser.add_argument('--realtime', action='store_true', help='pace the audio at 16 kHz')
+    parser.add_argument('--gate', choices=['on', 'off'],
+                        help='override wakeword.gate, e.g. to check recall with and without it')
+    parser.add_argument('--group', metavar='NAME',
+                        help='replay the files together as simultaneous recordings of neighbouring '
+                             'devices in one arbitration group')
+    parser.add_argument('--window-ms', type=float, help='override arbitration.window_ms')
+    parser.add_argument('--select', choices=['energy', 'score'], help='override arbitration.select')
+    args = parser.parse_args()
+
+    load_dotenv()
+    access_key = os.getenv('PORCUPINE_ACCESS_KEY')
+
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+    if args.gate:
+        config.setdefault('wakeword', {})['gate'] = args.gate == 'on'
+    log.configure(config.get('service') or {})
+    devices = config['axis']['devices']
+    device_config = next((d for d in devices if d['id'] == args.device), None) if args.device else devices[0]
+    if device_config is None:
+        print(f"❌ Device not found in {args.config}: {args.device}")
+        sys.exit(1)
+
+    vad = load_vad(config.get('vad', {}))
+    try:
+        wakeword_engine = load_wakeword(config.get('wakeword', {}), access_key)
+        wakeword_engine.start()
+    except Exception as e:
+        print(f"❌ Wakeword engine initialization failed: {e}")
+        sys.exit(1)
+    results = {
+        'version': _git_version(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'vad_backend': vad.backend,
+        'wakeword_engine': wakeword_engine.describe(),
+        'realtime': args.realtime,
+        'gate': config.get('wakeword', {}).get('gate', False),
+        'files': [],
+    }
+
+    if args.group:
+        # One device per file, named after it, all in the same group
+        arbitration_config = dict(config.get('arbitration') or {})
+        if args.window_ms is not None:
+            arbitration_config['window_ms'] = args.window_ms
+        if args.select:
+            arbitration_config['select'] = args.select
+        config['arbitration'] = arbitration_config
+        group_configs = [dict(device_config, id=os.path.splitext(os.path.basename(path))[0],
+                              name=os.path.basename(path), group=args.group) for path in args.files]
+        config['axis'] = dict(config['axis'], devices=group_configs)
+        try:
+            arbiter = create_arbiter(config, audio_clock=True)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        devices = []
+        for group_config in group_configs:
+            device = DeviceMonitor(group_config, config, access_key)
+            device.arbiter = arbiter
+            if not device.initialize(None, vad, start_stream=False, wakeword_engine=wakeword_engine):
+                sys.exit(1)
+            devices.append(device)
+        entries = replay_group(devices, [load_audio(path) for path in args.files], args.realtime)
+        log.flush()
+        for device, path, entry in zip(devices, args.files, entries):
+            device.shutdown()
+            entry.update(device=device.device_id, won=device.arbitration_won,
+                         suppressed=device.suppressed_wakewords)
+            results['files'].append({'file': os.path.basename(path), **entry})
+        results['arbitration'] = {
+            'group': args.group,
+            'window_ms': arbiter.window * 1000,
+            'select': arbiter.select,
+            'detections': sum(device.arbitration_won + device.suppressed_wakewords for device in devices),
+            'published': sum(entry['detections'] for entry in entries),
+            **arbiter.stats(),
+        }
+    else:
+        for path in args.files:
+            device = DeviceMonitor(device_config, config, access_key)
+            if not device.initialize(None, vad, start_stream=False, wakeword_engine=wakeword_engine):
+                sys.exit(1)
+            entry = {'file': os.path.basename(path), **replay(device, load_audio(path), args.realtime)}
+            log.flush()
+            device.shutdown()
+            results['files'].append(entry)
+
+    log.flush()
+    for entry in results['files']:
+        latency = entry['latency']
+        print(f"\n{entry['file']}: {entry['audio_seconds']:.1f}s audio in {entry['processing_seconds']:.2f}s "
+              f"(RTF {entry['rtf']:.4f}, {entry['speed']:.0f}x real time)")
+        if latency['wakeword']:
+            print(f"  wakeword  p50 {latency['wakeword']['p50_us']:.0f} µs  p99 {latency['wakeword']['p99_us']:.0f} µs")
+        if latency['vad']:
+            print(f"  vad       p50 {latency['vad']['p50_us']:.0f} µs  p99 {latency['vad']['p99_us']:.0f} µs")
+        if entry['gate']:
+            print(f"  gate      {entry['gate']['gated_ratio'] * 100:.1f}% of frames skipped")
+        for event in entry['events']:
+            print(f"  {event['audio_time_s']:8.2f}s  {event['type']}")
+        if 'won' in entry:
+            print(f"  arbitration: {entry['won']} won, {entry['suppressed']} suppressed")
+
+    if args.group:
+        summary = results['arbitration']
+        print(f"\nGroup {summary['group']} ({summary['window_ms']:.0f}ms window, highest {summary['select']} wins): "
+              f"{summary['detections']} detection(s) → {summary['published']} published, "
+              f"{summary['suppressed']} suppressed")
+
+    wakeword_engine.stop()
+    audio = sum(entry['audio_seconds'] for entry in results['files'])
+    processing = sum(entry['processing_seconds'] for entry in results['files'])
+    results['totals'] = {
+        'audio_seconds': round(audio, 3),
+        'processing_seconds': round(processing, 4),
+        'rtf': round(processing / audio, 5) if audio else None,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
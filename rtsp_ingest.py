@@ -0,0 +1,378 @@
+"""
+In-process RTSP/RTP audio ingest for Axis devices
+Replaces the per-device FFmpeg subprocess: RTSP runs over TCP with RTP
+interleaved on the same connection, G.711 payloads are decoded through a
+numpy lookup table and upsampled from 8 kHz to 16 kHz straight into the
+device ring buffer.
+"""
+
+import time
+import base64
+import random
+import socket
+import hashlib
+import numpy as np
+
+
+RTSP_PORT = 554
+USER_AGENT = 'axis-speaker-wakeword'
+
+
+def _ulaw_table():
+    """G.711 μ-law code to 16-bit linear PCM"""
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return np.where(codes & 0x80, -magnitude, magnitude).astype(np.int32)
+
+
+def _alaw_table():
+    """G.711 A-law code to 16-bit linear PCM"""
+    codes = np.arange(256, dtype=np.int32) ^ 0x55
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = np.where(
+        exponent == 0,
+        (mantissa << 4) + 8,
+        ((mantissa << 4) + 0x108) << np.maximum(exponent - 1, 0)
+    )
+    return np.where(codes & 0x80, magnitude, -magnitude).astype(np.int32)
+
+
+G711_TABLES = {
+    'PCMU': _ulaw_table(),
+    'PCMA': _alaw_table(),
+}
+STATIC_PAYLOAD_TYPES = {0: 'PCMU', 8: 'PCMA'}
+
+
+class RtspError(Exception):
+    """RTSP negotiation failed"""
+
+
+class G711Decoder:
+    """Vectorized G.711 decoding with 2x linear upsampling to 16 kHz"""
+    def __init__(self, codec, max_samples=2048):
+        self.table = G711_TABLES[codec]
+        self.previous = 0
+        self._allocate(max_samples)
+
+    def _allocate(self, max_samples):
+        self.max_samples = max_samples
+        # work[0] holds the last sample of the previous packet
+        self.work = np.zeros(max_samples + 1, dtype=np.int32)
+        self.midpoints = np.zeros(max_samples, dtype=np.int32)
+        self.scratch = np.zeros(max_samples * 2, dtype=np.int16)
+
+    def decode_into(self, payload, audio_buffer):
+        """Decode one RTP payload and append it to the ring buffer"""
+        codes = np.frombuffer(payload, dtype=np.uint8)
+        count = len(codes)
+        if count == 0:
+            return 0
+        if count > self.max_samples:
+            self._allocate(count)
+
+        work = self.work
+        work[0] = self.previous
+        np.take(self.table, codes, out=work[1:count + 1])
+        midpoints = self.midpoints[:count]
+        np.add(work[:count], work[1:count + 1], out=midpoints)
+        midpoints >>= 1
+        self.previous = work[count]
+
+        # Decode straight into the ring unless the region wraps its end
+        out = audio_buffer.reserve(count * 2)
+        direct = len(out) == count * 2
+        if not direct:
+            out = self.scratch[:count * 2]
+        out[0::2] = midpoints
+        out[1::2] = work[1:count + 1]
+        if direct:
+            audio_buffer.commit(count * 2)
+        else:
+            audio_buffer.write(out)
+        return count * 2
+
+
+class NativeRtspIngest:
+    """Pulls the audio track of an Axis RTSP stream into a PcmRingBuffer"""
+    def __init__(self, address, username, password, audio_buffer,
+                 path='/axis-media/media.amp?audio=1', timeout=10):
+        host, _, port = address.partition(':')
+        self.host = host
+        self.port = int(port) if port else RTSP_PORT
+        self.username = username
+        self.password = password
+        self.audio_buffer = audio_buffer
+        self.url = f"rtsp://{self.host}:{self.port}{path}"
+        self.timeout = timeout
+
+        self.sock = None
+        self.reader = None
+        self.cseq = 0
+        self.session = None
+        self.session_timeout = 60
+        self.auth = None
+        self.codec = None
+        self.decoder = None
+        self._rtp_payload_type = None
+        self.running = False
+        # Called once when the first audio packet has been decoded
+        self.on_first_packet = None
+
+        # Statistics
+        self.packets = 0
+        self.lost_packets = 0
+        self.payload_bytes = 0
+        self._expected_seq = None
+
+    def connect(self):
+        """Negotiate the audio track and start playback"""
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb', buffering=65536)
+
+        self._request('OPTIONS', self.url)
+        headers, body = self._request('DESCRIBE', self.url, {'Accept': 'application/sdp'})
+        base = headers.get('content-base', self.url)
+        track, payload_type, codec = self._parse_sdp(body.decode('utf-8', 'replace'), base)
+        self.codec = codec
+        self.decoder = G711Decoder(codec)
+        self._rtp_payload_type = payload_type
+
+        headers, _ = self._request('SETUP', track, {
+            'Transport': 'RTP/AVP/TCP;unicast;interleaved=0-1'
+        })
+        session = headers.get('session', '')
+        self.session = session.split(';')[0].strip()
+        for part in session.split(';')[1:]:
+            key, _, value = part.strip().partition('=')
+            if key.lower() == 'timeout' and value.isdigit():
+                self.session_timeout = int(value)
+
+        self._request('PLAY', self.url, {'Range': 'npt=0.000-'})
+        # Reads block from here on; stop() unblocks them by closing the socket
+        self.sock.settimeout(None)
+        self.running = True
+
+    def run(self):
+        """Read interleaved RTP until the stream ends or stop() is called"""
+        reader = self.reader
+        header = bytearray(4)
+        packet = bytearray(65536)
+        packet_view = memoryview(packet)
+        keepalive_interval = max(self.session_timeout / 2, 5)
+        next_keepalive = time.monotonic() + keepalive_interval
+
+        try:
+            while self.running:
+                if reader.readinto(memoryview(header)[:1]) != 1:
+                    break
+
+                if header[0] != 0x24:
+                    # An RTSP response (keepalive reply) between RTP packets
+                    self._skip_response(bytes(header[:1]))
+                    continue
+
+                if reader.readinto(memoryview(header)[1:4]) != 3:
+                    break
+                channel = header[1]
+                length = (header[2] << 8) | header[3]
+                if reader.readinto(packet_view[:length]) != length:
+                    break
+
+                if channel == 0:
+                    self._handle_rtp(packet_view[:length])
+
+                now = time.monotonic()
+                if now >= next_keepalive:
+                    next_keepalive = now + keepalive_interval
+                    self._send('GET_PARAMETER', self.url)
+        except (OSError, ValueError):
+            if self.running:
+                raise
+        finally:
+            self.running = False
+
+    def _handle_rtp(self, packet):
+        """Strip the RTP header and decode the G.711 payload"""
+        if len(packet) < 12 or packet[0] >> 6 != 2:
+            return
+        if packet[1] & 0x7F != self._rtp_payload_type:
+            return
+
+        seq = (packet[2] << 8) | packet[3]
+        if self._expected_seq is not None and seq != self._expected_seq:
+            self.lost_packets += (seq - self._expected_seq) & 0xFFFF
+        self._expected_seq = (seq + 1) & 0xFFFF
+
+        offset = 12 + 4 * (packet[0] & 0x0F)
+        if packet[0] & 0x10 and len(packet) >= offset + 4:
+            offset += 4 + 4 * ((packet[offset + 2] << 8) | packet[offset + 3])
+        end = len(packet)
+        if packet[0] & 0x20:
+            end -= packet[end - 1]
+        if end <= offset:
+            return
+
+        self.packets += 1
+        self.payload_bytes += end - offset
+        self.decoder.decode_into(packet[offset:end], self.audio_buffer)
+        if self.on_first_packet is not None:
+            callback, self.on_first_packet = self.on_first_packet, None
+            callback()
+
+    def stop(self):
+        """Tear down the session and unblock the reader"""
+        was_running = self.running
+        self.running = False
+        if self.sock:
+            if was_running and self.session:
+                try:
+                    self._send('TEARDOWN', self.url)
+                except OSError:
+                    pass
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.sock.close()
+
+    def stats(self):
+        """Packet counters"""
+        return {
+            'codec': self.codec,
+            'packets': self.packets,
+            'lost_packets': self.lost_packets,
+            'payload_bytes': self.payload_bytes,
+        }
+
+    # RTSP request/response handling
+
+    def _send(self, method, url, extra_headers=None):
+        self.cseq += 1
+        lines = [f"{method} {url} RTSP/1.0", f"CSeq: {self.cseq}", f"User-Agent: {USER_AGENT}"]
+        if self.session:
+            lines.append(f"Session: {self.session}")
+        authorization = self._authorization(method, url)
+        if authorization:
+            lines.append(f"Authorization: {authorization}")
+        for key, value in (extra_headers or {}).items():
+            lines.append(f"{key}: {value}")
+        self.sock.sendall(('\r\n'.join(lines) + '\r\n\r\n').encode())
+
+    def _request(self, method, url, extra_headers=None):
+        """Send a request and wait for its response, authenticating once on 401"""
+        for attempt in range(2):
+            self._send(method, url, extra_headers)
+            status, headers, body = self._read_response()
+            if status == 401 and attempt == 0 and self.username:
+                self._set_auth(headers.get('www-authenticate', ''))
+                continue
+            if status != 200:
+                raise RtspError(f"{method} failed with status {status}")
+            return headers, body
+        raise RtspError(f"{method} failed: authentication rejected")
+
+    def _read_response(self, first=b''):
+        status_line = first + self.reader.readline()
+        if not status_line:
+            raise RtspError("connection closed by device")
+        parts = status_line.decode('latin-1').split()
+        if len(parts) < 2 or not parts[0].startswith('RTSP/'):
+            raise RtspError(f"unexpected response: {status_line[:40]!r}")
+        status = int(parts[1])
+
+        headers = {}
+        while True:
+            line = self.reader.readline().decode('latin-1').strip()
+            if not line:
+                break
+            key, _, value = line.partition(':')
+            key = key.strip().lower()
+            # Keep the first challenge offered; servers list Digest first
+            if key not in headers:
+                headers[key] = value.strip()
+
+        length = int(headers.get('content-length', 0))
+        body = self.reader.read(length) if length else b''
+        return status, headers, body
+
+    def _skip_response(self, first):
+        self._read_response(first)
+
+    def _set_auth(self, challenge):
+        scheme, _, params = challenge.partition(' ')
+        values = {}
+        for item in params.split(','):
+            key, _, value = item.strip().partition('=')
+            values[key.lower()] = value.strip('"')
+        self.auth = (scheme.lower(), values)
+        self._nonce_count = 0
+
+    def _authorization(self, method, url):
+        if not self.auth:
+            return None
+        scheme, values = self.auth
+        if scheme == 'basic':
+            token = base64.b64encode(f"{self.username}:{self.password}".encode()).decode()
+            return f"Basic {token}"
+
+        realm = values.get('realm', '')
+        nonce = values.get('nonce', '')
+        ha1 = _md5(f"{self.username}:{realm}:{self.password}")
+        ha2 = _md5(f"{method}:{url}")
+        fields = [f'username="{self.username}"', f'realm="{realm}"', f'nonce="{nonce}"', f'uri="{url}"']
+        if 'auth' in values.get('qop', '').split(','):
+            self._nonce_count += 1
+            nc = f"{self._nonce_count:08x}"
+            cnonce = f"{random.getrandbits(64):016x}"
+            response = _md5(f"{ha1}:{nonce}:{nc}:{cnonce}:auth:{ha2}")
+            fields += ['qop=auth', f'nc={nc}', f'cnonce="{cnonce}"']
+        else:
+            response = _md5(f"{ha1}:{nonce}:{ha2}")
+        fields.append(f'response="{response}"')
+        if 'opaque' in values:
+            fields.append(f'opaque="{values["opaque"]}"')
+        return 'Digest ' + ', '.join(fields)
+
+    def _parse_sdp(self, sdp, base):
+        """Return (track URL, payload type, codec) of the first G.711 audio track"""
+        media = None
+        for line in sdp.splitlines():
+            line = line.strip()
+            if line.startswith('m='):
+                fields = line[2:].split()
+                media = None
+                if fields and fields[0] == 'audio':
+                    formats = [int(f) for f in fields[3:] if f.isdigit()]
+                    media = {'formats': formats, 'codecs': {}, 'control': None}
+            elif media is not None and line.startswith('a=rtpmap:'):
+                payload_type, _, encoding = line[9:].partition(' ')
+                name, _, rate = encoding.partition('/')
+                if name.upper() in G711_TABLES and rate.split('/')[0] == '8000':
+                    media['codecs'][int(payload_type)] = name.upper()
+            elif media is not None and line.startswith('a=control:'):
+                media['control'] = line[10:]
+
+            if media is not None and media['control']:
+                for payload_type in media['formats']:
+                    codec = media['codecs'].get(payload_type, STATIC_PAYLOAD_TYPES.get(payload_type))
+                    if codec:
+                        return self._track_url(base, media['control']), payload_type, codec
+
+        raise RtspError("no G.711 (PCMU/PCMA 8 kHz) audio track in SDP; use audio.ingest: ffmpeg")
+
+    @staticmethod
+    def _track_url(base, control):
+        if control.startswith('rtsp://'):
+            return control
+        if control == '*':
+            return base
+        return base.rstrip('/') + '/' + control
+
+
+def _md5(text):
+    return hashlib.md5(text.encode()).hexdigest()
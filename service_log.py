@@ -0,0 +1,189 @@
+"""
+Asynchronous structured logging
+Device, stream and publisher threads must never wait on stdout: a journald
+pipe under backpressure or a slow terminal would otherwise stall detection.
+log.info() and friends only check the level and append the record to a
+bounded queue; a writer thread formats queued records as JSON lines (or
+plain text) and writes them. When the queue is full, the oldest record is
+dropped and counted.
+
+Records logged with a key are rate-limited per device: the first one is
+written, repeats within rate_limit_s are only counted, and the count is
+reported once the interval is over.
+"""
+
+import sys
+import json
+import time
+import atexit
+import threading
+from collections import deque
+
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+FORMATS = ('json', 'text')
+
+
+class AsyncLogger:
+    """Logger whose calls never block on the output stream"""
+    def __init__(self, stream=None, level='INFO', format='json', max_queue=10000, rate_limit_s=10.0):
+        # None writes to whatever sys.stdout is when the records are written
+        self.stream = stream
+        self.set_level(level)
+        self.set_format(format)
+        self.max_queue = max_queue
+        self.rate_limit = rate_limit_s
+
+        self._records = deque()
+        self._cond = threading.Condition()
+        self._limits = {}
+        self._thread = None
+        self._writing = False
+        self._dropped_reported = 0
+
+        # Statistics
+        self.written = 0
+        self.dropped = 0
+        self.suppressed = 0
+
+    def configure(self, service_config):
+        """Apply the log_* settings of the service: config section"""
+        self.set_level(service_config.get('log_level', 'INFO'))
+        self.set_format(service_config.get('log_format', 'json'))
+        self.max_queue = service_config.get('log_queue', 10000)
+        self.rate_limit = service_config.get('log_rate_limit_s', 10.0)
+
+    def set_level(self, level):
+        level = str(level).upper()
+        if level not in LEVELS:
+            raise ValueError(f"Unknown service.log_level: {level}")
+        self.level = level
+        self._levelno = LEVELS[level]
+
+    def set_format(self, format):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown service.log_format: {format}")
+        self.format = format
+
+    def debug(self, message, device=None, key=None, **fields):
+        if self._levelno <= 10:
+            self._log('DEBUG', message, device, key, fields)
+
+    def info(self, message, device=None, key=None, **fields):
+        if self._levelno <= 20:
+            self._log('INFO', message, device, key, fields)
+
+    def warning(self, message, device=None, key=None, **fields):
+        if self._levelno <= 30:
+            self._log('WARNING', message, device, key, fields)
+
+    def error(self, message, device=None, key=None, **fields):
+        self._log('ERROR', message, device, key, fields)
+
+    def _log(self, level, message, device, key, fields):
+        record = (time.time(), level, device, message, fields)
+        with self._cond:
+            if key is not None and not self._admit(level, message, device, key, fields):
+                return
+            if len(self._records) >= self.max_queue:
+                self._records.popleft()
+                self.dropped += 1
+            self._records.append(record)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                self._thread.start()
+            # flush() may be waiting on the same condition
+            self._cond.notify_all()
+
+    def _admit(self, level, message, device, key, fields):
+        """Whether a rate-limited record is written; called with _cond held"""
+        now = time.monotonic()
+        limit = self._limits.get((device, key))
+        if limit is not None and now - limit[0] < self.rate_limit:
+            limit[1] += 1
+            limit[2:] = [level, message, fields]
+            self.suppressed += 1
+            return False
+        if limit is not None and limit[1]:
+            fields['repeated'] = limit[1]
+        self._limits[(device, key)] = [now, 0, level, message, fields]
+        return True
+
+    def _expire_limits(self):
+        """Report repeats of intervals that are over; called with _cond held"""
+        now = time.monotonic()
+        for (device, key), (started, repeated, level, message, fields) in list(self._limits.items()):
+            if now - started < self.rate_limit:
+                continue
+            del self._limits[(device, key)]
+            if repeated:
+                self._records.append((time.time(), level, device, message, dict(fields, repeated=repeated)))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+                if not self._records:
+                    self._cond.wait(1.0 if self._limits else None)
+                if self._limits:
+                    self._expire_limits()
+                records = list(self._records)
+                self._records.clear()
+                dropped = self.dropped - self._dropped_reported
+                self._dropped_reported = self.dropped
+                self._writing = bool(records)
+            if not records:
+                continue
+
+            lines = [self._format(record) for record in records]
+            if dropped:
+                lines.insert(0, self._format((time.time(), 'WARNING', None,
+                                              f"⚠️ {dropped} log record(s) dropped - output too slow",
+                                              {'dropped': dropped})))
+            stream = self.stream or sys.stdout
+            try:
+                stream.write('\n'.join(lines) + '\n')
+                stream.flush()
+                self.written += len(records)
+            except (OSError, ValueError):
+                # Closed or broken output; nothing left to report to
+                pass
+
+    def _format(self, record):
+        timestamp, level, device, message, fields = record
+        if self.format == 'text':
+            line = f"[{device}] {message}" if device else message
+            if 'repeated' in fields:
+                line += f" (repeated {fields['repeated']} more time(s))"
+            return line
+        entry = {'timestamp': round(timestamp, 3), 'level': level}
+        if device:
+            entry['device'] = device
+        entry['message'] = message
+        entry.update(fields)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+    def flush(self, timeout=2.0):
+        """Wait up to timeout seconds for the queued records to be written"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while (self._records or self._writing) and self._thread is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stats(self):
+        """Queue and rate-limit counters"""
+        return {
+            'queued': len(self._records),
+            'written': self.written,
+            'dropped': self.dropped,
+            'suppressed': self.suppressed,
+        }
+
+
+log = AsyncLogger()
+atexit.register(log.flush)
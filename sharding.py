@@ -0,0 +1,244 @@
+"""
+Multi-process device sharding
+Spreads devices over N worker processes so wakeword and VAD work is not
+limited to one interpreter. Each worker owns the wakeword detectors and
+VAD state of its devices; the parent keeps the MQTT connection, forwards
+published events, restarts crashed workers and collects per-shard load.
+"""
+
+import os
+import time
+import queue
+import signal
+import threading
+import multiprocessing
+
+
+class ForwardingMqttClient:
+    """MQTT client stand-in for workers that forwards publishes to the parent"""
+    def __init__(self, shard_id, events):
+        self.shard_id = shard_id
+        self.events = events
+
+    def publish(self, topic, payload=None, qos=0, retain=False, on_ack=None, lossy=False):
+        # Acknowledgements stay in the parent; on_ack cannot cross processes
+        self.events.put(('publish', self.shard_id, (topic, payload, qos, retain, lossy)))
+
+
+def assign_shards(device_configs, shards):
+    """Split devices over shards; a device's 'shard' key pins it to one
+
+    Devices of one arbitration group are kept together, in the shard of
+    the first pinned member if any, since rounds are decided per worker.
+    """
+    assignment = [[] for _ in range(shards)]
+    group_shards = {}
+    unpinned = []
+    for device_config in device_configs:
+        pinned = device_config.get('shard')
+        if pinned is not None and 0 <= int(pinned) < shards:
+            assignment[int(pinned)].append(device_config)
+            group_shards.setdefault(device_config.get('group'), int(pinned))
+        else:
+            unpinned.append(device_config)
+    for device_config in unpinned:
+        group = device_config.get('group')
+        if group and group in group_shards:
+            assignment[group_shards[group]].append(device_config)
+            continue
+        shard = min(range(shards), key=lambda index: len(assignment[index]))
+        assignment[shard].append(device_config)
+        if group:
+            group_shards[group] = shard
+    return assignment
+
+
+def _worker_main(shard_id, device_configs, config, access_key, events, stop_event, metrics_interval):
+    """Entry point of a shard worker process"""
+    # Ctrl+C is handled by the parent, which stops workers explicitly
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    from app import initialize_monitors
+    from arbitration import create_arbiter
+    from service_log import log
+    from vad import load_vad, BatchedVADScheduler
+    from wakeword import load_wakeword
+
+    log.configure(config.get('service', {}))
+
+    vad_config = config.get('vad', {})
+    vad = load_vad(vad_config)
+    vad_scheduler = None
+    if vad_config.get('batch', False):
+        vad_scheduler = BatchedVADScheduler(
+            vad,
+            tick_ms=vad_config.get('batch_tick_ms', 10),
+            max_batch=vad_config.get('batch_max_size', 32)
+        )
+        vad_scheduler.start()
+
+    wakeword_engine = load_wakeword(config.get('wakeword', {}), access_key)
+    wakeword_engine.start()
+
+    mqtt_client = ForwardingMqttClient(shard_id, events)
+    arbiter = create_arbiter(config)
+
+    def start_device(monitor):
+        if monitor.group:
+            monitor.arbiter = arbiter
+        if not monitor.initialize(mqtt_client, vad, vad_scheduler, wakeword_engine=wakeword_engine):
+            return False
+        # Kept so shutdown() joins it before deleting the detector
+        monitor.processing_thread = threading.Thread(target=monitor.process_audio, daemon=True)
+        monitor.processing_thread.start()
+        return True
+
+    devices = initialize_monitors(device_configs, config, access_key, start_device)
+
+    events.put(('ready', shard_id, [device.device_id for device in devices]))
+
+    last_cpu = time.process_time()
+    last_wall = time.monotonic()
+    last_frames = 0
+    while not stop_event.wait(metrics_interval):
+        for device in devices:
+            device.stream_supervisor.check_health()
+        cpu = time.process_time()
+        wall = time.monotonic()
+        frames = sum(device.audio_buffer.frames_read for device in devices)
+        events.put(('metrics', shard_id, {
+            'pid': os.getpid(),
+            'devices': len(devices),
+            'cpu_percent': (cpu - last_cpu) / (wall - last_wall) * 100,
+            'frames_per_second': (frames - last_frames) / (wall - last_wall),
+            'overruns': sum(device.audio_buffer.overruns for device in devices),
+            'max_lag_ms': max((device.lag_samples / 16 for device in devices), default=0.0),
+            'per_device_frames': {device.device_id: device.audio_buffer.frames_read for device in devices},
+        }))
+        last_cpu, last_wall, last_frames = cpu, wall, frames
+
+    log.flush()
+    for device in devices:
+        device.shutdown()
+    wakeword_engine.stop()
+    if vad_scheduler:
+        vad_scheduler.stop()
+
+
+class ShardSupervisor:
+    """Starts, watches and restarts the shard worker processes"""
+    def __init__(self, config, access_key, mqtt_client, shards=None):
+        self.config = config
+        self.access_key = access_key
+        self.mqtt_client = mqtt_client
+        self.shards = shards or os.cpu_count() or 1
+
+        service_config = config.get('service', {})
+        self.restart_delay = service_config.get('reconnect_delay', 5)
+        self.metrics_interval = service_config.get('health_check_interval', 60)
+
+        self.context = multiprocessing.get_context('spawn')
+        self.events = self.context.Queue()
+        self.assignment = assign_shards(config['axis']['devices'], self.shards)
+        self.workers = {}
+        self.stop_events = {}
+        self.restarts = {}
+        self.metrics = {}
+        self.running = False
+        self._pump_thread = None
+
+    def start(self):
+        """Start one worker per non-empty shard and the event pump"""
+        self.running = True
+        self._pump_thread = threading.Thread(target=self._pump_events, daemon=True)
+        self._pump_thread.start()
+
+        for shard_id, device_configs in enumerate(self.assignment):
+            if device_configs:
+                self._start_worker(shard_id)
+
+        active = sum(1 for devices in self.assignment if devices)
+        print(f"✓ Started {active} shard worker(s)")
+        for shard_id, device_configs in enumerate(self.assignment):
+            if device_configs:
+                names = ', '.join(d['id'] for d in device_configs)
+                print(f"  Shard {shard_id}: {names}")
+
+    def _start_worker(self, shard_id):
+        stop_event = self.context.Event()
+        worker = self.context.Process(
+            target=_worker_main,
+            args=(shard_id, self.assignment[shard_id], self.config, self.access_key,
+                  self.events, stop_event, min(self.metrics_interval, 10)),
+            name=f"shard-{shard_id}",
+            daemon=True
+        )
+        worker.start()
+        self.workers[shard_id] = worker
+        self.stop_events[shard_id] = stop_event
+
+    def _pump_events(self):
+        """Forward worker events to MQTT and record shard metrics"""
+        while self.running:
+            try:
+                kind, shard_id, data = self.events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            if kind == 'publish':
+                topic, payload, qos, retain, lossy = data
+                self.mqtt_client.publish(topic, payload, qos=qos, retain=retain, lossy=lossy)
+            elif kind == 'metrics':
+                data['restarts'] = self.restarts.get(shard_id, 0)
+                self.metrics[shard_id] = data
+            elif kind == 'ready':
+                print(f"[shard {shard_id}] ✓ {len(data)} device(s) listening")
+
+    def supervise(self):
+        """Restart crashed workers and print shard load until Ctrl+C"""
+        next_report = time.monotonic() + self.metrics_interval
+        restart_at = {}
+        while self.running:
+            time.sleep(1)
+            now = time.monotonic()
+            for shard_id, worker in list(self.workers.items()):
+                if worker.is_alive() or not self.running:
+                    continue
+                if shard_id not in restart_at:
+                    self.restarts[shard_id] = self.restarts.get(shard_id, 0) + 1
+                    restart_at[shard_id] = now + self.restart_delay
+                    print(f"[shard {shard_id}] ⚠️ Worker exited (code {worker.exitcode}), "
+                          f"restarting in {self.restart_delay}s (restart #{self.restarts[shard_id]})")
+                elif now >= restart_at[shard_id]:
+                    del restart_at[shard_id]
+                    self._start_worker(shard_id)
+
+            if time.monotonic() >= next_report:
+                next_report += self.metrics_interval
+                self.print_metrics()
+
+    def shard_metrics(self):
+        """Latest load metrics per shard, for rebalancing decisions"""
+        return dict(self.metrics)
+
+    def print_metrics(self):
+        """Print one load line per shard"""
+        for shard_id, stats in sorted(self.metrics.items()):
+            print(f"[shard {shard_id}] pid {stats['pid']}: {stats['devices']} device(s), "
+                  f"CPU {stats['cpu_percent']:.1f}%, {stats['frames_per_second']:.0f} frames/s, "
+                  f"{stats['overruns']} overrun(s), lag {stats['max_lag_ms']:.0f}ms, "
+                  f"{stats['restarts']} restart(s)")
+
+    def stop(self):
+        """Stop all workers"""
+        self.running = False
+        for stop_event in self.stop_events.values():
+            stop_event.set()
+        for worker in self.workers.values():
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        if self._pump_thread:
+            self._pump_thread.join(timeout=2)
@@ -0,0 +1,320 @@
+"""
+Per-device stream supervision
+Keeps a device's audio ingest alive: detects EOF and stalls (no bytes for
+a configurable time), restarts FFmpeg, the native RTSP client or a local
+PCM pipe reader with jittered exponential backoff, and records how long
+each recovery took. The ring buffer stays open across restarts, so Porcupine and VAD state
+on the processing side stay warm.
+"""
+
+import os
+import time
+import random
+import select
+import socket
+import threading
+import subprocess
+
+from service_log import log
+
+
+class StreamStalled(Exception):
+    """No audio arrived within the stall timeout"""
+
+
+class FfmpegSource:
+    """FFmpeg subprocess decoding the RTSP stream to 16kHz s16le on stdout"""
+    def __init__(self, cmd, audio_buffer, chunk_size=3200):
+        self.cmd = cmd
+        self.audio_buffer = audio_buffer
+        self.chunk_size = chunk_size
+        self.process = None
+        self.on_first_data = None
+        self._poll = None
+
+    def open(self):
+        # Unbuffered so poll() sees exactly what FFmpeg has written
+        self.process = subprocess.Popen(
+            self.cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0
+        )
+        # poll() rather than select(): with many devices the pipe's fd can
+        # exceed FD_SETSIZE
+        self._poll = select.poll()
+        self._poll.register(self.process.stdout, select.POLLIN)
+
+    def run(self, stall_timeout):
+        """Pump stdout into the ring until EOF; raise StreamStalled on silence"""
+        stdout = self.process.stdout
+        first = True
+        while True:
+            if not self._poll.poll(stall_timeout * 1000):
+                raise StreamStalled(f"no audio for {stall_timeout}s")
+            if not self.audio_buffer.fill_from(stdout, self.chunk_size):
+                return
+            if first:
+                first = False
+                if self.on_first_data:
+                    self.on_first_data()
+
+    def close(self):
+        if not self.process:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process.stdout.close()
+
+
+class NativeSource:
+    """In-process RTSP/RTP client (see rtsp_ingest.py)"""
+    def __init__(self, ingest):
+        self.ingest = ingest
+        self.on_first_data = None
+
+    def open(self):
+        self.ingest.connect()
+
+    def run(self, stall_timeout):
+        """Run the RTSP client until EOF; raise StreamStalled on silence"""
+        self.ingest.on_first_packet = self.on_first_data
+        self.ingest.sock.settimeout(stall_timeout)
+        try:
+            self.ingest.run()
+        except socket.timeout:
+            raise StreamStalled(f"no audio for {stall_timeout}s")
+
+    def close(self):
+        self.ingest.stop()
+
+
+class PcmSource:
+    """16kHz mono s16le audio written to a local named pipe by another process"""
+    def __init__(self, path, audio_buffer, chunk_size=3200):
+        self.path = path
+        self.audio_buffer = audio_buffer
+        self.chunk_size = chunk_size
+        self.stream = None
+        self.on_first_data = None
+        self._poll = None
+        self._wake_read = None
+        self._wake_write = None
+
+    def open(self):
+        # Opening a pipe for reading blocks until there is a writer; the
+        # stall timeout covers that wait instead
+        fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        os.set_blocking(fd, True)
+        self.stream = os.fdopen(fd, 'rb', buffering=0)
+        # close() wakes a run() that is waiting in poll(); poll() rather than
+        # select() as hundreds of simulated devices exceed FD_SETSIZE
+        self._wake_read, self._wake_write = os.pipe()
+        self._poll = select.poll()
+        self._poll.register(self.stream, select.POLLIN)
+        self._poll.register(self._wake_read, select.POLLIN)
+
+    def run(self, stall_timeout):
+        """Pump the pipe into the ring until the writer closes it; raise StreamStalled on silence"""
+        # close() clears the attribute before closing the descriptors
+        wake = self._wake_read
+        first = True
+        while True:
+            events = self._poll.poll(stall_timeout * 1000)
+            if not events:
+                raise StreamStalled(f"no audio for {stall_timeout}s")
+            if any(fd == wake for fd, _ in events):
+                return
+            if not self.audio_buffer.fill_from(self.stream, self.chunk_size):
+                return
+            if first:
+                first = False
+                if self.on_first_data:
+                    self.on_first_data()
+
+    def close(self):
+        if self._wake_write is not None:
+            os.write(self._wake_write, b'\0')
+            os.close(self._wake_write)
+            os.close(self._wake_read)
+            self._wake_write = self._wake_read = None
+        if self.stream:
+            self.stream.close()
+
+
+class StreamSupervisor:
+    """Runs a device's audio source and restarts it when it ends or stalls"""
+    def __init__(self, device_id, source_factory, audio_buffer, stall_timeout=5.0,
+                 initial_delay=0.5, max_delay=5.0, health_interval=60):
+        self.device_id = device_id
+        self.source_factory = source_factory
+        self.audio_buffer = audio_buffer
+        self.stall_timeout = stall_timeout
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.health_interval = health_interval
+
+        self.source = None
+        self.running = False
+        self.ready = threading.Event()
+        self._thread = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+        # Statistics
+        self.connected_since = None
+        self.failed_at = None
+        self.reconnects = 0
+        self.eofs = 0
+        self.stalls = 0
+        self.errors = 0
+        self.recovery_times = []
+        self._failures = 0
+        self._last_health = time.monotonic()
+        self._last_overruns = 0
+
+    def open(self):
+        """Open the first source synchronously; raises if the device is unreachable
+
+        After a failure, start() still works and keeps retrying with backoff.
+        """
+        source = self.source_factory()
+        source.on_first_data = self._on_first_data
+        try:
+            source.open()
+        except Exception:
+            source.close()
+            self.errors += 1
+            self._mark_failed()
+            raise
+        self.source = source
+        self.connected_since = time.monotonic()
+
+    def wait_ready(self, timeout):
+        """Wait until the first audio has been buffered; returns whether it was"""
+        return self.ready.wait(timeout)
+
+    def start(self):
+        """Supervise the opened source on a background thread"""
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop supervising and close the current source"""
+        self.running = False
+        self._wake.set()
+        with self._lock:
+            if self.source:
+                self.source.close()
+        if self._thread:
+            self._thread.join(timeout=3)
+
+    def _on_first_data(self):
+        """Called by a source once its first audio has been buffered"""
+        self._failures = 0
+        self.ready.set()
+        if self.failed_at is not None:
+            recovery = time.monotonic() - self.failed_at
+            self.failed_at = None
+            self.recovery_times.append(recovery)
+            if len(self.recovery_times) > 1000:
+                del self.recovery_times[:-500]
+            log.info(f"✓ RTSP stream recovered in {recovery:.2f}s", device=self.device_id,
+                     recovery_s=round(recovery, 3))
+
+    def _run(self):
+        while self.running:
+            if self.source is not None:
+                try:
+                    self.source.run(self.stall_timeout)
+                    reason = "ended"
+                except StreamStalled as e:
+                    reason = f"stalled ({e})"
+                except Exception as e:
+                    reason = f"failed ({e})"
+
+                with self._lock:
+                    if not self.running:
+                        break
+                    self.source.close()
+                    self.source = None
+                if reason == "ended":
+                    self.eofs += 1
+                elif reason.startswith("stalled"):
+                    self.stalls += 1
+                else:
+                    self.errors += 1
+                self._mark_failed()
+                log.warning(f"⚠️ RTSP stream {reason}", device=self.device_id)
+
+            # Jittered exponential backoff, reset once a stream delivers audio
+            delay = min(self.max_delay, self.initial_delay * (2 ** self._failures))
+            delay *= random.uniform(0.5, 1.0)
+            self._failures += 1
+            log.info(f"🔄 Reconnecting in {delay:.1f}s...", device=self.device_id)
+            if self._wake.wait(delay):
+                break
+
+            source = self.source_factory()
+            source.on_first_data = self._on_first_data
+            try:
+                source.open()
+            except Exception as e:
+                self.errors += 1
+                source.close()
+                log.warning(f"⚠️ Reconnect failed: {e}", device=self.device_id, key='reconnect')
+                continue
+
+            with self._lock:
+                if not self.running:
+                    source.close()
+                    break
+                self.source = source
+            self.reconnects += 1
+            self.connected_since = time.monotonic()
+
+    def _mark_failed(self):
+        """Start the recovery clock unless a recovery is already in progress"""
+        self.connected_since = None
+        if self.failed_at is None:
+            self.failed_at = time.monotonic()
+
+    def check_health(self):
+        """Report overruns as they happen and print a health line once per interval
+
+        Called about once a second from the thread that owns the device.
+        """
+        overruns = self.audio_buffer.overruns
+        if overruns != self._last_overruns:
+            self._last_overruns = overruns
+            log.warning(f"⚠️ Audio buffer overrun #{overruns} - processing fell behind, backlog dropped",
+                        device=self.device_id, key='overrun', overruns=overruns)
+
+        now = time.monotonic()
+        if now - self._last_health < self.health_interval:
+            return
+        self._last_health = now
+        stats = self.stats()
+        status = f"up {stats['uptime_s']:.0f}s" if stats['connected'] else "reconnecting"
+        log.info(f"🩺 RTSP stream {status}, {stats['reconnects']} reconnect(s), "
+                 f"{stats['stalls']} stall(s), {overruns} overrun(s)", device=self.device_id)
+
+    def stats(self):
+        """Stream health and recovery-time metrics"""
+        recoveries = list(self.recovery_times)
+        return {
+            'connected': self.connected_since is not None,
+            'uptime_s': time.monotonic() - self.connected_since if self.connected_since else 0.0,
+            'reconnects': self.reconnects,
+            'eofs': self.eofs,
+            'stalls': self.stalls,
+            'errors': self.errors,
+            'recovery_s_last': recoveries[-1] if recoveries else None,
+            'recovery_s_mean': sum(recoveries) / len(recoveries) if recoveries else None,
+            'recovery_s_max': max(recoveries) if recoveries else None,
+        }
@@ -0,0 +1,10 @@
+"""
+Shared test setup
+The service is a set of top-level modules; put the repository root on
+sys.path so the tests import them the way app.py does.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
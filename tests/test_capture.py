@@ -0,0 +1,99 @@
+"""
+RollingCapture: the ring on disk, clips, and closing while clips are written
+"""
+
+import json
+import threading
+
+import numpy as np
+
+import capture as capture_module
+from capture import CaptureFile, RollingCapture
+
+
+def frames(count, start=0, size=1600):
+    for index in range(start, start + count):
+        yield np.full(size, index, dtype=np.int16)
+
+
+def test_ring_keeps_the_last_minutes_and_survives_a_reopen(tmp_path):
+    path = str(tmp_path / 'desk.pcm')
+    capture = RollingCapture(path, minutes=0.01)
+    for frame in frames(10):
+        capture.write(frame)
+    capture.close()
+
+    capture = RollingCapture(path, minutes=0.01)
+    assert capture.position == 16000
+    capture.write(np.full(1600, 10, dtype=np.int16))
+    capture.close()
+
+    check = CaptureFile(path)
+    # 0.01 min is 9600 samples: the last six frames
+    assert np.array_equal(check.read(0, check.written), np.repeat(np.arange(5, 11), 1600).astype(np.int16))
+    check.close()
+
+
+def test_clip_spans_pre_roll_to_post_roll_with_its_markers(tmp_path):
+    capture = RollingCapture(str(tmp_path / 'desk.pcm'), minutes=0.1, pre_roll_ms=200, post_roll_ms=100,
+                             clip_dir=str(tmp_path / 'clips'), device_id='desk')
+    for frame in frames(5):
+        capture.write(frame)
+    capture.mark('wakeword', score=0.9, audio_time=0.5)
+    for frame in frames(5, 5):
+        capture.write(frame)
+    capture.mark('silence', audio_time=1.0)
+    for frame in frames(2, 10):
+        capture.write(frame)
+    capture.close()
+
+    assert capture.stats() == {'markers': 2, 'clips': 1, 'clips_written': 1}
+    (info,) = [json.loads(path.read_text()) for path in (tmp_path / 'clips').glob('*.json')]
+    assert info['device_id'] == 'desk' and info['end'] == 'silence'
+    assert info['duration_s'] == 0.8
+    assert [marker['kind'] for marker in info['markers']] == ['wakeword', 'silence']
+    assert info['markers'][0]['offset_s'] == 0.2
+
+
+def test_close_abandons_clips_the_writer_has_not_reached(tmp_path, monkeypatch):
+    writer = capture_module._clip_writer
+    release = threading.Event()
+    entered = threading.Event()
+    write = writer._write
+
+    def slow_write(capture, *args):
+        entered.set()
+        release.wait(5)
+        # Reads the mapping after close() has returned
+        write(capture, *args)
+
+    monkeypatch.setattr(writer, '_write', slow_write)
+    capture = RollingCapture(str(tmp_path / 'desk.pcm'), minutes=0.1, post_roll_ms=0,
+                             clip_dir=str(tmp_path / 'clips'), device_id='desk')
+    for kind in ('silence', 'timeout', 'silence'):
+        capture.mark('wakeword')
+        for frame in frames(2):
+            capture.write(frame)
+        capture.mark(kind)
+        capture.write(np.zeros(160, dtype=np.int16))
+    assert entered.wait(2)
+
+    capture.close(timeout=0.1)
+    # The clip being written keeps the mapping; the other two were dropped
+    assert capture._samples is not None
+    release.set()
+    assert writer.flush(capture, 2) == 0
+    assert capture.stats()['clips_written'] == 1
+    assert len(list((tmp_path / 'clips').glob('*.wav'))) == 1
+
+
+def test_clip_counts_belong_to_their_capture(tmp_path):
+    first = RollingCapture(str(tmp_path / 'a.pcm'), minutes=0.1, clip_dir=str(tmp_path / 'a'), post_roll_ms=0)
+    first.mark('wakeword')
+    first.write(np.zeros(1600, dtype=np.int16))
+    first.mark('silence')
+    first.write(np.zeros(160, dtype=np.int16))
+    first.close()
+    second = RollingCapture(str(tmp_path / 'b.pcm'), minutes=0.1, clip_dir=str(tmp_path / 'b'))
+    assert (first.stats()['clips_written'], second.stats()['clips_written']) == (1, 0)
+    second.close()
@@ -0,0 +1,76 @@
+"""
+EnergyGate: which frames reach the wakeword detector
+"""
+
+import numpy as np
+
+from wakeword import EnergyGate
+
+
+FRAME = 160  # 10 ms
+
+
+def noise(level, index=0):
+    """A frame of random noise with peak amplitude level, tagged in its first sample"""
+    frame = np.random.default_rng(index).integers(-level, level + 1, FRAME).astype(np.int16)
+    frame[0] = index
+    return frame
+
+
+def gate():
+    # Open for 3 frames after a loud one, 4 frames of look-back
+    return EnergyGate(FRAME, margin_db=10, lookback_ms=40, hold_ms=30)
+
+
+def passed(frames):
+    return [int(frame[0]) for frame in frames]
+
+
+def test_open_until_the_floor_is_measured_then_gated():
+    energy_gate = gate()
+    results = [energy_gate.frames_to_process(noise(20, i)) for i in range(10)]
+    assert [len(result) for result in results] == [1, 1, 1] + [0] * 7
+    assert energy_gate.stats()['gated'] == 7
+    assert energy_gate.stats()['gated_ratio'] == 0.7
+
+
+def test_loud_frame_replays_the_lookback_in_order_then_holds():
+    energy_gate = gate()
+    for i in range(10):
+        energy_gate.frames_to_process(noise(20, i))
+    # Only the last 4 gated frames are kept
+    assert passed(energy_gate.frames_to_process(noise(5000, 10))) == [6, 7, 8, 9, 10]
+    assert energy_gate.replayed == 4
+    assert energy_gate.gated == 3
+    # Quiet frames pass for hold_ms after the last loud one
+    assert [len(energy_gate.frames_to_process(noise(20, i))) for i in range(11, 16)] == [1, 1, 1, 0, 0]
+
+
+def test_loud_frames_while_open_are_not_replayed_twice():
+    energy_gate = gate()
+    for i in range(5):
+        energy_gate.frames_to_process(noise(20, i))
+    assert passed(energy_gate.frames_to_process(noise(5000, 5))) == [3, 4, 5]
+    assert passed(energy_gate.frames_to_process(noise(5000, 6))) == [6]
+
+
+def test_floor_drops_at_once_and_rises_slowly():
+    energy_gate = EnergyGate(FRAME, rise_db_per_s=1.0)
+    energy_gate.frames_to_process(noise(2000))
+    loud_floor = energy_gate.floor_db
+    energy_gate.frames_to_process(noise(20))
+    quiet_floor = energy_gate.floor_db
+    assert quiet_floor < loud_floor - 30
+    # One second of loud audio raises the floor by 1 dB
+    for i in range(100):
+        energy_gate.frames_to_process(noise(2000, i))
+    assert abs(energy_gate.floor_db - quiet_floor - 1.0) < 1e-6
+
+
+def test_only_frames_margin_db_above_the_floor_open_the_gate():
+    energy_gate = gate()
+    for i in range(5):
+        energy_gate.frames_to_process(noise(100, i))
+    # About 6 dB and 14 dB above the floor
+    assert energy_gate.frames_to_process(noise(200, 5)) == ()
+    assert len(energy_gate.frames_to_process(noise(500, 6))) > 1
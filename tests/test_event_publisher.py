@@ -0,0 +1,208 @@
+"""
+EventPublisher against a loopback broker: acknowledgements, outages and retries
+"""
+
+import json
+import time
+
+import numpy as np
+import paho.mqtt.client as mqtt
+import pytest
+
+import event_publisher
+from event_publisher import EventPublisher
+from mqtt_testing import LoopbackMqttBroker
+from utterance_stream import create_streamer
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def broker():
+    broker = LoopbackMqttBroker()
+    broker.start()
+    yield broker
+    broker.stop()
+
+
+def start_publisher(broker):
+    publisher = EventPublisher('127.0.0.1', broker.port, client_id='test', username='user', password='secret',
+                               reconnect_min_delay=0.1, reconnect_max_delay=0.2)
+    assert publisher.start()
+    return publisher
+
+
+@pytest.fixture
+def publisher(broker):
+    publisher = start_publisher(broker)
+    yield publisher
+    publisher.stop()
+
+
+def delivered(broker):
+    return [(topic, json.loads(payload)['seq'], qos, retain) for _, topic, payload, qos, retain in broker.messages]
+
+
+@pytest.mark.parametrize('qos', [0, 1, 2])
+def test_events_are_delivered_in_order_and_acknowledged(broker, publisher, qos):
+    acks = []
+    started = time.monotonic()
+    for seq in range(20):
+        publisher.publish('axis/desk/event', json.dumps({'seq': seq}), qos=qos, retain=seq % 2 == 0,
+                          on_ack=acks.append)
+    # A QoS 0 event counts as acknowledged once it is written to the socket
+    assert wait_for(lambda: len(acks) == 20 and len(broker.messages) == 20)
+
+    assert delivered(broker) == [('axis/desk/event', seq, qos, seq % 2 == 0) for seq in range(20)]
+    assert all(started <= ack <= time.monotonic() for ack in acks)
+    assert broker.credentials == [('user', 'secret')]
+    assert publisher.stats()['published'] == 20
+    assert publisher.publish_seconds.count == 20
+
+
+@pytest.mark.parametrize('qos', [0, 1])
+def test_events_queued_during_an_outage_are_sent_once_after_reconnecting(broker, publisher, qos):
+    publisher.publish('axis/desk/event', json.dumps({'seq': 0}), qos=qos)
+    assert wait_for(lambda: len(broker.messages) == 1)
+    broker.stop()
+    assert wait_for(lambda: not publisher.connected)
+
+    for seq in range(1, 11):
+        publisher.publish('axis/desk/event', json.dumps({'seq': seq}), qos=qos)
+    assert publisher.stats()['queued'] == 10
+    broker.start()
+    assert wait_for(lambda: len(broker.messages) == 11)
+    time.sleep(0.2)
+
+    assert [seq for _, seq, _, _ in delivered(broker)] == list(range(11))
+    assert publisher.stats()['reconnects'] == 1
+    assert publisher.stats()['queued'] == 0
+
+
+def test_full_queue_drops_the_oldest_events():
+    publisher = EventPublisher('127.0.0.1', 1, max_queue=3)
+    for seq in range(5):
+        publisher.publish('axis/desk/event', json.dumps({'seq': seq}))
+    stats = publisher.stats()
+    assert (stats['queued'], stats['dropped']) == (3, 2)
+    assert [json.loads(event[1])['seq'] for event in publisher._events] == [2, 3, 4]
+
+
+@pytest.mark.parametrize('qos, attempts', [(0, ['first', 'first', 'second']), (1, ['first', 'second'])])
+def test_only_events_paho_did_not_keep_are_retried(broker, publisher, monkeypatch, qos, attempts):
+    # The connection drops between the publisher's check and paho's send:
+    # paho keeps a QoS 1 message for resending itself, a QoS 0 one is lost
+    real_publish = publisher.client.publish
+    calls = []
+
+    def publish(topic, payload=None, qos=0, retain=False):
+        calls.append(json.loads(payload)['name'])
+        if len(calls) == 1:
+            info = mqtt.MQTTMessageInfo(0)
+            info.rc = mqtt.MQTT_ERR_NO_CONN
+            return info
+        return real_publish(topic, payload, qos=qos, retain=retain)
+
+    monkeypatch.setattr(publisher.client, 'publish', publish)
+    for name in ('first', 'second'):
+        publisher.publish('axis/desk/event', json.dumps({'name': name, 'seq': 0}), qos=qos)
+    assert wait_for(lambda: len(calls) == len(attempts) and not publisher._events)
+    time.sleep(0.2)
+    assert calls == attempts
+    # The stand-in never resends the kept message, so the broker never
+    # acknowledges it
+    stats = publisher.stats()
+    assert (stats['published'], stats['awaiting_ack']) == (2 - qos, qos)
+
+
+def test_published_counts_acknowledged_events_only(broker, publisher):
+    broker.ack_delay = 0.5
+    publisher.publish('axis/desk/event', json.dumps({'seq': 0}), qos=1)
+    assert wait_for(lambda: len(broker.messages) == 1)
+    assert (publisher.stats()['published'], publisher.stats()['awaiting_ack']) == (0, 1)
+    assert wait_for(lambda: publisher.stats()['published'] == 1)
+    assert publisher.stats()['awaiting_ack'] == 0
+
+
+@pytest.mark.parametrize('ack_delay, timeout, unacked', [(0.05, 2.0, 0), (5.0, 0.3, 5)])
+def test_stop_waits_for_acknowledgements_and_reports_the_rest(broker, monkeypatch, ack_delay, timeout, unacked):
+    warnings = []
+    monkeypatch.setattr(event_publisher.log, 'warning', lambda message, **fields: warnings.append(fields))
+    publisher = start_publisher(broker)
+    broker.ack_delay = ack_delay
+    for seq in range(5):
+        publisher.publish('axis/desk/event', json.dumps({'seq': seq}), qos=1)
+    started = time.monotonic()
+    publisher.stop(timeout=timeout)
+
+    assert time.monotonic() - started < timeout + 1.5
+    stats = publisher.stats()
+    assert (stats['published'], stats['awaiting_ack']) == (5 - unacked, unacked)
+    assert warnings == ([{'unacked': unacked}] if unacked else [])
+
+
+def test_utterance_audio_during_an_outage_never_pushes_events_out(broker):
+    publisher = EventPublisher('127.0.0.1', broker.port, client_id='test', max_queue=20,
+                               reconnect_min_delay=0.1, reconnect_max_delay=0.2)
+    assert publisher.start()
+    streamer = create_streamer('desk', {'transport': 'mqtt', 'chunk_ms': 100}, publisher, 'axis/desk/audio')
+    try:
+        broker.stop()
+        assert wait_for(lambda: not publisher.connected)
+
+        # 30 s of utterance audio and a wakeword and endpoint event per second
+        for seq in range(30):
+            publisher.publish('axis/desk/event', json.dumps({'seq': seq}), qos=1)
+            streamer.begin(np.zeros(1600, dtype=np.int16), seq)
+            streamer.feed(np.zeros(14400, dtype=np.int16))
+            streamer.finish('silence')
+        # Whole utterances are dropped: the start message and every chunk
+        assert streamer.sink.dropped == 300
+        assert publisher.stats()['lossy_dropped'] == 30
+
+        broker.start()
+        assert wait_for(lambda: len(broker.messages) == 20)
+        time.sleep(0.2)
+    finally:
+        streamer.close()
+        publisher.stop()
+
+    topics = {topic for _, topic, _, _, _ in broker.messages}
+    assert topics == {'axis/desk/event'}
+    # Only the queue limit, not audio, decided which events were kept
+    events = [json.loads(payload)['seq'] for _, topic, payload, _, _ in broker.messages if topic == 'axis/desk/event']
+    assert events == list(range(10, 30))
+    assert publisher.stats()['dropped'] == 10
+
+
+def test_queued_utterance_audio_is_dropped_when_the_connection_is_lost(broker, publisher):
+    publisher.publish('axis/desk/event', json.dumps({'seq': 0}))
+    assert wait_for(lambda: len(broker.messages) == 1)
+    # Queued as if the publisher thread were behind when the connection drops
+    with publisher._cond:
+        for _ in range(5):
+            publisher._events.append(('axis/desk/audio', b'\0\0', 0, False, None, time.monotonic(), True))
+            publisher._lossy_queued += 1
+        publisher._events.append(('axis/desk/event', json.dumps({'seq': 1}), 1, False, None, time.monotonic(), False))
+        publisher._on_disconnect(publisher.client, None)
+        assert [event[0] for event in publisher._events] == ['axis/desk/event']
+    assert publisher.stats()['lossy_dropped'] == 5
+
+
+def test_stop_reports_events_still_queued(broker, monkeypatch):
+    warnings = []
+    monkeypatch.setattr(event_publisher.log, 'warning', lambda message, **fields: warnings.append(fields))
+    publisher = start_publisher(broker)
+    broker.stop()
+    assert wait_for(lambda: not publisher.connected)
+    for seq in range(3):
+        publisher.publish('axis/desk/event', json.dumps({'seq': seq}))
+    publisher.stop(timeout=0.1)
+    assert {'unsent': 3} in warnings
@@ -0,0 +1,35 @@
+"""
+Histograms: batched recording and Prometheus rendering
+"""
+
+from metrics import BatchedHistogram, Histogram
+
+
+def test_batched_histogram_folds_samples_in_once_per_batch():
+    batched = BatchedHistogram((0.001, 0.01), batch=4)
+    plain = Histogram((0.001, 0.01))
+    values = [0.0005, 0.002, 0.02, 0.001, 0.005, 0.5]
+    for value in values[:3]:
+        batched.record(value)
+    assert (batched.count, batched.pending) == (0, values[:3])
+
+    for value in values[3:]:
+        batched.record(value)
+    for value in values[:4]:
+        plain.observe(value)
+    assert (batched.count, batched.counts, batched.sum) == (4, plain.counts, plain.sum)
+    assert batched.pending == values[4:]
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram((0.001, 0.01))
+    histogram.observe_many([0.0005, 0.001, 0.005, 0.5])
+    lines = []
+    histogram.render('latency_seconds', 'device="desk"', lines)
+    assert lines == [
+        'latency_seconds_bucket{device="desk",le="0.001"} 2',
+        'latency_seconds_bucket{device="desk",le="0.01"} 3',
+        'latency_seconds_bucket{device="desk",le="+Inf"} 4',
+        'latency_seconds_sum{device="desk"} 0.506500',
+        'latency_seconds_count{device="desk"} 4',
+    ]
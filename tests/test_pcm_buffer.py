@@ -0,0 +1,129 @@
+"""
+PcmRingBuffer: frame order across the wrap, overruns, blocking reads and history
+"""
+
+import io
+import threading
+import time
+
+import numpy as np
+
+from pcm_buffer import PcmRingBuffer
+
+
+FRAME = 4
+
+
+def samples(start, count):
+    return np.arange(start, start + count, dtype=np.int16)
+
+
+def test_capacity_rounds_up_to_whole_frames():
+    ring = PcmRingBuffer(FRAME, 10)
+    assert ring.capacity_samples == 12
+    assert PcmRingBuffer(FRAME, 1).capacity_samples == 2 * FRAME
+
+
+def test_frames_stay_in_order_across_the_wrap():
+    ring = PcmRingBuffer(FRAME, 2 * FRAME)
+    read = []
+    for start in range(0, 40, FRAME):
+        ring.write(samples(start, FRAME))
+        read.append(ring.read_frame(timeout=0).copy())
+    assert np.array_equal(np.concatenate(read), samples(0, 40))
+    assert ring.overruns == 0
+    assert ring.stats()['frames_read'] == 10
+
+
+def test_writes_wrap_around_the_end_of_the_ring():
+    ring = PcmRingBuffer(FRAME, 3 * FRAME)
+    ring.write(samples(0, 2 * FRAME))
+    ring.read_frame(timeout=0)
+    ring.read_frame(timeout=0)
+    # Half of this lands at the end of the ring and half at the start
+    ring.write(samples(2 * FRAME, 2 * FRAME))
+    frames = [ring.read_frame(timeout=0).copy() for _ in range(2)]
+    assert np.array_equal(np.concatenate(frames), samples(2 * FRAME, 2 * FRAME))
+    assert ring.overruns == 0
+
+
+def test_overrun_drops_the_backlog_and_keeps_new_audio():
+    ring = PcmRingBuffer(FRAME, 2 * FRAME)
+    ring.write(samples(0, 2 * FRAME))
+    ring.write(samples(100, FRAME))
+    assert ring.overruns == 1
+    assert ring.dropped_bytes == 2 * FRAME * 2
+    assert np.array_equal(ring.read_frame(timeout=0), samples(100, FRAME))
+    assert ring.read_frame(timeout=0) is None
+
+
+def test_split_sample_survives_an_overrun():
+    ring = PcmRingBuffer(FRAME, 2 * FRAME)
+    data = samples(0, 2 * FRAME).tobytes()
+    ring.write(data[:-1])
+    ring.write(data[-1:] + samples(50, FRAME).tobytes())
+    assert ring.overruns == 1
+    # Byte parity is kept: the split sample is lost, the audio after it
+    # stays sample-aligned
+    frame = ring.read_frame(timeout=0)
+    assert np.array_equal(frame[1:], samples(50, FRAME - 1))
+
+
+def test_fill_from_reads_in_place_and_reports_eof():
+    ring = PcmRingBuffer(FRAME, 4 * FRAME)
+    stream = io.BytesIO(samples(0, 2 * FRAME).tobytes())
+    assert ring.fill_from(stream, 3 * FRAME * 2) == 2 * FRAME * 2
+    assert ring.fill_from(stream, FRAME * 2) == 0
+    assert np.array_equal(ring.read_frame(timeout=0), samples(0, FRAME))
+    assert ring.available_samples() == FRAME
+
+
+def test_read_frame_times_out_without_a_full_frame():
+    ring = PcmRingBuffer(FRAME, 2 * FRAME)
+    ring.write(samples(0, FRAME - 1))
+    started = time.monotonic()
+    assert ring.read_frame(timeout=0.05) is None
+    assert time.monotonic() - started >= 0.04
+    assert ring.read_frame(timeout=0) is None
+
+
+def test_blocked_reader_wakes_on_write_and_on_close():
+    ring = PcmRingBuffer(FRAME, 2 * FRAME)
+    frames = []
+    reader = threading.Thread(target=lambda: frames.extend([ring.read_frame(timeout=2), ring.read_frame(timeout=2)]))
+    reader.start()
+    time.sleep(0.05)
+    ring.write(samples(0, FRAME))
+    time.sleep(0.05)
+    ring.close()
+    reader.join(timeout=1)
+    assert not reader.is_alive()
+    assert np.array_equal(frames[0], samples(0, FRAME))
+    assert frames[1] is None
+    assert ring.closed
+
+
+def test_close_still_drains_buffered_frames():
+    ring = PcmRingBuffer(FRAME, 2 * FRAME)
+    ring.write(samples(0, FRAME))
+    ring.close()
+    assert np.array_equal(ring.read_frame(), samples(0, FRAME))
+    assert ring.read_frame() is None
+
+
+def test_skip_discards_whole_frames_only():
+    ring = PcmRingBuffer(FRAME, 4 * FRAME)
+    ring.write(samples(0, 3 * FRAME))
+    assert ring.skip(FRAME + 1) == FRAME
+    assert ring.stats()['skipped_bytes'] == FRAME * 2
+    assert np.array_equal(ring.read_frame(timeout=0), samples(FRAME, FRAME))
+
+
+def test_history_returns_recently_read_audio_across_the_wrap():
+    ring = PcmRingBuffer(FRAME, 2 * FRAME, history_samples=2 * FRAME)
+    for start in range(0, 6 * FRAME, FRAME):
+        ring.write(samples(start, FRAME))
+        ring.read_frame(timeout=0)
+    assert np.array_equal(ring.history(3 * FRAME), samples(3 * FRAME, 3 * FRAME))
+    # Never more than was kept
+    assert len(ring.history(100)) == 3 * FRAME
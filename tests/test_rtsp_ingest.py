@@ -0,0 +1,184 @@
+"""
+Native RTSP ingest: G.711 decoding, RTP parsing and a session against a scripted device
+"""
+
+import socket
+import struct
+import threading
+import warnings
+
+import numpy as np
+import pytest
+
+from pcm_buffer import PcmRingBuffer
+from rtsp_ingest import G711_TABLES, G711Decoder, NativeRtspIngest, RtspError
+
+
+def test_tables_match_known_g711_values():
+    ulaw, alaw = G711_TABLES['PCMU'], G711_TABLES['PCMA']
+    assert (ulaw[0xFF], ulaw[0x7F], ulaw[0x80], ulaw[0x00]) == (0, 0, 32124, -32124)
+    assert (alaw[0xD5], alaw[0x55], alaw[0xAA], alaw[0x2A]) == (8, -8, 32256, -32256)
+
+
+@pytest.mark.parametrize('codec, reference', [('PCMU', 'ulaw2lin'), ('PCMA', 'alaw2lin')])
+def test_tables_match_audioop(codec, reference):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        audioop = pytest.importorskip('audioop')
+    expected = np.frombuffer(getattr(audioop, reference)(bytes(range(256)), 2), dtype=np.int16)
+    assert np.array_equal(G711_TABLES[codec], expected)
+
+
+def decode(decoder, payloads, ring):
+    for payload in payloads:
+        decoder.decode_into(payload, ring)
+    samples = []
+    while True:
+        frame = ring.read_frame(timeout=0)
+        if frame is None:
+            return np.concatenate(samples)
+        samples.append(frame.copy())
+
+
+def test_decoder_upsamples_with_midpoints_across_packets():
+    table = G711_TABLES['PCMU']
+    codes = np.random.default_rng(0).integers(0, 256, 320, dtype=np.uint8)
+    ring = PcmRingBuffer(64, 16000)
+    out = decode(G711Decoder('PCMU'), [codes[:160].tobytes(), codes[160:].tobytes()], ring)
+
+    linear = table[codes]
+    assert len(out) == 640
+    assert np.array_equal(out[1::2], linear)
+    # Each inserted sample is the mean of its neighbours, the first one
+    # continuing from silence and the 161st from the previous packet
+    previous = np.concatenate(([0], linear[:-1]))
+    assert np.array_equal(out[0::2], (previous + linear) >> 1)
+
+
+def test_decoding_across_the_end_of_the_ring_matches_direct_decoding():
+    codes = np.random.default_rng(1).integers(0, 256, 1600, dtype=np.uint8)
+    payloads = [codes[i:i + 100].tobytes() for i in range(0, len(codes), 100)]
+    expected = decode(G711Decoder('PCMA'), payloads, PcmRingBuffer(64, 16000))
+
+    # 200 samples per packet into a 320-sample ring: some packets wrap, and
+    # the decoder grows its buffers for the first one
+    ring = PcmRingBuffer(64, 320)
+    decoder = G711Decoder('PCMA', max_samples=32)
+    chunks = [decode(decoder, [payload], ring) for payload in payloads]
+    assert np.array_equal(np.concatenate(chunks), expected)
+    assert ring.overruns == 0
+
+
+def rtp(seq, payload, payload_type=0, csrc=0, extension=b'', padding=0):
+    first = 0x80 | csrc | (0x10 if extension else 0) | (0x20 if padding else 0)
+    header = struct.pack('>BBHII', first, payload_type, seq, seq * 160, 0x1234) + b'\0' * 4 * csrc
+    if extension:
+        header += struct.pack('>HH', 0xBEDE, len(extension) // 4) + extension
+    tail = b'\0' * (padding - 1) + bytes([padding]) if padding else b''
+    return header + payload + tail
+
+
+def ingest_for(codec='PCMU', payload_type=0):
+    ring = PcmRingBuffer(64, 16000)
+    ingest = NativeRtspIngest('127.0.0.1:1', '', '', ring)
+    ingest.decoder = G711Decoder(codec)
+    ingest._rtp_payload_type = payload_type
+    return ingest, ring
+
+
+def test_rtp_header_fields_are_skipped():
+    ingest, ring = ingest_for()
+    payload = bytes(range(40))
+    ingest._handle_rtp(rtp(1, payload, csrc=2, extension=b'\1' * 8, padding=3))
+    assert ingest.payload_bytes == len(payload)
+    assert ring.available_samples() == 2 * len(payload)
+
+
+def test_lost_and_foreign_packets_are_counted_or_ignored():
+    ingest, ring = ingest_for()
+    ingest._handle_rtp(rtp(0xFFFE, b'\xff' * 10))
+    ingest._handle_rtp(rtp(0xFFFF, b'\xff' * 10))
+    ingest._handle_rtp(rtp(2, b'\xff' * 10))
+    ingest._handle_rtp(rtp(3, b'\xff' * 10, payload_type=8))
+    ingest._handle_rtp(b'\x80\x00')
+    assert ingest.stats()['packets'] == 3
+    assert ingest.lost_packets == 2
+
+
+def test_sdp_selects_the_first_g711_audio_track():
+    ingest, _ = ingest_for()
+    sdp = '\r\n'.join([
+        'v=0',
+        'm=video 0 RTP/AVP 96',
+        'a=control:trackID=1',
+        'm=audio 0 RTP/AVP 97 98',
+        'a=rtpmap:97 mpeg4-generic/16000/1',
+        'a=rtpmap:98 PCMA/8000',
+        'a=control:trackID=2',
+    ])
+    assert ingest._parse_sdp(sdp, 'rtsp://cam/media/') == ('rtsp://cam/media/trackID=2', 98, 'PCMA')
+    assert ingest._parse_sdp('m=audio 0 RTP/AVP 0\r\na=control:*', 'rtsp://cam/') == ('rtsp://cam/', 0, 'PCMU')
+    with pytest.raises(RtspError):
+        ingest._parse_sdp('m=audio 0 RTP/AVP 97\r\na=rtpmap:97 opus/48000/2\r\na=control:a', 'rtsp://cam/')
+
+
+class ScriptedDevice:
+    """One-connection RTSP server: Basic auth, then PCMU over interleaved RTP"""
+    def __init__(self, packets):
+        self.packets = packets
+        self.methods = []
+        self.listener = socket.create_server(('127.0.0.1', 0))
+        self.port = self.listener.getsockname()[1]
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        client, _ = self.listener.accept()
+        reader = client.makefile('rb')
+        with client, reader:
+            while True:
+                lines = []
+                while True:
+                    line = reader.readline().decode().strip()
+                    if not line:
+                        break
+                    lines.append(line)
+                if not lines:
+                    return
+                method = lines[0].split()[0]
+                headers = dict(line.split(': ', 1) for line in lines[1:])
+                self.methods.append(method)
+                reply = f"RTSP/1.0 200 OK\r\nCSeq: {headers['CSeq']}\r\n"
+                body = b''
+                if method == 'DESCRIBE' and 'Authorization' not in headers:
+                    reply = f"RTSP/1.0 401 Unauthorized\r\nCSeq: {headers['CSeq']}\r\n" \
+                            'WWW-Authenticate: Basic realm="axis"\r\n'
+                elif method == 'DESCRIBE':
+                    body = b'v=0\r\nm=audio 0 RTP/AVP 0\r\na=control:trackID=1\r\n'
+                    reply += f"Content-Length: {len(body)}\r\n"
+                elif method == 'SETUP':
+                    reply += 'Session: 42;timeout=30\r\n'
+                client.sendall(reply.encode() + b'\r\n' + body)
+                if method == 'PLAY':
+                    for packet in self.packets:
+                        client.sendall(b'$\x00' + struct.pack('>H', len(packet)) + packet)
+                    return
+
+
+def test_session_streams_decoded_audio_until_the_device_hangs_up():
+    codes = np.random.default_rng(2).integers(0, 256, 1600, dtype=np.uint8)
+    device = ScriptedDevice([rtp(seq, codes[seq * 160:(seq + 1) * 160].tobytes()) for seq in range(10)])
+    ring = PcmRingBuffer(64, 16000)
+    ingest = NativeRtspIngest(f'127.0.0.1:{device.port}', 'root', 'secret', ring, timeout=5)
+    first = []
+    ingest.on_first_packet = lambda: first.append(True)
+    ingest.connect()
+    ingest.run()
+    ingest.stop()
+
+    assert device.methods == ['OPTIONS', 'DESCRIBE', 'DESCRIBE', 'SETUP', 'PLAY']
+    assert (ingest.codec, ingest.session, ingest.session_timeout) == ('PCMU', '42', 30)
+    assert ingest.stats()['packets'] == 10 and ingest.lost_packets == 0
+    assert first == [True]
+    expected = decode(G711Decoder('PCMU'), [codes.tobytes()], PcmRingBuffer(64, 16000))
+    assert np.array_equal(decode(ingest.decoder, [], ring), expected)
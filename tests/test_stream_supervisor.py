@@ -0,0 +1,162 @@
+"""
+Stream supervision: restarts after EOF, stalls and failed reconnects
+"""
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from pcm_buffer import PcmRingBuffer
+from stream_supervisor import FfmpegSource, PcmSource, StreamStalled, StreamSupervisor
+
+
+class ScriptedSource:
+    """Source whose open() and run() follow a script shared by every restart"""
+    def __init__(self, script, opened):
+        self.script = script
+        self.opened = opened
+        self.on_first_data = None
+        self.closed = threading.Event()
+
+    def open(self):
+        self.action = self.script.pop(0) if self.script else 'block'
+        if self.action == 'refuse':
+            raise OSError('connection refused')
+        self.opened.append(self)
+
+    def run(self, stall_timeout):
+        self.on_first_data()
+        if self.action == 'eof':
+            return
+        if self.action == 'stall':
+            raise StreamStalled(f"no audio for {stall_timeout}s")
+        self.closed.wait()
+
+    def close(self):
+        self.closed.set()
+
+
+def supervise(script):
+    opened = []
+    supervisor = StreamSupervisor('test', lambda: ScriptedSource(script, opened), PcmRingBuffer(64, 1600),
+                                  stall_timeout=0.1, initial_delay=0.01, max_delay=0.02)
+    supervisor.open()
+    supervisor.start()
+    return supervisor, opened
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def test_restarts_after_eof_stall_and_refused_reconnects():
+    supervisor, opened = supervise(['eof', 'stall', 'refuse', 'refuse', 'block'])
+    try:
+        assert supervisor.wait_ready(1)
+        assert wait_for(lambda: len(opened) == 3 and supervisor.connected_since is not None)
+        stats = supervisor.stats()
+    finally:
+        supervisor.stop()
+
+    assert (stats['eofs'], stats['stalls'], stats['errors'], stats['reconnects']) == (1, 1, 2, 2)
+    assert stats['connected']
+    # One recovery per failure that was followed by audio
+    assert len(supervisor.recovery_times) == 2
+    assert all(recovery > 0 for recovery in supervisor.recovery_times)
+
+
+def test_recovery_time_spans_failed_reconnects():
+    supervisor, opened = supervise(['eof', 'refuse', 'refuse', 'refuse', 'block'])
+    try:
+        assert wait_for(lambda: len(supervisor.recovery_times) == 1)
+    finally:
+        supervisor.stop()
+    # Three failed attempts, each after at least half the 10-20 ms backoff
+    assert supervisor.recovery_times[0] >= 0.015
+    assert supervisor.stats()['errors'] == 3
+
+
+def test_stop_closes_the_running_source():
+    supervisor, opened = supervise(['block'])
+    assert supervisor.wait_ready(1)
+    supervisor.stop()
+    assert opened[0].closed.is_set()
+    assert not supervisor._thread.is_alive()
+
+
+def test_open_failure_is_raised_and_counted():
+    supervisor = StreamSupervisor('test', lambda: ScriptedSource(['refuse'], []), PcmRingBuffer(64, 1600))
+    with pytest.raises(OSError):
+        supervisor.open()
+    assert supervisor.errors == 1
+    assert not supervisor.stats()['connected']
+
+
+def test_pcm_source_stalls_when_the_writer_goes_quiet(tmp_path):
+    path = str(tmp_path / 'device.pcm')
+    os.mkfifo(path)
+    ring = PcmRingBuffer(64, 1600)
+    source = PcmSource(path, ring)
+    source.open()
+    writer = os.open(path, os.O_WRONLY)
+    try:
+        os.write(writer, np.zeros(640, dtype=np.int16).tobytes())
+        started = time.monotonic()
+        with pytest.raises(StreamStalled):
+            source.run(0.1)
+        assert time.monotonic() - started >= 0.1
+        assert ring.available_samples() == 640
+    finally:
+        os.close(writer)
+        source.close()
+
+
+def test_pcm_source_ends_when_closed_while_waiting(tmp_path):
+    path = str(tmp_path / 'device.pcm')
+    os.mkfifo(path)
+    source = PcmSource(path, PcmRingBuffer(64, 1600))
+    source.open()
+    writer = os.open(path, os.O_WRONLY)
+    try:
+        threading.Timer(0.05, source.close).start()
+        source.run(5)
+    finally:
+        os.close(writer)
+
+
+def command_source(script):
+    # Stands in for FFmpeg: any process writing PCM to stdout
+    return FfmpegSource([sys.executable, '-c', script], PcmRingBuffer(64, 16000))
+
+
+def test_ffmpeg_source_reads_until_eof():
+    source = command_source("import sys; sys.stdout.buffer.write(bytes(6400))")
+    first = []
+    source.on_first_data = lambda: first.append(True)
+    source.open()
+    try:
+        source.run(5)
+    finally:
+        source.close()
+    assert source.audio_buffer.available_samples() == 3200
+    assert first == [True]
+
+
+def test_ffmpeg_source_stalls_when_the_process_goes_quiet():
+    source = command_source("import sys, time; sys.stdout.buffer.write(bytes(640)); sys.stdout.flush(); time.sleep(10)")
+    source.open()
+    try:
+        with pytest.raises(StreamStalled):
+            source.run(0.2)
+    finally:
+        source.close()
+    assert source.audio_buffer.available_samples() == 320
@@ -0,0 +1,142 @@
+"""
+Utterance streaming: chunking, pre-roll, and the MQTT and Unix socket transports
+"""
+
+import json
+import socket
+import time
+
+import numpy as np
+import pytest
+
+from mqtt_testing import InMemoryMqttClient
+from utterance_stream import UnixSocketUtteranceSink, UtteranceStreamer, create_streamer, read_message
+
+
+class RecordingSink:
+    dropped = 0
+
+    def __init__(self):
+        self.messages = []
+
+    def start(self, info):
+        self.messages.append(('start', info))
+
+    def audio(self, pcm):
+        self.messages.append(('audio', pcm))
+
+    def end(self, info):
+        self.messages.append(('end', info))
+
+    def describe(self):
+        return 'recording'
+
+    def close(self):
+        self.messages.append(('close', None))
+
+
+def audio(start, count):
+    return np.arange(start, start + count, dtype=np.int16)
+
+
+def test_pre_roll_and_audio_arrive_in_fixed_chunks_up_to_the_endpoint():
+    sink = RecordingSink()
+    streamer = UtteranceStreamer('desk', sink, pre_roll_ms=500, chunk_ms=100)
+    streamer.begin(audio(0, 8000), audio_time=12.5)
+    for start in range(8000, 14000, 512):
+        streamer.feed(audio(start, min(512, 14000 - start)))
+    streamer.finish('silence')
+
+    kinds = [kind for kind, _ in sink.messages]
+    assert kinds == ['start'] + ['audio'] * 9 + ['end']
+    start, end = sink.messages[0][1], sink.messages[-1][1]
+    assert start == {'device_id': 'desk', 'utterance': 1, 'sample_rate': 16000, 'format': 's16le',
+                     'pre_roll_ms': 500, 'audio_time_s': 12.5}
+    assert end == {'device_id': 'desk', 'utterance': 1, 'reason': 'silence', 'duration_s': 0.875}
+
+    chunks = [np.frombuffer(pcm, dtype=np.int16) for kind, pcm in sink.messages if kind == 'audio']
+    assert [len(chunk) for chunk in chunks] == [1600] * 8 + [1200]
+    assert np.array_equal(np.concatenate(chunks), audio(0, 14000))
+    assert streamer.stats() == {'utterances': 1, 'bytes_sent': 28000, 'dropped': 0}
+
+
+def test_each_utterance_starts_with_an_empty_chunk():
+    sink = RecordingSink()
+    streamer = UtteranceStreamer('desk', sink, chunk_ms=100)
+    streamer.begin(audio(0, 100), 0.0)
+    streamer.finish('timeout')
+    streamer.finish('timeout')
+    streamer.begin(audio(500, 1600), 1.0)
+    streamer.close()
+
+    assert [kind for kind, _ in sink.messages] == ['start', 'audio', 'end', 'start', 'audio', 'end', 'close']
+    assert np.array_equal(np.frombuffer(sink.messages[4][1], dtype=np.int16), audio(500, 1600))
+    assert sink.messages[5][1]['utterance'] == 2
+    assert sink.messages[5][1]['reason'] == 'shutdown'
+
+
+def test_mqtt_transport_publishes_start_audio_and_end_topics():
+    client = InMemoryMqttClient(lambda: 0.0)
+    streamer = create_streamer('desk', {'transport': 'mqtt', 'qos': 1, 'chunk_ms': 10}, client, 'axis/desk/audio')
+    streamer.begin(audio(0, 320), 0.0)
+    streamer.finish('silence')
+
+    topics = [message['topic'] for message in client.messages]
+    assert topics == ['axis/desk/audio/start', 'axis/desk/audio', 'axis/desk/audio', 'axis/desk/audio/end']
+    assert all(message['qos'] == 1 for message in client.messages)
+    assert json.loads(client.messages[-1]['payload'])['reason'] == 'silence'
+    assert client.messages[1]['payload'] == audio(0, 160).tobytes()
+
+
+def test_create_streamer_is_off_by_default_and_rejects_unknown_transports():
+    assert create_streamer('desk', {}, None, 'topic') is None
+    with pytest.raises(ValueError):
+        create_streamer('desk', {'transport': 'carrier-pigeon'}, None, 'topic')
+
+
+def connect(path):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(2)
+    client.connect(path)
+    return client
+
+
+def wait_for_clients(sink, count):
+    deadline = time.monotonic() + 2
+    while len(sink.clients) < count and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert len(sink.clients) == count
+
+
+def test_unix_socket_clients_receive_whole_utterances(tmp_path):
+    path = str(tmp_path / 'desk.sock')
+    streamer = UtteranceStreamer('desk', UnixSocketUtteranceSink(path), chunk_ms=10)
+    early = connect(path)
+    try:
+        wait_for_clients(streamer.sink, 1)
+        streamer.begin(audio(0, 200), 0.0)
+        # Joins mid-utterance: gets nothing until the next start
+        late = connect(path)
+        wait_for_clients(streamer.sink, 2)
+        streamer.feed(audio(200, 200))
+        streamer.finish('silence')
+        streamer.begin(audio(1000, 160), 1.0)
+        streamer.close()
+
+        messages = []
+        while (message := read_message(early)) is not None:
+            messages.append(message)
+        assert [kind for kind, _ in messages] == ['start', 'audio', 'audio', 'audio', 'end',
+                                                  'start', 'audio', 'end']
+        pcm = b''.join(body for kind, body in messages[:5] if kind == 'audio')
+        assert pcm == audio(0, 400).tobytes()
+
+        late_messages = []
+        while (message := read_message(late)) is not None:
+            late_messages.append(message)
+        assert [kind for kind, _ in late_messages] == ['start', 'audio', 'end']
+        assert late_messages[0][1]['utterance'] == 2
+    finally:
+        early.close()
+        late.close()
+    assert not (tmp_path / 'desk.sock').exists()
@@ -0,0 +1,101 @@
+"""
+Per-stream VAD state: devices sharing one model never see each other's state
+"""
+
+import threading
+
+import numpy as np
+
+from vad import SileroVAD, BatchedVADScheduler, WINDOW_SAMPLES, STATE_SHAPE
+
+
+class RecurrentStandIn(SileroVAD):
+    """Deterministic stand-in for the network whose output depends on its state"""
+    backend = 'test'
+
+    def _run(self, x, states):
+        probs = (x.mean(axis=1) + states[0, :, 0]).astype(np.float32)
+        new_states = (states + x.sum(axis=1)[None, :, None]).astype(np.float32)
+        return probs, new_states
+
+
+def windows(seed, count=5):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(-8000, 8000, WINDOW_SAMPLES, dtype=np.int16) for _ in range(count)]
+
+
+def alone(vad, audio):
+    stream = vad.new_stream()
+    return [vad.probability(stream, window) for window in audio]
+
+
+def test_streams_interleaved_match_streams_run_alone():
+    vad = RecurrentStandIn()
+    first, second = windows(1), windows(2)
+    a, b = vad.new_stream(), vad.new_stream()
+    interleaved_a, interleaved_b = [], []
+    for window_a, window_b in zip(first, second):
+        interleaved_a.append(vad.probability(a, window_a))
+        interleaved_b.append(vad.probability(b, window_b))
+    assert interleaved_a == alone(vad, first)
+    assert interleaved_b == alone(vad, second)
+
+
+def test_streams_on_parallel_threads_match_streams_run_alone():
+    vad = RecurrentStandIn()
+    audio = [windows(seed, 50) for seed in range(4)]
+    results = [None] * len(audio)
+
+    def run(index):
+        results[index] = alone(vad, audio[index])
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(len(audio))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [alone(vad, samples) for samples in audio]
+
+
+def test_context_carries_the_previous_window_tail():
+    vad = RecurrentStandIn()
+    stream = vad.new_stream()
+    window = windows(3, 1)[0]
+    vad.probability(stream, window)
+    assert np.allclose(stream.context[0], window[-64:] / 32768.0)
+
+
+def test_reset_forgets_previous_audio():
+    vad = RecurrentStandIn()
+    stream = vad.new_stream()
+    audio = windows(4)
+    before = [vad.probability(stream, window) for window in audio]
+    stream.reset()
+    assert not stream.state.any()
+    assert [vad.probability(stream, window) for window in audio] == before
+    assert stream.state.shape == STATE_SHAPE
+
+
+def test_batched_scoring_matches_each_stream_scored_alone():
+    vad = RecurrentStandIn()
+    scheduler = BatchedVADScheduler(vad, tick_ms=20, max_batch=4)
+    scheduler.start()
+    audio = [windows(seed, 10) for seed in range(4)]
+    results = [[] for _ in audio]
+
+    def run(index):
+        stream = vad.new_stream()
+        for window in audio[index]:
+            results[index].append(scheduler.infer(stream, window))
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(len(audio))]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        scheduler.stop()
+    for result, samples in zip(results, audio):
+        assert np.allclose(result, alone(vad, samples), rtol=1e-5)
+    assert scheduler.stats()['max_batch_size'] > 1
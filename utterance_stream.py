@@ -0,0 +1,280 @@
+"""
+Utterance audio streaming
+After a wakeword, the device's audio is streamed to downstream consumers
+(typically ASR) in fixed-size chunks as it arrives, starting with a
+pre-roll taken from the ring buffer and ending at the VAD endpoint, so
+decoding can start while the user is still speaking.
+
+Transports:
+- mqtt: raw 16 kHz s16le chunks on the audio topic, with JSON start and
+  end messages on <topic>/start and <topic>/end
+- unix: a per-device Unix stream socket; every message is framed as a
+  type byte (S, A or E), a big-endian uint32 length and the body, where
+  S and E carry JSON and A carries PCM
+"""
+
+import os
+import json
+import queue
+import socket
+import struct
+import threading
+import numpy as np
+
+
+SAMPLE_RATE = 16000
+
+
+class MqttUtteranceSink:
+    """Publishes utterance audio on an MQTT topic
+
+    Utterances are lossy: one that starts while the broker is unreachable
+    is dropped whole, and chunks the publisher cannot take are dropped, so
+    audio that would be stale after a reconnect never crowds wakeword and
+    endpoint events out of its queue.
+    """
+    def __init__(self, mqtt_client, topic, qos=0):
+        self.mqtt_client = mqtt_client
+        self.topic = topic
+        self.qos = qos
+        self.dropped = 0
+        self.live = False
+
+    def start(self, info):
+        self.live = self.mqtt_client.publish(f"{self.topic}/start", json.dumps(info), qos=self.qos,
+                                             lossy=True) is not False
+
+    def audio(self, pcm):
+        if not self.live or self.mqtt_client.publish(self.topic, pcm, qos=self.qos, lossy=True) is False:
+            self.dropped += 1
+
+    def end(self, info):
+        # The end of a started utterance is always sent, so consumers can close it
+        if self.live:
+            self.mqtt_client.publish(f"{self.topic}/end", json.dumps(info), qos=self.qos)
+        self.live = False
+
+    def describe(self):
+        return f"MQTT {self.topic}"
+
+    def close(self):
+        pass
+
+
+class UnixSocketUtteranceSink:
+    """Serves utterance audio to any number of clients on a Unix socket
+
+    Messages are queued and written by a sender thread so a slow client
+    never blocks detection; when the queue is full, messages are dropped
+    and counted.
+    """
+    def __init__(self, path, max_queue=256):
+        self.path = path
+        self.clients = []
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            os.unlink(path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(8)
+        self.running = True
+        threading.Thread(target=self._accept, daemon=True).start()
+        self._sender = threading.Thread(target=self._send, daemon=True)
+        self._sender.start()
+
+    def _accept(self):
+        while self.running:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+            with self._lock:
+                # A client that connects mid-utterance waits for the next start
+                self.clients.append([client, False])
+
+    def _send(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            kind, message = item
+            with self._lock:
+                clients = list(self.clients)
+            for entry in clients:
+                client, synced = entry
+                if kind == b'S':
+                    entry[1] = synced = True
+                if not synced:
+                    continue
+                try:
+                    client.sendall(message)
+                except OSError:
+                    with self._lock:
+                        if entry in self.clients:
+                            self.clients.remove(entry)
+                    client.close()
+
+    def _put(self, kind, body):
+        if not self.clients:
+            return
+        try:
+            self._queue.put_nowait((kind, struct.pack('>cI', kind, len(body)) + body))
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self, info):
+        self._put(b'S', json.dumps(info).encode())
+
+    def audio(self, pcm):
+        self._put(b'A', pcm)
+
+    def end(self, info):
+        self._put(b'E', json.dumps(info).encode())
+
+    def describe(self):
+        return f"unix:{self.path}"
+
+    def close(self):
+        self.running = False
+        self.server.close()
+        try:
+            self._queue.put(None, timeout=1)
+        except queue.Full:
+            pass
+        # Let queued messages, such as the end of the last utterance, go out
+        self._sender.join(timeout=1)
+        with self._lock:
+            for client, _ in self.clients:
+                client.close()
+            self.clients = []
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def read_message(sock):
+    """Read one (kind, body) message from a unix sink; kind is 'start', 'audio' or 'end'
+
+    start and end bodies are decoded from JSON. Returns None when the
+    connection is closed.
+    """
+    header = _read_exactly(sock, 5)
+    if header is None:
+        return None
+    kind, length = struct.unpack('>cI', header)
+    body = _read_exactly(sock, length)
+    if body is None:
+        return None
+    if kind == b'A':
+        return 'audio', body
+    return ('start' if kind == b'S' else 'end'), json.loads(body)
+
+
+def _read_exactly(sock, count):
+    data = bytearray()
+    while len(data) < count:
+        chunk = sock.recv(count - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+class UtteranceStreamer:
+    """Cuts one device's utterance audio into chunks and hands them to a sink"""
+    def __init__(self, device_id, sink, pre_roll_ms=500, chunk_ms=100):
+        self.device_id = device_id
+        self.sink = sink
+        self.pre_roll_samples = int(pre_roll_ms * SAMPLE_RATE / 1000)
+        self.chunk = np.zeros(max(1, int(chunk_ms * SAMPLE_RATE / 1000)), dtype=np.int16)
+        self.filled = 0
+        self.active = False
+        self.samples = 0
+
+        # Statistics
+        self.utterances = 0
+        self.bytes_sent = 0
+
+    def begin(self, pre_roll, audio_time):
+        """Start an utterance with pre_roll, which ends with the wakeword frame"""
+        self.active = True
+        self.utterances += 1
+        self.samples = 0
+        self.filled = 0
+        self.sink.start({
+            'device_id': self.device_id,
+            'utterance': self.utterances,
+            'sample_rate': SAMPLE_RATE,
+            'format': 's16le',
+            'pre_roll_ms': round(len(pre_roll) * 1000 / SAMPLE_RATE),
+            'audio_time_s': round(audio_time, 3),
+        })
+        self.feed(pre_roll)
+
+    def feed(self, samples):
+        """Append audio, sending every completed chunk"""
+        offset = 0
+        self.samples += len(samples)
+        while offset < len(samples):
+            count = min(len(self.chunk) - self.filled, len(samples) - offset)
+            self.chunk[self.filled:self.filled + count] = samples[offset:offset + count]
+            self.filled += count
+            offset += count
+            if self.filled == len(self.chunk):
+                self._flush()
+
+    def finish(self, reason):
+        """Send the last partial chunk and the end message"""
+        if not self.active:
+            return
+        if self.filled:
+            self._flush()
+        self.active = False
+        self.sink.end({
+            'device_id': self.device_id,
+            'utterance': self.utterances,
+            'reason': reason,
+            'duration_s': round(self.samples / SAMPLE_RATE, 3),
+        })
+
+    def _flush(self):
+        pcm = self.chunk[:self.filled].tobytes()
+        self.filled = 0
+        self.bytes_sent += len(pcm)
+        self.sink.audio(pcm)
+
+    def describe(self):
+        return f"{self.sink.describe()} ({self.pre_roll_samples * 1000 // SAMPLE_RATE} ms pre-roll)"
+
+    def close(self):
+        self.finish('shutdown')
+        self.sink.close()
+
+    def stats(self):
+        return {
+            'utterances': self.utterances,
+            'bytes_sent': self.bytes_sent,
+            'dropped': self.sink.dropped,
+        }
+
+
+def create_streamer(device_id, utterance_config, mqtt_client, audio_topic):
+    """Build the streamer selected by the utterance: config section, or None when off"""
+    transport = utterance_config.get('transport', 'off')
+    if transport in ('off', None, False):
+        return None
+    if transport == 'mqtt':
+        sink = MqttUtteranceSink(mqtt_client, audio_topic, qos=utterance_config.get('qos', 0))
+    elif transport == 'unix':
+        path = utterance_config.get('socket_path', '/tmp/wakeword-{device_id}.sock')
+        sink = UnixSocketUtteranceSink(path.replace('{device_id}', device_id))
+    else:
+        raise ValueError(f"Unknown utterance.transport: {transport}")
+    return UtteranceStreamer(
+        device_id,
+        sink,
+        pre_roll_ms=utterance_config.get('pre_roll_ms', 500),
+        chunk_ms=utterance_config.get('chunk_ms', 100)
+    )
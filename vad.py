@@ -0,0 +1,233 @@
+"""
+Silero VAD backends with per-device stream state and a cross-device batch scheduler
+The model weights are loaded once; every device keeps its own recurrent
+state and audio context, so devices can run VAD in parallel without a
+global lock, or have their windows scored in a single batched forward
+pass. PyTorch is only imported when a torch backend is selected.
+"""
+
+import os
+import numpy as np
+
+from batching import BatchScheduler
+
+
+SAMPLE_RATE = 16000
+WINDOW_SAMPLES = 512
+CONTEXT_SAMPLES = 64
+STATE_SHAPE = (2, 1, 128)
+
+
+class SileroVAD:
+    """Shared Silero VAD weights, run with explicit per-stream state"""
+    backend = None
+
+    def new_stream(self):
+        """Create fresh recurrent state for one device"""
+        return VADStream()
+
+    def forward(self, windows, states, contexts):
+        """Score a batch of 512-sample float32 windows
+
+        windows: (B, 512), states: (2, B, 128), contexts: (B, 64) arrays
+        Returns (probabilities, new_states, new_contexts).
+        """
+        x = np.concatenate([contexts, windows], axis=1)
+        probs, new_states = self._run(x, states)
+        return probs, new_states, x[:, -CONTEXT_SAMPLES:]
+
+    def _run(self, x, states):
+        """Run the network on context-prefixed windows"""
+        raise NotImplementedError
+
+    def probability(self, stream, audio_samples):
+        """Score the last 512 samples of one device and advance its state
+
+        Only the stream is mutated, so devices can call this concurrently.
+        The window is converted into the stream's preallocated input, which
+        already holds the context, so no arrays are built per call.
+        """
+        if len(audio_samples) != WINDOW_SAMPLES:
+            audio_samples = audio_samples[-WINDOW_SAMPLES:]
+        np.copyto(stream.window, audio_samples, casting='unsafe')
+        stream.window *= 1 / 32768.0
+        probability = self._run_stream(stream)
+        np.copyto(stream.context, stream.tail)
+        return probability
+
+    def _run_stream(self, stream):
+        """Run one stream's input in place, updating its state; returns the probability"""
+        probs, stream.state = self._run(stream.input, stream.state)
+        return float(probs[0])
+
+
+class TorchSileroVAD(SileroVAD):
+    """Silero VAD from torch.hub or a local TorchScript file"""
+    def __init__(self, model, backend='torch'):
+        import torch
+        self.torch = torch
+        self.backend = backend
+        # The hub model keeps a single hidden state internally; its inner
+        # 16 kHz network is a pure function of (audio, state)
+        self.net = model._model
+
+    def _run(self, x, states):
+        with self.torch.no_grad():
+            out, new_states = self.net(self.torch.from_numpy(x), self.torch.from_numpy(states))
+        return out[:, 0].numpy(), new_states.numpy()
+
+    def _run_stream(self, stream):
+        # Tensors sharing memory with the stream's buffers, made once per stream
+        if stream.tensors is None:
+            stream.tensors = (self.torch.from_numpy(stream.input), self.torch.from_numpy(stream.state))
+        x, state = stream.tensors
+        with self.torch.no_grad():
+            out, new_state = self.net(x, state)
+            state.copy_(new_state)
+            return out.item()
+
+
+class OnnxSileroVAD(SileroVAD):
+    """Silero VAD exported to ONNX, run with onnxruntime"""
+    backend = 'onnx'
+
+    def __init__(self, model_path, threads=1):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(
+            model_path,
+            sess_options=options,
+            providers=['CPUExecutionProvider']
+        )
+        self.sample_rate = np.array(SAMPLE_RATE, dtype=np.int64)
+        self.output_names = [output.name for output in self.session.get_outputs()]
+
+    def _run(self, x, states):
+        out, new_states = self.session.run(
+            None,
+            {'input': x, 'state': states, 'sr': self.sample_rate}
+        )
+        return out[:, 0], new_states
+
+    def _run_stream(self, stream):
+        # Inputs and outputs are bound once to the stream's buffers
+        if stream.tensors is None:
+            binding = self.session.io_binding()
+            binding.bind_cpu_input('input', stream.input)
+            binding.bind_cpu_input('state', stream.state)
+            binding.bind_cpu_input('sr', self.sample_rate)
+            out = np.zeros((1, 1), dtype=np.float32)
+            new_state = np.zeros(STATE_SHAPE, dtype=np.float32)
+            for name, array in zip(self.output_names, (out, new_state)):
+                binding.bind_output(name, 'cpu', 0, np.float32, list(array.shape), array.ctypes.data)
+            stream.tensors = (binding, out, new_state)
+        binding, out, new_state = stream.tensors
+        self.session.run_with_iobinding(binding)
+        np.copyto(stream.state, new_state)
+        return float(out[0, 0])
+
+
+def load_vad(vad_config):
+    """Load the VAD backend selected in the vad: config section
+
+    backend: "torch" (torch.hub, default), "torchscript" or "onnx";
+    the last two load model_path from local disk with no network access.
+    """
+    backend = vad_config.get('backend', 'torch')
+    model_path = vad_config.get('model_path')
+
+    if backend in ('torchscript', 'onnx'):
+        if not model_path:
+            raise ValueError(f"vad.model_path is required for the {backend} backend")
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"VAD model not found: {model_path}")
+
+    if backend == 'onnx':
+        return OnnxSileroVAD(model_path, threads=vad_config.get('threads', 1))
+
+    import torch
+    if backend == 'torchscript':
+        model = torch.jit.load(model_path, map_location='cpu')
+    elif backend == 'torch':
+        model, _ = torch.hub.load(
+            repo_or_dir='snakers4/silero-vad',
+            model='silero_vad',
+            force_reload=False,
+            verbose=False
+        )
+    else:
+        raise ValueError(f"Unknown VAD backend: {backend}")
+    model.eval()
+    return TorchSileroVAD(model, backend)
+
+
+class VADStream:
+    """Recurrent state and audio context of one device's VAD stream
+
+    The network input (context followed by the window) is a preallocated
+    buffer; context, window and tail are views into it.
+    """
+    def __init__(self):
+        self.input = np.zeros((1, CONTEXT_SAMPLES + WINDOW_SAMPLES), dtype=np.float32)
+        self._context = self.input[:, :CONTEXT_SAMPLES]
+        self.window = self.input[0, CONTEXT_SAMPLES:]
+        self.tail = self.input[:, -CONTEXT_SAMPLES:]
+        self._state = np.zeros(STATE_SHAPE, dtype=np.float32)
+        # Backend tensors over input and state, created on first use
+        self.tensors = None
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, value):
+        np.copyto(self._state, value)
+
+    @property
+    def context(self):
+        return self._context
+
+    @context.setter
+    def context(self, value):
+        np.copyto(self._context, value)
+
+    def reset(self):
+        """Forget all previous audio"""
+        self.input.fill(0)
+        self._state.fill(0)
+
+
+def to_window(audio_samples):
+    """Convert the last 512 int16 samples to normalized float32"""
+    return audio_samples[-WINDOW_SAMPLES:].astype(np.float32) / 32768.0
+
+
+class BatchedVADScheduler(BatchScheduler):
+    """Collects VAD windows from all devices and scores them in batches"""
+    def __init__(self, vad, tick_ms=10, max_batch=32):
+        super().__init__(self._score, tick_ms, max_batch, name='vad')
+        self.vad = vad
+
+    def infer(self, stream, audio_samples, timeout=1.0):
+        """Queue the last 512 samples of a device and wait for its probability
+
+        Returns None if the window was not scored in time (see
+        BatchScheduler.submit). The caller should then keep its previous
+        probability rather than take it for silence.
+        """
+        return self.submit(stream, to_window(audio_samples), timeout)
+
+    def _score(self, streams, windows):
+        """Run one batched forward pass and hand the new state back to each stream"""
+        states = np.concatenate([stream.state for stream in streams], axis=1)
+        contexts = np.concatenate([stream.context for stream in streams], axis=0)
+
+        probs, new_states, new_contexts = self.vad.forward(np.stack(windows), states, contexts)
+
+        for i, stream in enumerate(streams):
+            stream.state = new_states[:, i:i + 1]
+            stream.context = new_contexts[i:i + 1]
+        return probs
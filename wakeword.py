@@ -0,0 +1,419 @@
+"""
+Wakeword engines
+A WakewordEngine is loaded once and hands every device its own detector
+with Porcupine's interface: frame_length, process(pcm) -> keyword index
+(-1 for none) and delete(). Porcupine keeps one native instance per
+device; openWakeWord shares its ONNX sessions and can score the windows
+of many devices in one batched onnxruntime call. An optional EnergyGate
+keeps either engine idle while a room is quiet.
+"""
+
+import os
+import math
+import ctypes
+import numpy as np
+
+from batching import BatchScheduler
+
+
+FRAME_LENGTH = 512
+
+# Config names that differ from Porcupine's built-in keyword names
+PORCUPINE_ALIASES = {
+    'hey_jarvis': 'jarvis',
+    'hey_google': 'hey google',
+    'ok_google': 'ok google',
+    'hey_siri': 'hey siri',
+}
+
+# openWakeWord feature pipeline: 80 ms steps of 8 mel frames, 76-frame
+# embedding windows and 96-dimensional embeddings
+OWW_STEP = 1280
+OWW_MEL_CONTEXT = 480
+OWW_WINDOW = OWW_STEP + OWW_MEL_CONTEXT
+OWW_MEL_FRAMES = 76
+OWW_MEL_BINS = 32
+OWW_EMBEDDING = 96
+OWW_WARMUP_STEPS = 5
+
+
+class WakewordEngine:
+    """Shared wakeword model that creates per-device detectors"""
+    name = None
+
+    def create_detector(self):
+        """Create detection state for one device"""
+        raise NotImplementedError
+
+    def start(self):
+        """Start background work such as a batch scheduler"""
+
+    def stop(self):
+        """Stop background work"""
+
+    def set_threshold(self, threshold):
+        """Change the detection threshold; returns whether detectors must be recreated"""
+        raise NotImplementedError
+
+    def describe(self):
+        """One-line description for the startup log"""
+        return self.name
+
+
+class PorcupineEngine(WakewordEngine):
+    """Picovoice Porcupine; one native instance per device"""
+    name = 'porcupine'
+
+    def __init__(self, access_key, model='porcupine', sensitivity=0.5, keyword_path=None):
+        import pvporcupine
+        self.pvporcupine = pvporcupine
+        self.access_key = access_key
+        self.sensitivity = sensitivity
+        self.keyword_path = keyword_path
+
+        if keyword_path:
+            self.keyword = os.path.splitext(os.path.basename(keyword_path))[0]
+            return
+        keyword = PORCUPINE_ALIASES.get(model, model.replace('_', ' '))
+        if keyword not in pvporcupine.KEYWORDS:
+            raise ValueError(
+                f"'{model}' is not a built-in Porcupine keyword "
+                f"(available: {', '.join(sorted(pvporcupine.KEYWORDS))}); set "
+                f"wakeword.keyword_path to a custom .ppn file or use the openwakeword engine"
+            )
+        self.keyword = keyword
+
+    def create_detector(self):
+        if self.keyword_path:
+            return PorcupineDetector(self.pvporcupine.create(
+                access_key=self.access_key,
+                keyword_paths=[self.keyword_path],
+                sensitivities=[self.sensitivity]
+            ))
+        return PorcupineDetector(self.pvporcupine.create(
+            access_key=self.access_key,
+            keywords=[self.keyword],
+            sensitivities=[self.sensitivity]
+        ))
+
+    def set_threshold(self, threshold):
+        # Sensitivity is fixed when a native instance is created
+        self.sensitivity = threshold
+        return True
+
+    def describe(self):
+        return f"Porcupine '{self.keyword}' (sensitivity: {self.sensitivity})"
+
+
+class PorcupineDetector:
+    """One Porcupine instance, fed int16 frames without per-frame allocations
+
+    pvporcupine's process() builds a new ctypes array from the frame one
+    element at a time. When the binding exposes its native process
+    function, frames are copied into a preallocated ctypes array and passed
+    to it directly; otherwise process() is used as is.
+    """
+    def __init__(self, porcupine):
+        self.porcupine = porcupine
+        self.frame_length = porcupine.frame_length
+        self._process_func = getattr(porcupine, '_process_func', None)
+        self._handle = getattr(porcupine, '_handle', None)
+        if self._process_func is None or self._handle is None:
+            self.process = porcupine.process
+            return
+        self._pcm = (ctypes.c_short * self.frame_length)()
+        self._frame = np.frombuffer(self._pcm, dtype=np.int16)
+        self._result = ctypes.c_int()
+        self._result_ref = ctypes.byref(self._result)
+        self._success = porcupine.PicovoiceStatuses.SUCCESS
+
+    def process(self, pcm):
+        self._frame[:] = pcm
+        status = self._process_func(self._handle, self._pcm, self._result_ref)
+        if status is not self._success:
+            raise RuntimeError(f"Porcupine processing failed: {status}")
+        return self._result.value
+
+    def delete(self):
+        self.porcupine.delete()
+
+
+class OpenWakeWordEngine(WakewordEngine):
+    """openWakeWord ONNX models run directly with onnxruntime
+
+    model_path is the keyword model; the shared melspectrogram.onnx and
+    embedding_model.onnx feature models are loaded from feature_dir.
+    """
+    name = 'openwakeword'
+
+    def __init__(self, model_path, feature_dir=None, threshold=0.5, threads=1,
+                 batch=False, tick_ms=10, max_batch=32):
+        import onnxruntime
+
+        feature_dir = feature_dir or os.path.dirname(model_path)
+        paths = {
+            'keyword': model_path,
+            'melspectrogram': os.path.join(feature_dir, 'melspectrogram.onnx'),
+            'embedding': os.path.join(feature_dir, 'embedding_model.onnx'),
+        }
+        for kind, path in paths.items():
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"openWakeWord {kind} model not found: {path}")
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.sessions = {
+            kind: onnxruntime.InferenceSession(path, sess_options=options,
+                                               providers=['CPUExecutionProvider'])
+            for kind, path in paths.items()
+        }
+        self.keyword = os.path.splitext(os.path.basename(model_path))[0]
+        self.threshold = threshold
+        self.feature_frames = self.sessions['keyword'].get_inputs()[0].shape[1]
+
+        self.scheduler = None
+        if batch:
+            self.scheduler = BatchScheduler(lambda detectors, windows: self.score(detectors, np.stack(windows)),
+                                            tick_ms, max_batch, name='wakeword')
+
+        # Seed every stream with the features of quiet noise, as openWakeWord does
+        noise = np.random.default_rng(0).integers(-1000, 1000, 16000 * 4).astype(np.float32)
+        self.initial_features = self._embed_clip(noise)[-self.feature_frames:]
+        self.initial_mel = np.ones((OWW_MEL_FRAMES, OWW_MEL_BINS), dtype=np.float32)
+
+    def create_detector(self):
+        return OpenWakeWordDetector(self)
+
+    def start(self):
+        if self.scheduler:
+            self.scheduler.start()
+
+    def stop(self):
+        if self.scheduler:
+            self.scheduler.stop()
+
+    def set_threshold(self, threshold):
+        # Detectors compare against the engine's threshold on every step
+        self.threshold = threshold
+        return False
+
+    def describe(self):
+        batched = ", batched across devices" if self.scheduler else ""
+        return f"openWakeWord '{self.keyword}' (threshold: {self.threshold}{batched})"
+
+    def _run(self, kind, x):
+        """Run one model, row by row if it was exported with a fixed batch of 1"""
+        session = self.sessions[kind]
+        name = session.get_inputs()[0].name
+        if len(x) == 1 or session.get_inputs()[0].shape[0] != 1:
+            return session.run(None, {name: x})[0]
+        return np.concatenate([session.run(None, {name: x[i:i + 1]})[0] for i in range(len(x))])
+
+    def _melspectrogram(self, audio):
+        """(B, samples) float32 in int16 range -> (B, frames, 32)"""
+        spec = self._run('melspectrogram', audio)
+        return spec.reshape(len(audio), -1, OWW_MEL_BINS) / 10 + 2
+
+    def _embed_clip(self, audio):
+        """Embeddings of every 80 ms step of a whole clip"""
+        mel = self._melspectrogram(audio[np.newaxis])[0]
+        windows = np.stack([mel[i:i + OWW_MEL_FRAMES]
+                            for i in range(0, len(mel) - OWW_MEL_FRAMES + 1, 8)])
+        return self._run('embedding', windows[..., np.newaxis]).reshape(-1, OWW_EMBEDDING)
+
+    def score(self, detectors, windows):
+        """Advance a batch of detectors by one 80 ms step and return their scores
+
+        windows: (B, 1760) float32, the step plus 480 samples of mel context.
+        Each detector is only touched by its own device, so batches of
+        different detectors can run concurrently.
+        """
+        spec = self._melspectrogram(windows)
+        mels = np.stack([np.concatenate([d.mel[spec.shape[1]:], s]) for d, s in zip(detectors, spec)])
+        embeddings = self._run('embedding', mels[..., np.newaxis]).reshape(-1, OWW_EMBEDDING)
+        features = np.stack([np.concatenate([d.features[1:], e[np.newaxis]])
+                             for d, e in zip(detectors, embeddings)])
+        scores = self._run('keyword', features).reshape(len(detectors), -1)[:, 0]
+        for detector, mel, feature in zip(detectors, mels, features):
+            detector.mel = mel
+            detector.features = feature
+        return scores
+
+
+class OpenWakeWordDetector:
+    """One device's openWakeWord stream with Porcupine's detector interface"""
+    frame_length = FRAME_LENGTH
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.mel = engine.initial_mel.copy()
+        self.features = engine.initial_features.copy()
+        self.audio = np.zeros(OWW_WINDOW + FRAME_LENGTH, dtype=np.float32)
+        self.pending = 0
+        self.steps = 0
+        self.armed = True
+        self.last_score = 0.0
+
+    def process(self, pcm):
+        """Buffer one frame; score every 80 ms and return 0 on a detection, else -1"""
+        count = len(pcm)
+        self.audio[:-count] = self.audio[count:]
+        self.audio[-count:] = pcm
+        self.pending += count
+        if self.pending < OWW_STEP:
+            return -1
+
+        self.pending -= OWW_STEP
+        end = len(self.audio) - self.pending
+        window = self.audio[end - OWW_WINDOW:end]
+        if self.engine.scheduler:
+            score = self.engine.scheduler.submit(self, window)
+            if score is None:
+                # Not scored in time; skip this step rather than guess
+                return -1
+        else:
+            score = float(self.engine.score([self], window[np.newaxis])[0])
+        self.last_score = score
+
+        # Skip the first scores while the buffers fill, and fire once per
+        # crossing so one utterance is one detection
+        self.steps += 1
+        if self.steps <= OWW_WARMUP_STEPS:
+            return -1
+        if score < self.engine.threshold:
+            self.armed = True
+            return -1
+        if not self.armed:
+            return -1
+        self.armed = False
+        return 0
+
+    def delete(self):
+        pass
+
+
+class EnergyGate:
+    """Skips wakeword inference on frames that are not clearly above the noise floor
+
+    The floor follows the quietest frames: it drops to any quieter frame
+    and creeps up by rise_db_per_s otherwise, so it adapts to fans or a
+    TV left on. A frame opens the gate when it is margin_db above the
+    floor, and the gate stays open for hold_ms afterwards. While closed,
+    the last lookback_ms of frames are kept and handed to the detector
+    ahead of the frame that opens the gate, so a soft wakeword onset is
+    still heard.
+    """
+    def __init__(self, frame_length, margin_db=10.0, lookback_ms=480, hold_ms=1000,
+                 rise_db_per_s=1.0):
+        self.frame_length = frame_length
+        self.margin_db = margin_db
+        self.hold_frames = max(1, -(-int(hold_ms * 16) // frame_length))
+        self.rise_db = rise_db_per_s * frame_length / 16000
+        self.floor_db = None
+
+        # Closed-gate frames, oldest at _next once the ring is full
+        self.lookback = np.zeros((max(1, -(-int(lookback_ms * 16) // frame_length)), frame_length),
+                                 dtype=np.int16)
+        self._next = 0
+        self._held = 0
+        self._scratch = np.empty(frame_length, dtype=np.float32)
+        # Open until the floor has been measured
+        self._open_frames = self.hold_frames
+
+        # Statistics
+        self.frames = 0
+        self.gated = 0
+        self.replayed = 0
+
+    def level_db(self, frame):
+        """Frame energy in dB relative to one LSB"""
+        samples = self._scratch[:len(frame)]
+        np.copyto(samples, frame)
+        return 10 * math.log10(float(np.dot(samples, samples)) / len(frame) + 1.0)
+
+    def frames_to_process(self, frame):
+        """Frames the detector must see now: none while gated, else the look-back and this frame"""
+        self.frames += 1
+        level = self.level_db(frame)
+        if self.floor_db is None or level < self.floor_db:
+            self.floor_db = level
+        else:
+            self.floor_db += self.rise_db
+
+        if level > self.floor_db + self.margin_db:
+            opening = self._open_frames == 0
+            self._open_frames = self.hold_frames
+            if opening and self._held:
+                return self._replay(frame)
+
+        if self._open_frames:
+            self._open_frames -= 1
+            return (frame,)
+
+        # Gated: keep the frame for the look-back
+        self.gated += 1
+        self.lookback[self._next] = frame
+        self._next = (self._next + 1) % len(self.lookback)
+        self._held = min(self._held + 1, len(self.lookback))
+        return ()
+
+    def _replay(self, frame):
+        """The held frames in arrival order, followed by frame"""
+        size = len(self.lookback)
+        first = (self._next - self._held) % size
+        frames = [self.lookback[(first + i) % size] for i in range(self._held)]
+        frames.append(frame)
+        self.gated -= self._held
+        self.replayed += self._held
+        self._held = 0
+        return frames
+
+    def stats(self):
+        """Share of frames never shown to the detector and the current noise floor"""
+        return {
+            'frames': self.frames,
+            'gated': self.gated,
+            'gated_ratio': self.gated / self.frames if self.frames else 0.0,
+            'replayed': self.replayed,
+            'floor_db': self.floor_db,
+        }
+
+
+def load_wakeword(wakeword_config, access_key=None):
+    """Load the wakeword engine selected in the wakeword: config section
+
+    engine: "porcupine" (default, needs the Picovoice access key) or
+    "openwakeword" (local ONNX models, inference_framework must be "onnx").
+    """
+    engine = wakeword_config.get('engine', 'porcupine')
+    threshold = wakeword_config.get('threshold', 0.5)
+
+    if engine == 'porcupine':
+        if not access_key:
+            raise ValueError("PORCUPINE_ACCESS_KEY is required for the porcupine engine")
+        return PorcupineEngine(
+            access_key,
+            model=wakeword_config.get('model', 'porcupine'),
+            sensitivity=threshold,
+            keyword_path=wakeword_config.get('keyword_path')
+        )
+
+    if engine == 'openwakeword':
+        framework = wakeword_config.get('inference_framework', 'onnx')
+        if framework != 'onnx':
+            raise ValueError(f"Unsupported wakeword.inference_framework: {framework} (only onnx)")
+        model_path = wakeword_config.get('model_path')
+        if not model_path:
+            raise ValueError("wakeword.model_path is required for the openwakeword engine")
+        return OpenWakeWordEngine(
+            model_path,
+            feature_dir=wakeword_config.get('feature_dir'),
+            threshold=threshold,
+            threads=wakeword_config.get('threads', 1),
+            batch=wakeword_config.get('batch', False),
+            tick_ms=wakeword_config.get('batch_tick_ms', 10),
+            max_batch=wakeword_config.get('batch_max_size', 32)
+        )
+
+    raise ValueError(f"Unknown wakeword engine: {engine}")